@@ -1,57 +1,124 @@
+import os
 import sys
+import time
+import logging
+import multiprocessing
+
+STARTUP_T0 = time.perf_counter()
+
 from PyQt5.QtWidgets import QApplication, QMainWindow, QTabWidget, QWidget, QVBoxLayout
+from PyQt5.QtCore import QTimer
+
+from tools.jobs import JobScheduler
 
-from ui import ExcelProcessorApp, CheckAndMatch
+# Вкладки создаются при первом показе: (атрибут окна, заголовок)
+TABS = [
+    ('excel_processor', "📊 Обработка номенклатурных индексов"),
+    ('check_and_match', "🗺️ Считка объектов"),
+]
 
 class MainApp(QMainWindow):
-    def __init__(self, hmap=None):
+    def __init__(self, hmap=None, startup_t0=None):
         super().__init__()
-        self.hmap = hmap  
+        self.hmap = hmap
+        self.startup_t0 = startup_t0 if startup_t0 is not None else time.perf_counter()
+        # Замеры запуска в мс: первая отрисовка окна и создание каждой вкладки
+        self.startup_timings = {}
+        self.excel_processor = None
+        self.check_and_match = None
+        # Общий пул фоновых задач для обеих вкладок
+        self.scheduler = JobScheduler(parent=self)
         self.init_ui()
-        
+
     def init_ui(self):
         self.setWindowTitle("ГИС Белгеодезия")
         self.setGeometry(100, 100, 900, 700)
-        
+
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
-        
+
         layout = QVBoxLayout(central_widget)
         layout.setContentsMargins(0, 0, 0, 0)
-        
+
         self.tab_widget = QTabWidget()
-        
-        self.excel_processor = ExcelProcessorApp()
-        self.check_and_match = CheckAndMatch(hmap=self.hmap)
 
-        self.tab_widget.addTab(self.excel_processor, "📊 Обработка номенклатурных индексов")
-        self.tab_widget.addTab(self.check_and_match, "🗺️ Считка объектов")
-        
+        for _, title in TABS:
+            placeholder = QWidget()
+            QVBoxLayout(placeholder).setContentsMargins(0, 0, 0, 0)
+            self.tab_widget.addTab(placeholder, title)
+        self.tab_widget.currentChanged.connect(self.ensure_tab)
+
         layout.addWidget(self.tab_widget)
-        
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if 'first_paint' not in self.startup_timings:
+            self.startup_timings['first_paint'] = (time.perf_counter() - self.startup_t0) * 1000
+            logging.info(f"Startup: first paint after {self.startup_timings['first_paint']:.0f} ms")
+            # Содержимое вкладки строим уже после того, как окно появилось
+            QTimer.singleShot(0, lambda: self.ensure_tab(self.tab_widget.currentIndex()))
+
+    def create_tab(self, attr):
+        # Тяжёлые модули (pandas, numpy, инструменты) загружаются вместе с первой вкладкой
+        from ui import ExcelProcessorApp, CheckAndMatch
+
+        if attr == 'excel_processor':
+            return ExcelProcessorApp(scheduler=self.scheduler)
+        return CheckAndMatch(hmap=self.hmap, scheduler=self.scheduler)
+
+    def ensure_tab(self, index):
+        attr, _ = TABS[index]
+        if getattr(self, attr) is not None:
+            return
+
+        start = time.perf_counter()
+        widget = self.create_tab(attr)
+        self.tab_widget.widget(index).layout().addWidget(widget)
+        setattr(self, attr, widget)
+
+        self.startup_timings[f"tab {attr}"] = (time.perf_counter() - start) * 1000
+        logging.info(f"Startup: tab {attr} built in {self.startup_timings[f'tab {attr}']:.0f} ms")
+
     def closeEvent(self, event):
         """При закрытии окна чистим ресурсы обоих инструментов"""
         if hasattr(self.check_and_match, 'cleanup'):
             self.check_and_match.cleanup()
-        
+
         if hasattr(self.excel_processor, 'cleanup'):
             self.excel_processor.cleanup()
-            
+
+        self.scheduler.shutdown()
+
         event.accept()
 
 
 def main():
+    logging.basicConfig(level=logging.INFO, filename='logs.log', filemode='w')
+
     app = QApplication(sys.argv)
     app.setStyle('Fusion')
-    
+
     # Получаем handle карты из системы (если нужно)
     # hmap = получить_handle_карты()
     hmap = None  # Заглушка, нужно будет заменить на реальный handle
-    
-    window = MainApp(hmap=hmap)
+
+    window = MainApp(hmap=hmap, startup_t0=STARTUP_T0)
     window.show()
-    
+
+    # STREETS_STARTUP_BENCHMARK=1: вывести замеры запуска и выйти после первой вкладки
+    if os.environ.get('STREETS_STARTUP_BENCHMARK'):
+        def report():
+            if len(window.startup_timings) < 2:
+                QTimer.singleShot(10, report)
+                return
+            for name, value in window.startup_timings.items():
+                print(f"{name}: {value:.0f} ms")
+            window.close()
+        QTimer.singleShot(0, report)
+
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Справочники выгружаются в дочерних процессах, в собранном exe они стартуют через этот вызов
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tools.check_and_match import (FAILED_BY_BOTH, FAILED_BY_DISTANCE, FAILED_BY_SEM, FAILED_NO_SEM_VALUE,
+                                   FAILED_TARGET_TAKEN, MATCHED, CheckAndMatchLogic, DistanceSweep,
+                                   SemanticComparator, classify_objects, find_candidate_pairs)
+
+
+def brute_force_pairs(check_xy, target_xy, max_dist):
+    distances = np.hypot(check_xy[:, None, 0] - target_xy[None, :, 0], check_xy[:, None, 1] - target_xy[None, :, 1])
+    pair_check, pair_target = np.nonzero(distances <= max_dist)
+    return set(zip(pair_check.tolist(), pair_target.tolist()))
+
+
+@pytest.mark.parametrize('max_dist', [0.5, 3.0, 25.0])
+def test_find_candidate_pairs_matches_brute_force(max_dist):
+    rng = np.random.default_rng(0)
+    check_xy = rng.uniform(-50, 50, size=(300, 2))
+    target_xy = rng.uniform(-50, 50, size=(200, 2))
+
+    pair_check, pair_target, pair_dist = find_candidate_pairs(check_xy, target_xy, max_dist)
+
+    assert set(zip(pair_check.tolist(), pair_target.tolist())) == brute_force_pairs(check_xy, target_xy, max_dist)
+    np.testing.assert_allclose(pair_dist, np.hypot(*(check_xy[pair_check] - target_xy[pair_target]).T))
+
+
+def test_find_candidate_pairs_empty_layer():
+    pair_check, pair_target, pair_dist = find_candidate_pairs(np.empty((0, 2)), [[0.0, 0.0]], 10.0)
+    assert len(pair_check) == len(pair_target) == len(pair_dist) == 0
+
+
+def test_comparator_normalizes_values():
+    comparator = SemanticComparator()
+    ids, dots = comparator.intern(['УЛ. ЛЕНИНА', 'Ленина улица', None, '', 'ПР. МИРА'])
+
+    assert ids[0] == ids[1]
+    assert ids[2] == ids[3] == -1
+    assert ids[4] not in (ids[0], -1)
+    assert dots.tolist() == [True, False, False, False, True]
+
+
+def classify(check_values, check_xy, target_values, target_xy, max_dist=10.0, **kwargs):
+    comparator = SemanticComparator()
+    check_ids, check_dots = comparator.intern(check_values)
+    target_ids, _ = comparator.intern(target_values)
+    pairs = find_candidate_pairs(check_xy, target_xy, max_dist)
+    return classify_objects(check_ids, check_dots, target_ids, *pairs, **kwargs)
+
+
+def test_classify_categories():
+    categories, assigned, distance = classify(
+        ['А', 'Б', 'В', None, 'Г'],
+        [[0, 0], [100, 0], [200, 0], [0, 1], [300, 0]],
+        ['А', 'В', 'Х'],
+        [[0, 3], [500, 0], [300, 2]])
+
+    assert categories.tolist() == [MATCHED, FAILED_BY_BOTH, FAILED_BY_DISTANCE, FAILED_NO_SEM_VALUE, FAILED_BY_SEM]
+    assert assigned.tolist() == [0, -1, -1, -1, -1]
+    assert distance[0] == pytest.approx(3.0)
+
+
+def test_one_to_one_reports_taken_target():
+    args = (['А', 'А'], [[0, 0], [0, 5]], ['А'], [[0, 1]])
+
+    categories, assigned, _ = classify(*args, one_to_one=True)
+    assert categories.tolist() == [MATCHED, FAILED_TARGET_TAKEN]
+    assert assigned.tolist() == [0, -1]
+
+    categories, assigned, _ = classify(*args)
+    assert categories.tolist() == [MATCHED, MATCHED]
+    assert assigned.tolist() == [0, 0]
+
+
+def test_ignore_dot_matches_nearest_object():
+    args = (['А.'], [[0, 0]], ['Б', 'В'], [[0, 4], [0, 2]])
+
+    categories, assigned, _ = classify(*args, ignore_dot=True)
+    assert categories.tolist() == [MATCHED] and assigned.tolist() == [1]
+
+    categories, _, _ = classify(*args)
+    assert categories.tolist() == [FAILED_BY_SEM]
+
+
+def test_logic_match_stores_results():
+    logic = CheckAndMatchLogic()
+    logic.params.update({'max_dist': 10.0, 'nearest_neighbor_mode': True})
+    check_df = pd.DataFrame({'key': [11, 12, 13], 'x': [0, 0, 100], 'y': [0, 5, 0], 'value': ['А', 'А', 'А']})
+    target_df = pd.DataFrame({'key': [21], 'x': [0], 'y': [1], 'value': ['ул. А']})
+
+    categories = logic.match(check_df, target_df)
+
+    assert categories.tolist() == [FAILED_BY_SEM, FAILED_BY_SEM, FAILED_BY_BOTH]
+    check_df['value'] = ['ул. А'] * 3
+    logic.match(check_df, target_df)
+    assert logic.params['success_transfers'] == [(11, 21, 1.0)]
+    assert logic.params['failed_target_taken'] == [(12, "Подходящий объект в радиусе уже сопоставлен с другим")]
+    assert [key for key, _ in logic.params['failed_by_distance']] == [13]
+    assert logic.params['total'] == 3 and logic.params['success_count'] == 1
+
+
+@pytest.mark.parametrize('one_to_one', [False, True])
+@pytest.mark.parametrize('ignore_dot', [False, True])
+def test_distance_sweep_matches_classify_objects(one_to_one, ignore_dot):
+    rng = np.random.default_rng(3)
+    check_xy = rng.uniform(0, 100, size=(400, 2))
+    target_xy = rng.uniform(0, 100, size=(300, 2))
+    check_ids = rng.integers(-1, 8, size=400)
+    check_dots = rng.random(400) < 0.2
+    target_ids = rng.integers(-1, 10, size=300)
+    thresholds = [8.0, 1.0, 4.0, 2.5]
+
+    sweep = DistanceSweep(check_ids, check_dots, target_ids, *find_candidate_pairs(check_xy, target_xy, 8.0),
+                          thresholds, ignore_dot=ignore_dot, one_to_one=one_to_one)
+    assert sweep.thresholds.tolist() == [1.0, 2.5, 4.0, 8.0]
+
+    for threshold in thresholds:
+        expected = classify_objects(check_ids, check_dots, target_ids,
+                                    *find_candidate_pairs(check_xy, target_xy, threshold),
+                                    ignore_dot=ignore_dot, one_to_one=one_to_one)
+        for actual, wanted in zip(sweep.classify(threshold), expected):
+            np.testing.assert_array_equal(actual, wanted)
+
+    table = sweep.table()
+    assert table['Порог (м)'].tolist() == [1.0, 2.5, 4.0, 8.0]
+    counts = table.drop(columns=['Порог (м)', 'Успешно, %', 'Среднее расстояние (м)', 'Прирост успешных'])
+    assert (counts.sum(axis=1) == 400).all()
+    assert table['Прирост успешных'].sum() == table['Успешно'].iloc[-1]
+
+
+def test_find_candidate_pairs_skips_points_without_coordinates():
+    rng = np.random.default_rng(5)
+    check_xy = rng.uniform(0, 100, size=(200, 2))
+    target_xy = rng.uniform(0, 100, size=(150, 2))
+    check_xy[[3, 50]] = np.nan
+    target_xy[7, 1] = np.inf
+
+    pair_check, pair_target, pair_dist = find_candidate_pairs(check_xy, target_xy, 5.0)
+
+    assert set(zip(pair_check.tolist(), pair_target.tolist())) == brute_force_pairs(
+        np.nan_to_num(check_xy, nan=1e9), np.nan_to_num(target_xy, posinf=1e9), 5.0)
+    assert not {3, 50} & set(pair_check.tolist())
+    assert 7 not in pair_target.tolist()
+    np.testing.assert_allclose(pair_dist, np.hypot(*(check_xy[pair_check] - target_xy[pair_target]).T))
+
+
+@pytest.mark.parametrize('thresholds', [[], [1.0, 5.0]])
+def test_objects_without_coordinates_fail_by_distance(thresholds):
+    check_df = pd.DataFrame({'key': [1, 2, 3, 4], 'x': [0.0, np.nan, None, 50.0], 'y': [0.0, 0.0, 1.0, np.nan],
+                             'value': ['Мира', 'Мира', 'Ленина', None]}, dtype=object)
+    target_df = pd.DataFrame({'key': [10, 11], 'x': [0.5, np.nan], 'y': [0.0, 0.0], 'value': ['Мира', 'Ленина']})
+    logic = CheckAndMatchLogic()
+    logic.params['max_dist'] = 5.0
+
+    if thresholds:
+        logic.sweep(check_df, target_df, thresholds)
+    else:
+        logic.match(check_df, target_df)
+
+    assert logic.params['success_transfers'] == [(1, 10, 0.5)]
+    assert [key for key, _ in logic.params['failed_by_distance']] == [2, 3]
+    assert [key for key, _ in logic.params['failed_no_sem_value']] == [4]
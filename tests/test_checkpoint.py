@@ -0,0 +1,97 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tools.checkpoint import checkpoint_path, file_fingerprint, load_checkpoint, remove_checkpoint, save_checkpoint
+from tools.jobs import JobCancelled
+from tools.nomenclatural import NomenclaturalStreetIndexer, ProcessingJob
+from tools.sheet_layout import SheetLayout
+from tools.streets import StreetResolver
+
+
+@pytest.fixture
+def input_file(tmp_path):
+    rng = np.random.default_rng(0)
+    streets = ['УЛ. ЛЕНИНА', 'ПР. МИРА', 'ПЕР. САДОВЫЙ', 'УЛ. ГАГАРИНА']
+    df = pd.DataFrame({
+        'X': rng.uniform(-4000, 0, 60).round(1),
+        'Y': rng.uniform(0, 4000, 60).round(1),
+        'SEM9': [streets[i % len(streets)] for i in range(60)],
+    })
+    path = tmp_path / 'points.csv'
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+def make_job(file_path, checkpoint_dir, **kwargs):
+    indexer = NomenclaturalStreetIndexer(500, kwargs.pop('sheet_layout', None))
+    indexer.set_origin(0.0, 0.0)
+    return ProcessingJob(indexer, file_path, 'X', 'Y', 'SEM9', chunk_size=10, reader=kwargs.pop('reader', None),
+                         checkpoint_dir=str(checkpoint_dir), **kwargs)
+
+
+def test_save_and_load(tmp_path):
+    path = checkpoint_path(str(tmp_path / 'input.xlsx'), str(tmp_path / 'points'))
+    save_checkpoint(path, 'abc', {'rows_done': 5})
+
+    assert load_checkpoint(path, 'abc') == {'rows_done': 5}
+    assert load_checkpoint(path, 'other') is None
+    remove_checkpoint(path)
+    assert load_checkpoint(path, 'abc') is None
+
+
+def test_checkpoint_is_not_written_next_to_input(tmp_path):
+    first = checkpoint_path(str(tmp_path / 'a.xlsx'), str(tmp_path / 'points'))
+    second = checkpoint_path(str(tmp_path / 'b.xlsx'), str(tmp_path / 'points'))
+
+    assert os.path.dirname(first) == str(tmp_path / 'points')
+    assert first != second
+
+
+def test_fingerprint_follows_file_and_parameters(input_file):
+    first = file_fingerprint(input_file, 'X', 1)
+    assert first == file_fingerprint(input_file, 'X', 1)
+    assert first != file_fingerprint(input_file, 'X', 2)
+
+    with open(input_file, 'a', encoding='utf-8') as f:
+        f.write('-1,1,УЛ. МИРА\n')
+    assert first != file_fingerprint(input_file, 'X', 1)
+
+
+def test_job_fingerprint_includes_layout_and_resolver(input_file, tmp_path):
+    base = make_job(input_file, tmp_path)._fingerprint()
+
+    assert base == make_job(input_file, tmp_path)._fingerprint()
+    assert base != make_job(input_file, tmp_path, sheet_layout=SheetLayout(3, 3))._fingerprint()
+    assert base != make_job(input_file, tmp_path,
+                            street_resolver=StreetResolver(max_distance=2))._fingerprint()
+
+
+class CancelAfter(ProcessingJob):
+    def __init__(self, *args, checks=3, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checks = checks
+
+    def is_cancelled(self):
+        self.checks -= 1
+        return self.checks < 0
+
+
+def test_resume_after_cancel_gives_same_result(input_file, tmp_path):
+    expected = make_job(input_file, tmp_path / 'full').execute()
+
+    indexer = NomenclaturalStreetIndexer(500)
+    indexer.set_origin(0.0, 0.0)
+    job = CancelAfter(indexer, input_file, 'X', 'Y', 'SEM9', chunk_size=10, checkpoint_dir=str(tmp_path / 'resume'))
+    with pytest.raises(JobCancelled):
+        job.execute()
+    assert os.path.exists(job.checkpoint_path)
+    assert not os.path.exists(f"{input_file}.checkpoint")
+
+    resumed = make_job(input_file, tmp_path / 'resume', resume=True)
+    result = resumed.execute()
+
+    pd.testing.assert_frame_equal(result, expected)
+    assert not os.path.exists(resumed.checkpoint_path)
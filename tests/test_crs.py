@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tools.crs import (CRS_REGISTRY, CoordinateTransformStage, get_transformer,
+                       local_crs_for_origin, register_crs)
+
+LAT = np.array([55.75, 56.10, 54.90])
+LON = np.array([27.55, 28.40, 26.80])
+
+
+@pytest.mark.parametrize('code', ['EPSG:32635', 'EPSG:28405', 'EPSG:4284'])
+def test_round_trip_through_wgs84(code):
+    x, y = get_transformer('EPSG:4326', code).transform(LAT, LON)
+    lat, lon = get_transformer(code, 'EPSG:4326').transform(x, y)
+
+    np.testing.assert_allclose(lat, LAT, atol=1e-7)
+    np.testing.assert_allclose(lon, LON, atol=1e-7)
+
+
+def test_transverse_mercator_central_meridian():
+    x, y = get_transformer('EPSG:4326', 'EPSG:32635').transform(np.array([0.0]), np.array([27.0]))
+
+    assert y[0] == pytest.approx(500000.0)
+    assert x[0] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_local_crs_places_origin_at_base_point():
+    base_x, base_y = get_transformer('EPSG:4326', 'EPSG:28405').transform(LAT[:1], LON[:1])
+    local = register_crs(local_crs_for_origin('EPSG:28405', 1000.0, 2000.0, base_x[0], base_y[0]))
+
+    x, y = get_transformer('EPSG:4326', local.code).transform(LAT[:1], LON[:1])
+    assert (x[0], y[0]) == pytest.approx((1000.0, 2000.0), abs=1e-3)
+
+    # 100 м на север в базовой проекции - 100 м по X местной системы
+    x, y = get_transformer('EPSG:28405', local.code).transform(base_x + 100.0, base_y)
+    assert (x[0], y[0]) == pytest.approx((1100.0, 2000.0), abs=1e-3)
+
+
+def test_local_crs_rotation_and_code():
+    first = local_crs_for_origin('EPSG:28405', 0.0, 0.0, 6000000.0, 5500000.0, rotation=90.0)
+    second = local_crs_for_origin('EPSG:28405', 10.0, 0.0, 6000000.0, 5500000.0, rotation=90.0)
+    assert first.code != second.code
+
+    register_crs(first)
+    x, y = get_transformer('EPSG:28405', first.code).transform(np.array([6000000.0]), np.array([5500100.0]))
+    assert (x[0], y[0]) == pytest.approx((100.0, 0.0), abs=1e-3)
+
+
+def test_local_crs_unknown_base():
+    with pytest.raises(ValueError):
+        local_crs_for_origin('EPSG:0', 0.0, 0.0, 0.0, 0.0)
+
+
+def test_transform_stage_mixed_codes():
+    x, y = get_transformer('EPSG:4326', 'EPSG:32635').transform(LAT, LON)
+    df = pd.DataFrame({'X': [LAT[0], x[1], 1.0], 'Y': [LON[0], y[1], 2.0],
+                       'CRS': ['EPSG:4326', 'EPSG:32635', 'UNKNOWN']})
+
+    result = CoordinateTransformStage('EPSG:32635', crs_col='CRS').apply(df, 'X', 'Y')
+
+    np.testing.assert_allclose(result['X'][:2], x[:2], atol=1e-6)
+    np.testing.assert_allclose(result['Y'][:2], y[:2], atol=1e-6)
+    assert np.isnan(result['X'][2]) and np.isnan(result['Y'][2])
+    assert 'UNKNOWN' not in CRS_REGISTRY
@@ -0,0 +1,139 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import tools.directories
+from tools.directories import (INDEX_COLUMN, MANIFEST_NAME, SHEET_COLUMN, STREET_COLUMN, DirectoryJob,
+                               expand_sheet_rows, generate_directories, partition_result, result_head,
+                               write_table)
+from tools.nomenclatural import NomenclaturalStreetIndexer, ProcessingJob
+
+
+def result_frame():
+    sheets = ['Лист 1', 'Лист 2', 'Ошибка']
+    return pd.DataFrame({
+        INDEX_COLUMN: ['А-1, 11', 'Б-2', 'Ошибка'],
+        SHEET_COLUMN: pd.Categorical(['Лист 1', 'Лист 2', 'Ошибка'], categories=sheets),
+        STREET_COLUMN: ['Ул. мира', 'Ул. садовая', 'Ошибка'],
+    }, index=[4, 0, 7])
+
+
+def test_expand_sheet_rows_lists_street_on_every_sheet():
+    df = result_frame()
+    sheet_rows = pd.DataFrame({
+        STREET_COLUMN: ['Ул. мира', 'Ул. мира', 'Ул. садовая'],
+        INDEX_COLUMN: ['А-1, 11', 'А-1, 11', 'Б-2'],
+        SHEET_COLUMN: pd.Categorical(['Лист 1', 'Лист 2', 'Лист 2'], categories=df[SHEET_COLUMN].cat.categories),
+    })
+    expanded = expand_sheet_rows(df, sheet_rows)
+
+    assert list(expanded.columns) == list(df.columns)
+    assert expanded.index.tolist() == [4, 4, 0, 7]
+    parts = {sheet: part[STREET_COLUMN].tolist() for sheet, _, part in partition_result(expanded)}
+    assert parts == {'Лист 1': ['Ул. мира'], 'Лист 2': ['Ул. мира', 'Ул. садовая'], 'Ошибка': ['Ошибка']}
+
+
+def test_manifest_and_files(tmp_path):
+    manifest = generate_directories(result_frame(), str(tmp_path), formats=('xlsx',), by_letter=True, max_workers=2)
+
+    assert manifest['complete']
+    assert all(entry['done'] for entry in manifest['partitions'])
+    with open(tmp_path / MANIFEST_NAME, encoding='utf-8') as f:
+        assert json.load(f) == manifest
+    for entry in manifest['partitions']:
+        for name in entry['files']:
+            assert os.path.exists(tmp_path / name)
+
+
+def test_result_file_is_read_in_batches(tmp_path, monkeypatch):
+    # Листы в порядке категорий, а не по алфавиту, и части, собранные из нескольких пачек
+    sheets = ['Лист 2', 'Лист 1', 'Ошибка']
+    df = pd.DataFrame({
+        INDEX_COLUMN: ['А-1', 'Б-2', 'В-3', 'Г-4', 'Ошибка'],
+        SHEET_COLUMN: pd.Categorical(['Лист 1', 'Лист 2', 'Лист 1', 'Лист 2', 'Ошибка'], categories=sheets),
+        STREET_COLUMN: ['Ул. мира', 'Ул. садовая', 'Пер. мира', 'Ул. мира', 'Ошибка'],
+    }, index=[3, 0, 4, 1, 2])
+    result_path = str(tmp_path / 'result.parquet')
+    df.to_parquet(result_path)
+    monkeypatch.setattr(tools.directories, 'RESULT_BATCH_ROWS', 2)
+
+    from_frame = generate_directories(df, str(tmp_path / 'frame'), formats=('xlsx',), by_letter=True, max_workers=1)
+    from_file = generate_directories(result_path, str(tmp_path / 'file'), formats=('xlsx',), by_letter=True,
+                                     max_workers=1)
+
+    assert from_file == from_frame
+    assert [(entry['sheet'], entry['letter']) for entry in from_file['partitions']] == \
+        [('Лист 2', 'У'), ('Лист 1', 'П'), ('Лист 1', 'У'), ('Ошибка', 'О')]
+    for entry in from_file['partitions']:
+        name = entry['files'][0]
+        pd.testing.assert_frame_equal(pd.read_excel(tmp_path / 'file' / name), pd.read_excel(tmp_path / 'frame' / name))
+
+    assert result_head(result_path, 2).index.tolist() == [3, 0]
+    write_table(result_path, str(tmp_path / 'result.xlsx'))
+    saved = pd.read_excel(tmp_path / 'result.xlsx')
+    assert saved.columns.tolist() == df.columns.tolist()
+    assert saved[STREET_COLUMN].tolist() == df[STREET_COLUMN].tolist()
+
+
+def test_cancel_writes_incomplete_manifest(tmp_path):
+    df = pd.concat([result_frame().assign(**{STREET_COLUMN: f'{letter} улица'}) for letter in 'АБВГДЕЖЗИК'])
+    manifest = generate_directories(df, str(tmp_path), formats=('xlsx',), by_letter=True, max_workers=1,
+                                    is_cancelled=lambda: True)
+
+    assert not manifest['complete']
+    done = [entry for entry in manifest['partitions'] if entry['done']]
+    assert 0 < len(done) < len(manifest['partitions'])
+    for entry in done:
+        assert all(os.path.exists(tmp_path / name) for name in entry['files'])
+    with open(tmp_path / MANIFEST_NAME, encoding='utf-8') as f:
+        assert json.load(f)['complete'] is False
+
+
+class BudgetScheduler:
+    def __init__(self, free):
+        self.free = free
+
+    def reserve_cpus(self, count):
+        reserved = min(count, self.free)
+        self.free -= reserved
+        return reserved
+
+    def release_cpus(self, count):
+        self.free += count
+
+
+def test_directory_job_takes_processes_from_scheduler(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(tools.directories, 'generate_directories',
+                        lambda *args, **kwargs: calls.append(args[4]) or {'complete': True})
+    job = DirectoryJob(result_frame(), str(tmp_path), max_workers=8)
+    job.scheduler = BudgetScheduler(free=2)
+
+    job.execute()
+
+    # Своё ядро задачи и два свободных; после выгрузки они возвращаются
+    assert calls == [3]
+    assert job.scheduler.free == 2
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        generate_directories(result_frame(), str(tmp_path), formats=('pdf',))
+
+
+def test_processing_job_sheet_rows(tmp_path):
+    indexer = NomenclaturalStreetIndexer(500)
+    indexer.set_origin(0.0, 0.0)
+    path = tmp_path / 'points.csv'
+    # Улица Мира проходит по двум листам, после удаления дубликатов остаётся одна строка
+    pd.DataFrame({'X': [-10.0, -10.0, -10.0], 'Y': [10.0, 5010.0, 20.0],
+                  'S': ['ул. Мира', 'ул. Мира', 'ул. Садовая']}).to_csv(path, index=False)
+    job = ProcessingJob(indexer, str(path), 'X', 'Y', 'S', checkpoint_dir=str(tmp_path / 'cp'))
+    result = job.execute()
+
+    assert len(result) == 2
+    manifest = generate_directories(result, str(tmp_path / 'out'), formats=('xlsx',), sheet_rows=job.sheet_rows)
+    rows = {entry['sheet']: entry['rows'] for entry in manifest['partitions']}
+    assert rows == {'Лист 1': 2, 'Лист 2': 1}
@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tools.external_sort import ExternalSorter
+
+
+def make_frame(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'street': rng.choice(['Мира', 'Ленина', 'Садовая', 'Гагарина', ''], n),
+        'index': rng.choice(['А-1', 'Б-2', 'В-3'], n),
+        'sheet': pd.Categorical(rng.choice(['Лист 1', 'Лист 2'], n), categories=['Лист 1', 'Лист 2', 'Ошибка']),
+        'value': np.arange(n),
+    })
+
+
+def expected(frame):
+    return frame.drop_duplicates(subset=['street', 'index'], keep='first').sort_values('street', kind='mergesort')
+
+
+def feed(sorter, frame, chunk=37):
+    for start in range(0, len(frame), chunk):
+        sorter.add(frame.iloc[start:start + chunk])
+
+
+@pytest.mark.parametrize('budget', [1, 2000, 10 ** 9])
+def test_matches_in_memory_sort(tmp_path, budget):
+    frame = make_frame(1000)
+    sorter = ExternalSorter('street', ['street', 'index'], memory_budget=budget, batch_rows=16, tmp_dir=str(tmp_path))
+    feed(sorter, frame)
+
+    pd.testing.assert_frame_equal(sorter.result(), expected(frame))
+    assert os.listdir(tmp_path) == []
+
+
+def test_iter_batches_are_bounded(tmp_path):
+    frame = make_frame(500, seed=1)
+    sorter = ExternalSorter('street', ['street', 'index'], memory_budget=1, batch_rows=4, tmp_dir=str(tmp_path))
+    feed(sorter, frame)
+
+    batches = list(sorter.iter_batches())
+    assert all(len(batch) <= 4 for batch in batches)
+    pd.testing.assert_frame_equal(pd.concat(batches), expected(frame))
+    assert os.listdir(tmp_path) == []
+
+
+def test_closing_iterator_removes_runs(tmp_path):
+    sorter = ExternalSorter('street', ['street', 'index'], memory_budget=1, batch_rows=2, tmp_dir=str(tmp_path))
+    feed(sorter, make_frame(200))
+    batches = sorter.iter_batches()
+    next(batches)
+    batches.close()
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize('budget', [1, 10 ** 9])
+def test_write_parquet(tmp_path, budget):
+    frame = make_frame(300, seed=2)
+    runs = tmp_path / 'runs'
+    runs.mkdir()
+    sorter = ExternalSorter('street', ['street', 'index'], memory_budget=budget, batch_rows=8, tmp_dir=str(runs))
+    feed(sorter, frame)
+    path = str(tmp_path / 'result.parquet')
+
+    assert sorter.write_parquet(path) == len(expected(frame))
+    pd.testing.assert_frame_equal(pd.read_parquet(path), expected(frame))
+    assert os.listdir(runs) == []
+
+
+def test_empty_and_invalid():
+    assert ExternalSorter('street', ['street']).result().empty
+    with pytest.raises(ValueError):
+        ExternalSorter('street', ['index'])
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from tools.hierarchy import HierarchyLevel, calculate_hierarchy, parse_levels
+from tools.nomenclatural import NomenclaturalStreetIndexer
+
+
+@pytest.fixture
+def indexer():
+    indexer = NomenclaturalStreetIndexer(500)
+    indexer.set_origin(0.0, 0.0)
+    return indexer
+
+
+def test_parse_levels():
+    assert [level.divisions for level in parse_levels('2, 5;')] == [2, 5]
+    assert parse_levels('') == []
+    with pytest.raises(ValueError):
+        parse_levels('1')
+
+
+def test_codes_per_level(indexer):
+    hierarchy = calculate_hierarchy(indexer, parse_levels('2, 5'), [-10.0, -490.0, -760.0, np.nan],
+                                    [10.0, 260.0, 990.0, 0.0])
+
+    assert hierarchy.depth == 2
+    assert [hierarchy.level_name(level) for level in range(3)] == ['Индекс 500 м', 'Индекс 250 м', 'Индекс 50 м']
+    assert hierarchy.codes(0).tolist() == ['А-1', 'А-1', 'Б-2', 'Ошибка']
+    assert hierarchy.codes(1).tolist() == ['А-1-1', 'А-1-4', 'Б-2-4', 'Ошибка']
+    assert hierarchy.codes(2).tolist() == ['А-1-1-1', 'А-1-4-5', 'Б-2-4-21', 'Ошибка']
+
+
+def test_base_level_matches_indexer(indexer):
+    rng = np.random.default_rng(0)
+    x, y = rng.uniform(-8000, 0, 500), rng.uniform(0, 8000, 500)
+    hierarchy = calculate_hierarchy(indexer, parse_levels('3'), x, y)
+
+    assert hierarchy.codes(0).tolist() == [indexer.calculate_nomenclatural_index(a, b) for a, b in zip(x, y)]
+
+
+def test_custom_labels_and_aggregate(indexer):
+    level = HierarchyLevel(2, labels=['а', 'б', 'в', 'г'], separator='/', numbering='column', name='Четверть')
+    hierarchy = calculate_hierarchy(indexer, [level], [-10.0, -490.0, -10.0, -10.0], [10.0, 10.0, 490.0, 20.0])
+
+    assert hierarchy.level_name(1) == 'Четверть'
+    assert hierarchy.codes(1).tolist() == ['А-1/а', 'А-1/в', 'А-1/б', 'А-1/а']
+    assert hierarchy.aggregate([7, 7, 8, 7], 1) == {7: ['А-1/а', 'А-1/в'], 8: ['А-1/б']}
+
+
+def test_requires_origin():
+    with pytest.raises(ValueError):
+        calculate_hierarchy(NomenclaturalStreetIndexer(500), parse_levels('2'), [0.0], [0.0])
@@ -0,0 +1,118 @@
+import os
+
+import pandas as pd
+import pytest
+
+from tools import ingestion
+from tools.ingestion import TableReader, detect_encoding, read_header
+from tools.inspection import inspect_workbook
+
+FRAME = pd.DataFrame({'X': [1.5, 2.5], 'Y': [3.0, 4.0], 'Улица': ['ул. Ленина', 'пр. Мира']})
+
+
+@pytest.fixture
+def reader(tmp_path):
+    return TableReader(cache_dir=str(tmp_path / 'cache'))
+
+
+@pytest.mark.parametrize('encoding, sep', [('utf-8', ','), ('utf-8-sig', ';'), ('cp1251', ';'), ('cp1251', '\t')])
+def test_csv_encodings_and_delimiters(tmp_path, reader, encoding, sep):
+    path = str(tmp_path / 'points.csv')
+    FRAME.to_csv(path, index=False, sep=sep, encoding=encoding)
+
+    assert read_header(path) == ['X', 'Y', 'Улица']
+    df = reader.read(path, columns=['Улица', 'X', 'Нет такого', None])
+    assert list(df.columns) == ['X', 'Улица']
+    assert df['Улица'].tolist() == ['ул. Ленина', 'пр. Мира']
+    assert inspect_workbook(path).columns == ['X', 'Y', 'Улица']
+
+
+def test_explicit_encoding(tmp_path):
+    path = str(tmp_path / 'points.csv')
+    FRAME.to_csv(path, index=False, encoding='cp1251')
+
+    df = TableReader(cache_dir=None, encoding='cp1251').read(path)
+    pd.testing.assert_frame_equal(df, FRAME)
+
+
+def test_detect_encoding_tolerates_split_character(tmp_path):
+    path = tmp_path / 'big.csv'
+    # Двухбайтовый символ разрезан границей прочитанного блока
+    path.write_bytes(b'a' * (1024 * 1024 - 1) + 'Ж'.encode('utf-8'))
+    assert detect_encoding(str(path)) == 'utf-8-sig'
+
+    path.write_bytes('Улица'.encode('cp1251'))
+    assert detect_encoding(str(path)) == 'cp1251'
+
+
+@pytest.mark.parametrize('extension', ['.parquet', '.feather'])
+def test_columnar_formats(tmp_path, reader, extension):
+    path = str(tmp_path / f'points{extension}')
+    (FRAME.to_parquet if extension == '.parquet' else FRAME.to_feather)(path)
+
+    assert read_header(path) == ['X', 'Y', 'Улица']
+    df = reader.read(path, columns=['Y', 'Нет такого'])
+    assert df['Y'].tolist() == [3.0, 4.0]
+
+
+def test_excel_cache_hit_does_not_open_workbook(tmp_path, reader, monkeypatch):
+    path = str(tmp_path / 'points.xlsx')
+    FRAME.to_excel(path, index=False)
+
+    first = reader.read(path, columns=['X', 'Улица', 'Нет такого'])
+    assert list(first.columns) == ['X', 'Улица']
+    assert len(os.listdir(reader.cache_dir)) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("workbook opened on cache hit")
+
+    monkeypatch.setattr(ingestion.pd, 'read_excel', fail)
+    cached = reader.read(path, columns=['X', 'Улица', 'Нет такого'])
+    pd.testing.assert_frame_equal(cached, first)
+
+
+def test_excel_cache_invalidated_by_change(tmp_path, reader):
+    path = str(tmp_path / 'points.xlsx')
+    FRAME.to_excel(path, index=False)
+    reader.read(path, columns=['X'])
+
+    FRAME.assign(X=[7.0, 8.0]).to_excel(path, index=False)
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10 ** 9))
+    assert reader.read(path, columns=['X'])['X'].tolist() == [7.0, 8.0]
+
+
+def test_cache_eviction(tmp_path):
+    reader = TableReader(cache_dir=str(tmp_path / 'cache'), max_cache_size=1)
+    for name in ('a', 'b'):
+        path = str(tmp_path / f'{name}.xlsx')
+        FRAME.to_excel(path, index=False)
+        reader.read(path)
+    assert len(os.listdir(reader.cache_dir)) <= 1
+
+
+@pytest.mark.parametrize('extension', ['.parquet', '.feather', '.xlsx'])
+def test_stored_index_is_replaced_by_positions(tmp_path, reader, extension):
+    path = str(tmp_path / f'points{extension}')
+    frame = FRAME.set_axis([100, 101], axis=0).rename_axis('id')
+    if extension == '.parquet':
+        frame.to_parquet(path)
+    elif extension == '.feather':
+        frame.reset_index(drop=True).to_feather(path)
+    else:
+        frame.to_excel(path)
+
+    for _ in range(2):
+        df = reader.read(path, columns=['X', 'Улица'])
+        assert df.index.tolist() == [0, 1]
+        assert df['Улица'].tolist() == ['ул. Ленина', 'пр. Мира']
+
+
+def test_concurrent_cache_writes(tmp_path, reader):
+    from concurrent.futures import ThreadPoolExecutor
+
+    cache_path = os.path.join(reader.cache_dir, 'same.parquet')
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: reader.write_cache(FRAME, cache_path), range(16)))
+
+    assert os.listdir(reader.cache_dir) == ['same.parquet']
+    pd.testing.assert_frame_equal(pd.read_parquet(cache_path), FRAME)
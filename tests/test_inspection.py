@@ -0,0 +1,88 @@
+import sys
+
+import pandas as pd
+import pytest
+
+from tools.inspection import inspect_workbook, suggest_columns
+
+FRAME = pd.DataFrame({
+    'Код': [1, 2, 3, 4],
+    'КООРД_X': [10.5, 11.0, 12.5, 13.0],
+    'КООРД_Y': [20.5, 21.0, 22.5, 23.0],
+    'Адресный ориентир': ['УЛ. ЛЕНИНА', 'ПР. МИРА', 'ПЕР. САДОВЫЙ', 'УЛ.ГАГАРИНА'],
+})
+
+
+def test_suggest_columns_by_name_and_content():
+    assert suggest_columns(FRAME) == {'x': 'КООРД_X', 'y': 'КООРД_Y', 'street': 'Адресный ориентир'}
+
+
+def test_non_numeric_coordinates_are_not_suggested():
+    sample = pd.DataFrame({'X': ['a', 'b'], 'Y': [1.0, 2.0], 'Примечание': ['нет', 'нет']})
+    assert suggest_columns(sample) == {'x': None, 'y': 'Y', 'street': None}
+
+
+@pytest.mark.parametrize('extension', ['.xlsx', '.csv', '.parquet', '.feather'])
+def test_inspect_formats(tmp_path, extension):
+    path = str(tmp_path / f'points{extension}')
+    writers = {'.xlsx': lambda: FRAME.to_excel(path, index=False),
+               '.csv': lambda: FRAME.to_csv(path, index=False, sep=';'),
+               '.parquet': lambda: FRAME.to_parquet(path),
+               '.feather': lambda: FRAME.to_feather(path)}
+    writers[extension]()
+
+    info = inspect_workbook(path, sample_rows=2)
+
+    assert info.columns == list(FRAME.columns)
+    assert len(info.sample) == 2
+    assert info.suggestions['x'] == 'КООРД_X'
+    assert info.missing_columns('КООРД_X', 'Нет', None) == ['Нет']
+    if extension != '.csv':
+        assert info.row_estimate == 4
+
+
+class FakeSheet:
+    def __init__(self, rows):
+        self.rows = rows
+        self.nrows = len(rows)
+
+    def row_values(self, row):
+        return self.rows[row]
+
+
+class FakeXlrd:
+    """Заменяет xlrd: проверяем, что загружается только первый лист."""
+
+    def __init__(self):
+        self.calls = []
+
+    def open_workbook(self, path, on_demand=False):
+        self.calls.append(('open', on_demand))
+        return self
+
+    def sheet_names(self):
+        return ['Точки', 'Справка']
+
+    def sheet_by_index(self, index):
+        self.calls.append(('sheet', index))
+        return FakeSheet([['X', 'Y', 'SEM9'], [1.5, 2.5, 'УЛ. МИРА'], [3.0, '', 'ПР. ЛЕНИНА'], [4.0, 5.0, '']])
+
+    def release_resources(self):
+        self.calls.append(('release',))
+
+
+def test_inspect_xls_reads_first_sheet_on_demand(tmp_path, monkeypatch):
+    fake = FakeXlrd()
+    monkeypatch.setitem(sys.modules, 'xlrd', fake)
+    path = tmp_path / 'points.xls'
+    path.write_bytes(b'')
+
+    info = inspect_workbook(str(path), sample_rows=2)
+
+    assert fake.calls == [('open', True), ('sheet', 0), ('release',)]
+    assert info.sheet_names == ['Точки', 'Справка']
+    assert info.columns == ['X', 'Y', 'SEM9']
+    assert pd.isna(info.sample['Y'].iloc[1])
+    assert len(info.sample) == 2
+    assert info.row_estimate == 3
+    assert info.suggestions == {'x': 'X', 'y': 'Y', 'street': 'SEM9'}
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+
+import pytest
+from PyQt5.QtCore import QCoreApplication
+
+from tools.jobs import Job, JobScheduler
+from tools.nomenclatural import NomenclaturalStreetIndexer, ProcessingJob
+from tools.quality import QualityScanJob
+from tools.sheet_layout import SheetLayout
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+class EchoJob(Job):
+    def __init__(self, value, gate=None, fail=False):
+        super().__init__(f"echo {value}")
+        self.value = value
+        self.gate = gate
+        self.fail = fail
+
+    def execute(self):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.report_progress(50)
+        self.check_cancelled()
+        if self.fail:
+            raise RuntimeError("boom")
+        self.report_progress(100)
+        return self.value
+
+
+class HoldJob(Job):
+    """Держит ядро (и reserve занятых сверх него) до открытия gate."""
+
+    def __init__(self, gate, reserve=0):
+        super().__init__("hold")
+        self.gate = gate
+        self.reserve = reserve
+        self.reserved = None
+        self.started = threading.Event()
+
+    def execute(self):
+        self.reserved = self.reserve_cpus(self.reserve)
+        self.started.set()
+        try:
+            self.gate.wait(5)
+        finally:
+            self.release_cpus(self.reserved)
+        return self.reserved
+
+
+def run_until_idle(scheduler, events):
+    deadline = time.time() + 5
+    while scheduler.active_jobs() and time.time() < deadline:
+        time.sleep(0.01)
+    scheduler.flush()
+    return events
+
+
+def collect(scheduler):
+    events = []
+    scheduler.job_progress.connect(lambda job_id, value: events.append(('progress', job_id, value)))
+    scheduler.job_finished.connect(lambda job_id, result: events.append(('finished', job_id, result)))
+    scheduler.job_failed.connect(lambda job_id, error: events.append(('failed', job_id, error)))
+    scheduler.job_cancelled.connect(lambda job_id: events.append(('cancelled', job_id)))
+    return events
+
+
+def test_results_failures_and_coalesced_progress(app):
+    scheduler = JobScheduler(max_workers=2, flush_interval=10_000)
+    events = collect(scheduler)
+    try:
+        ok = scheduler.submit(EchoJob('a'))
+        bad = scheduler.submit(EchoJob('b', fail=True))
+        run_until_idle(scheduler, events)
+    finally:
+        scheduler.shutdown()
+
+    assert ('finished', ok, 'a') in events
+    assert ('failed', bad, 'boom') in events
+    # Из нескольких отчётов одной задачи до flush доходит только последний
+    assert [e for e in events if e[0] == 'progress' and e[1] == ok] == [('progress', ok, 100)]
+
+
+def test_cancel_running_and_queued(app):
+    scheduler = JobScheduler(max_workers=1, flush_interval=10_000)
+    events = collect(scheduler)
+    gate = threading.Event()
+    try:
+        running = scheduler.submit(EchoJob('a', gate=gate))
+        queued = scheduler.submit(EchoJob('b'))
+        scheduler.cancel(running)
+        scheduler.cancel(queued)
+        gate.set()
+        run_until_idle(scheduler, events)
+    finally:
+        scheduler.shutdown()
+
+    assert ('cancelled', running) in events
+    assert ('cancelled', queued) in events
+    assert not [e for e in events if e[0] == 'finished']
+
+
+def test_reserved_cpus_count_against_the_budget(app, monkeypatch):
+    monkeypatch.setattr(os, 'cpu_count', lambda: 3)
+    scheduler = JobScheduler(max_workers=3, flush_interval=10_000)
+    events = collect(scheduler)
+    gate = threading.Event()
+    try:
+        first = HoldJob(gate)
+        scheduler.submit(first)
+        assert first.started.wait(5)
+        # Из трёх ядер одно у first, одно у самой задачи - занять можно только одно
+        greedy = HoldJob(gate, reserve=5)
+        scheduler.submit(greedy)
+        assert greedy.started.wait(5)
+        assert greedy.reserved == 1
+
+        # Все ядра заняты: следующая задача ждёт, хотя свободный поток есть
+        waiting = scheduler.submit(EchoJob('c'))
+        time.sleep(0.2)
+        scheduler.flush()
+        assert not [e for e in events if e[0] == 'finished' and e[1] == waiting]
+
+        gate.set()
+        run_until_idle(scheduler, events)
+    finally:
+        scheduler.shutdown()
+
+    assert ('finished', waiting, 'c') in events
+    assert scheduler.reserve_cpus(5) == 3
+
+
+def test_jobs_freeze_indexer_settings(tmp_path):
+    indexer = NomenclaturalStreetIndexer(500, SheetLayout(names=['A', 'B', 'C', 'D']))
+    indexer.set_origin(10.0, 20.0)
+    path = str(tmp_path / 'points.csv')
+
+    jobs = [ProcessingJob(indexer, path, 'X', 'Y'), QualityScanJob(indexer, path, 'X', 'Y')]
+    indexer.set_origin(0.0, 0.0)
+    indexer.square_size = 250
+    indexer.sheet_layout = SheetLayout()
+
+    for job in jobs:
+        assert (job.indexer.origin_x, job.indexer.origin_y) == (10.0, 20.0)
+        assert job.indexer.square_size == 500
+        assert job.indexer.sheet_layout.names == ['A', 'B', 'C', 'D']
+        assert job.indexer.sheet_layout.signature() == SheetLayout(names=['A', 'B', 'C', 'D']).signature()
@@ -0,0 +1,140 @@
+import json
+
+import pandas as pd
+import pytest
+
+from tools import map_backend
+from tools.check_and_match import CheckAndMatchLogic
+from tools.map_backend import (ERROR_SEMANTIC_NAME, GeoJSONMapBackend, MapBackend, MapBackendError, SemanticWriter,
+                               SQLiteMapBackend, open_map_backend)
+
+
+def point(key, layer, x, y, **properties):
+    return {'type': 'Feature', 'id': key, 'geometry': {'type': 'Point', 'coordinates': [y, x]},
+            'properties': {'layer': layer, **properties}}
+
+
+@pytest.fixture
+def geojson_path(tmp_path):
+    path = tmp_path / 'map.geojson'
+    features = [point(1, 'check', 0.0, 0.0, name='Мира'), point(2, 'check', 100.0, 0.0, name='Ленина'),
+                point(3, 'target', 1.0, 0.0, name='Мира'), point(4, 'target', 101.0, 0.0, name='Садовая')]
+    path.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}), encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def sqlite_path(tmp_path):
+    path = str(tmp_path / 'map.sqlite')
+    backend = SQLiteMapBackend(path)
+    backend.add_objects('check', pd.DataFrame({'key': [1, 2], 'x': [0.0, 100.0], 'y': [0.0, 0.0],
+                                               'name': ['Мира', 'Ленина']}))
+    backend.add_objects('target', pd.DataFrame({'key': [3, 4], 'x': [1.0, 101.0], 'y': [0.0, 0.0],
+                                                'name': ['Мира', 'Садовая']}))
+    backend.close()
+    return path
+
+
+def values(backend, layer, code):
+    objects = backend.read_objects(layer, code)
+    return dict(zip(objects['key'].tolist(), objects['value'].tolist()))
+
+
+@pytest.mark.parametrize('path_fixture', ['sqlite_path', 'geojson_path'])
+def test_read_write_and_delete(request, path_fixture):
+    backend = open_map_backend(request.getfixturevalue(path_fixture))
+    assert backend.layers() == ['check', 'target']
+    assert ('name', 'name') in backend.semantics('check')
+
+    backend.write_semantics('check', 'flag', [(1, 'a'), (2, 'b')])
+    backend.write_semantics('check', 'flag', [(1, None), (2, 'c')])
+    assert values(backend, 'check', 'flag') == {1: None, 2: 'c'}
+    backend.close()
+
+
+def test_geojson_saves_once(geojson_path, monkeypatch):
+    saves = []
+    replace = map_backend.os.replace
+    monkeypatch.setattr(map_backend.os, 'replace', lambda src, dst: (saves.append(dst), replace(src, dst)))
+    backend = GeoJSONMapBackend(geojson_path)
+
+    with SemanticWriter(backend, 'check', 'flag', batch_size=1) as writer:
+        writer.add(1, 'a')
+        writer.add(2, 'b')
+        assert saves == []
+    assert saves == [geojson_path]
+    assert values(GeoJSONMapBackend(geojson_path), 'check', 'flag') == {1: 'a', 2: 'b'}
+
+    # Без изменений файл не перезаписывается
+    backend.close()
+    assert len(saves) == 1
+
+
+class FlakyBackend(MapBackend):
+    def __init__(self, failures):
+        self.failures = failures
+        self.batches = []
+        self.saved = 0
+
+    def write_semantics(self, layer, code, values):
+        if self.failures:
+            self.failures -= 1
+            raise MapBackendError("locked")
+        self.batches.append(list(values))
+
+    def save(self):
+        self.saved += 1
+
+
+def test_writer_retries_batches():
+    backend = FlakyBackend(failures=2)
+    with SemanticWriter(backend, 'layer', 'code', batch_size=2, retry_delay=0) as writer:
+        for key in range(3):
+            writer.add(key, 'x')
+
+    assert backend.batches == [[(0, 'x'), (1, 'x')], [(2, 'x')]]
+    assert writer.written == 3
+    assert backend.saved == 1
+
+    with pytest.raises(MapBackendError):
+        with SemanticWriter(FlakyBackend(failures=5), 'layer', 'code', retries=1, retry_delay=0) as writer:
+            writer.add(0, 'x')
+
+
+@pytest.mark.parametrize('path_fixture', ['sqlite_path', 'geojson_path'])
+def test_write_errors_clears_matched_objects(request, path_fixture):
+    backend = open_map_backend(request.getfixturevalue(path_fixture))
+    # Ошибка прошлого запуска у объекта, который теперь сопоставляется
+    backend.write_semantics('check', ERROR_SEMANTIC_NAME, [(1, 'старая ошибка')])
+
+    logic = CheckAndMatchLogic()
+    logic.params.update({'check_layer': 'check', 'max_dist': 5.0})
+    logic.match(backend.read_objects('check', 'name'), backend.read_objects('target', 'name'))
+    assert logic.write_errors(backend, batch_size=1) == 2
+
+    assert logic.params['written_count'] == 1
+    assert logic.params['cleared_count'] == 1
+    code = backend.ensure_semantic('check', ERROR_SEMANTIC_NAME)
+    errors = values(backend, 'check', code)
+    assert errors[1] is None
+    assert errors[2] is not None
+    backend.close()
+
+
+def test_geojson_string_ids(tmp_path):
+    path = tmp_path / 'map.geojson'
+    features = [point('a1', 'check', 0.0, 0.0, name='Мира'), point(7, 'check', 100.0, 0.0, name='Ленина'),
+                point('t1', 'target', 1.0, 0.0, name='Мира')]
+    path.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}), encoding='utf-8')
+    backend = GeoJSONMapBackend(str(path))
+
+    assert backend.read_objects('check', 'name')['key'].tolist() == ['a1', 7]
+    logic = CheckAndMatchLogic()
+    logic.params.update({'check_layer': 'check', 'max_dist': 5.0})
+    logic.match(backend.read_objects('check', 'name'), backend.read_objects('target', 'name'))
+    assert logic.params['success_transfers'] == [('a1', 't1', 1.0)]
+
+    logic.write_errors(backend)
+    saved = {feature['id']: feature['properties'] for feature in json.loads(path.read_text(encoding='utf-8'))['features']}
+    assert ERROR_SEMANTIC_NAME not in saved['a1']
+    assert saved[7][ERROR_SEMANTIC_NAME]
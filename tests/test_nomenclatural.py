@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tools.nomenclatural import NomenclaturalStreetIndexer, ProcessingJob, compress_indices
+
+
+@pytest.mark.parametrize('indices, expected', [
+    ({'А-1'}, 'А-1'),
+    ({'А-3', 'А-1', 'А-2'}, 'А-1, 2, 3'),
+    ({'А-1', 'Б-1', 'В-2'}, 'А, Б-1; В-2'),
+    ({'А-1', 'А-2', 'Б-1'}, 'А, Б-1; А-2'),
+])
+def test_compress_indices(indices, expected):
+    assert compress_indices(indices) == expected
+
+
+def test_indices_and_sheets():
+    indexer = NomenclaturalStreetIndexer(500)
+    indexer.set_origin(0.0, 0.0)
+
+    assert indexer.calculate_nomenclatural_index(-10.0, 10.0) == 'А-1'
+    assert indexer.calculate_nomenclatural_index(-510.0, 1010.0) == 'Б-3'
+    assert indexer.calculate_sheet_ids([np.nan], [0.0]).tolist() == [-1]
+
+
+@pytest.fixture
+def indexer():
+    indexer = NomenclaturalStreetIndexer(500)
+    indexer.set_origin(0.0, 0.0)
+    return indexer
+
+
+def run(indexer, tmp_path, df, street_col, **kwargs):
+    path = tmp_path / 'points.csv'
+    df.to_csv(path, index=False)
+    return ProcessingJob(indexer, str(path), 'X', 'Y', street_col, checkpoint_dir=str(tmp_path / 'cp'),
+                         chunk_size=2, **kwargs).execute()
+
+
+def test_streets_are_merged_and_sorted(indexer, tmp_path):
+    df = pd.DataFrame({'X': [-10.0, -510.0, -10.0, -10.0, np.nan],
+                       'Y': [10.0, 10.0, 510.0, 10.0, 10.0],
+                       'S': ['ул. Мира', 'ул. Мира', 'ул. Мира', 'ул. Ленина', 'ул. Садовая']})
+    result = run(indexer, tmp_path, df, 'S')
+
+    rows = result.set_index('Форматированная улица')
+    assert list(rows.index) == sorted(rows.index)
+    assert rows.loc['Ул. мира', 'Номенклатурный индекс'] == 'А, Б-1; А-2'
+    assert rows.loc['Ул. мира', 'Статус уникальности'] == 'Повторяется'
+    assert rows.loc['Ул. ленина', 'Статус уникальности'] == 'Уникальное'
+    assert rows.loc['Ошибка', 'Лист карты'] == 'Ошибка'
+
+
+def test_without_street_column(indexer, tmp_path):
+    df = pd.DataFrame({'X': [-10.0, -10.0, -510.0], 'Y': [10.0, 10.0, 10.0]})
+    result = run(indexer, tmp_path, df, None)
+
+    assert result['Номенклатурный индекс'].tolist() == ['А-1', 'Б-1']
+    assert set(result['Статус уникальности']) == {'Уникальное'}
+
+
+def test_parquet_input_with_stored_index(indexer, tmp_path):
+    path = tmp_path / 'points.parquet'
+    pd.DataFrame({'X': [-10.0, np.nan, -510.0], 'Y': [10.0, 10.0, 10.0], 'S': ['ул. Мира', 'ул. Мира', 'ул. Садовая']},
+                 index=[100, 101, 102]).to_parquet(path)
+    result = ProcessingJob(indexer, str(path), 'X', 'Y', 'S', checkpoint_dir=str(tmp_path / 'cp')).execute()
+
+    rows = result.set_index('Форматированная улица')['Номенклатурный индекс'].to_dict()
+    assert rows == {'Ул. мира': 'А-1', 'Ул. садовая': 'Б-1', 'Ошибка': 'А-1'}
+
+
+def test_sub_levels_without_street_column(indexer, tmp_path):
+    from tools.hierarchy import parse_levels
+
+    df = pd.DataFrame({'X': [-10.0, -260.0, -10.0, -20.0], 'Y': [10.0, 10.0, 260.0, 20.0]})
+    result = run(indexer, tmp_path, df, None, hierarchy_levels=parse_levels('2'))
+
+    assert result['Номенклатурный индекс'].tolist() == ['А-1', 'А-1', 'А-1']
+    assert result['Индекс 250 м'].tolist() == ['А-1-1', 'А-1-2', 'А-1-3']
+
+
+@pytest.mark.parametrize('budget', [1, 256 * 1024 ** 2])
+def test_result_file_matches_in_memory_result(indexer, tmp_path, budget):
+    df = pd.DataFrame({'X': [-10.0, -510.0, -10.0, -10.0, np.nan, -1010.0],
+                       'Y': [10.0, 10.0, 510.0, 10.0, 10.0, 5010.0],
+                       'S': ['ул. Мира', 'ул. Мира', 'ул. Мира', 'ул. Ленина', 'ул. Садовая', 'ул. Ленина']})
+    expected = run(indexer, tmp_path, df, 'S')
+    result_path = str(tmp_path / 'result.parquet')
+
+    job = ProcessingJob(indexer, str(tmp_path / 'points.csv'), 'X', 'Y', 'S', checkpoint_dir=str(tmp_path / 'cp'),
+                        chunk_size=2, memory_budget=budget, result_path=result_path)
+    assert job.execute() == result_path
+    assert job.df_result is None
+    pd.testing.assert_frame_equal(pd.read_parquet(result_path), expected)
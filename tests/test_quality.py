@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tools.nomenclatural import NomenclaturalStreetIndexer
+from tools.quality import (FLAG_DUPLICATE, FLAG_MISSING, FLAG_NEGATIVE_ROW, FLAG_NOT_TRANSFORMED,
+                           FLAG_OUT_OF_EXTENT, FLAG_UNPARSEABLE, FLAG_WRAPPED_COLUMN, QualityScanJob,
+                           scan_coordinates)
+
+
+@pytest.fixture
+def indexer():
+    indexer = NomenclaturalStreetIndexer(500)
+    indexer.set_origin(0.0, 0.0)
+    return indexer
+
+
+def test_flags(indexer):
+    x = ['-10', '', 'abc', '-10', '-10', '-20000', '-10000', '-10']
+    y = ['10', '10', '10', '-10', '10', '10', '10', '100000']
+    report = scan_coordinates(indexer, x, y)
+
+    assert report.flags.tolist() == [
+        0,
+        FLAG_MISSING,
+        FLAG_UNPARSEABLE,
+        FLAG_NEGATIVE_ROW | FLAG_OUT_OF_EXTENT,
+        FLAG_DUPLICATE,
+        FLAG_WRAPPED_COLUMN | FLAG_OUT_OF_EXTENT,
+        FLAG_OUT_OF_EXTENT,
+        FLAG_OUT_OF_EXTENT,
+    ]
+    assert report.flagged_count == 7
+    assert report.summary()[0] == "Строк: 8, с замечаниями: 7"
+
+
+def test_flagged_rows(indexer):
+    report = scan_coordinates(indexer, [-10.0, np.nan, -10.0], [10.0, 10.0, 10.0])
+    rows = report.flagged_rows()
+
+    assert rows['Строка файла'].tolist() == [3, 4]
+    assert rows['Замечания'].tolist() == ["Нет координаты", "Повтор координат"]
+
+
+def test_not_transformed(indexer):
+    report = scan_coordinates(indexer, [1.0, 2.0], [1.0, 2.0], projected=([-10.0, np.nan], [10.0, np.nan]))
+    assert report.flags.tolist() == [0, FLAG_NOT_TRANSFORMED]
+
+
+def test_requires_origin():
+    with pytest.raises(ValueError):
+        scan_coordinates(NomenclaturalStreetIndexer(500), [0.0], [0.0])
+
+
+def test_scan_job(indexer, tmp_path):
+    path = tmp_path / 'points.csv'
+    pd.DataFrame({'X': [-10.0, -10.0], 'Y': [10.0, 10.0]}).to_csv(path, index=False)
+    report = QualityScanJob(indexer, str(path), 'X', 'Y').execute()
+    assert report.flags.tolist() == [0, FLAG_DUPLICATE]
@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+
+from tools.result_diff import (ADDED, CHANGED, REMOVED, ResultDiffJob, diff_results, diff_summary, expand_cells,
+                               street_key, summarize_result)
+
+
+def result(rows):
+    return pd.DataFrame(rows, columns=['Номенклатурный индекс', 'Лист карты', 'Форматированная улица',
+                                       'Статус уникальности'])
+
+
+OLD = result([
+    ('А-1, 2', 'Лист 1', 'Ул. мира', 'Повторяется'),
+    ('Б-3', 'Лист 2', 'Ул. ленина', 'Уникальное'),
+    ('В-4', 'Лист 1', 'Пер. садовый', 'Уникальное'),
+    ('Ошибка', 'Ошибка', 'Ошибка', 'Уникальное'),
+])
+
+
+@pytest.mark.parametrize('text, cells', [
+    ('А-1', {'А-1'}),
+    ('А-1, 2, 5', {'А-1', 'А-2', 'А-5'}),
+    ('Б, В-1; Л-13', {'Б-1', 'В-1', 'Л-13'}),
+    ('Ошибка', set()),
+])
+def test_expand_cells(text, cells):
+    assert expand_cells(text) == cells
+
+
+def test_street_key_ignores_spelling():
+    assert street_key('Ул. мира') == street_key('МИРА УЛИЦА')
+    assert street_key('Ул. мира') != street_key('Пр. мира')
+
+
+def test_summarize_merges_rows_and_skips_errors():
+    records = summarize_result(pd.concat([OLD, result([('Г-7', 'Лист 3', 'Ул. мира', 'Повторяется')])]))
+
+    assert set(records) == {'Ул. мира', 'Ул. ленина', 'Пер. садовый'}
+    assert records['Ул. мира'].cells == {'А-1', 'А-2', 'Г-7'}
+    assert records['Ул. мира'].sheets == {'Лист 1', 'Лист 3'}
+
+
+def test_diff_results():
+    new = result([
+        ('А-2, 3', 'Лист 1', 'МИРА УЛИЦА', 'Повторяется'),
+        ('Б-3', 'Лист 2', 'Ул. ленина', 'Уникальное'),
+        ('Д-5', 'Лист 4', 'Пр. новый', 'Уникальное'),
+    ])
+    report = diff_results(OLD, new)
+
+    rows = {row['Улица']: row for row in report.to_dict('records')}
+    assert report['Изменение'].tolist() == [ADDED, REMOVED, CHANGED]
+    assert rows['Пр. новый']['Листы стало'] == 'Лист 4'
+    assert rows['Пер. садовый']['Удалены квадраты'] == 'В-4'
+    assert rows['МИРА УЛИЦА']['Добавлены квадраты'] == 'А-3'
+    assert rows['МИРА УЛИЦА']['Удалены квадраты'] == 'А-1'
+    assert diff_summary(report) == {ADDED: 1, REMOVED: 1, CHANGED: 1}
+
+
+def test_identical_results_have_no_changes():
+    assert diff_results(OLD, OLD.iloc[::-1]).empty
+
+
+def test_missing_columns():
+    with pytest.raises(ValueError):
+        summarize_result(OLD.drop(columns=['Лист карты']))
+
+
+def test_job_compares_file_with_frame(tmp_path):
+    old_path = str(tmp_path / 'old.csv')
+    OLD.to_csv(old_path, index=False)
+    output_path = str(tmp_path / 'diff.csv')
+
+    summary = ResultDiffJob(old_path, OLD.iloc[:2], output_path).execute()
+
+    assert summary == {ADDED: 0, REMOVED: 1, CHANGED: 0}
+    report = pd.read_csv(output_path, sep=';', encoding='utf-8-sig')
+    assert report['Улица'].tolist() == ['Пер. садовый']
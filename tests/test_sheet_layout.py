@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from tools.nomenclatural import NomenclaturalStreetIndexer
+from tools.sheet_layout import SheetLayout
+
+
+def legacy_list_number(delta_x, delta_y, square_size=500, border=4500):
+    # Прежний calculate_list_number: четыре листа 2 x 2 по 9 квадратов
+    number = np.floor(delta_y / square_size) + 1
+    if number <= 9:
+        return "Лист 1" if delta_x <= border else "Лист 3"
+    return "Лист 2" if delta_x <= border else "Лист 4"
+
+
+def test_default_layout_matches_legacy_sheets():
+    rng = np.random.default_rng(0)
+    indexer = NomenclaturalStreetIndexer(500)
+    indexer.set_origin(0.0, 0.0)
+    delta_x = rng.uniform(-2000, 11000, 2000)
+    delta_y = rng.uniform(-2000, 11000, 2000)
+
+    ids = indexer.calculate_sheet_ids(-delta_x, delta_y)
+    names = [indexer.sheet_layout.sheet_name(sheet_id) for sheet_id in ids.tolist()]
+    assert names == [legacy_list_number(dx, dy) for dx, dy in zip(delta_x, delta_y)]
+
+
+@pytest.mark.parametrize('numbering', ['column', 'row'])
+def test_vectorized_ids_match_scalar_rule(numbering):
+    layout = SheetLayout(sheet_rows=3, sheet_cols=4, cell_rows=5, cell_cols=2, numbering=numbering, clamp=False)
+    cols, rows = np.meshgrid(np.arange(-3, 12), np.arange(-3, 18))
+    ids = layout.sheet_ids(cols.ravel(), rows.ravel())
+
+    for col, row, sheet_id in zip(cols.ravel().tolist(), rows.ravel().tolist(), ids.tolist()):
+        sheet_row, sheet_col = row // 5, col // 2
+        if not (0 <= sheet_row < 3 and 0 <= sheet_col < 4):
+            assert sheet_id == -1
+        elif numbering == 'column':
+            assert sheet_id == sheet_col * 3 + sheet_row
+        else:
+            assert sheet_id == sheet_row * 4 + sheet_col
+
+
+def test_names_and_categorical():
+    layout = SheetLayout(1, 2, names=['Север', 'Юг'], error_label='Вне карты')
+    categorical = layout.to_categorical([0, 1, -1])
+
+    assert layout.sheet_name(1) == 'Юг'
+    assert list(categorical) == ['Север', 'Юг', 'Вне карты']
+    assert list(categorical.categories) == ['Север', 'Юг', 'Вне карты']
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'sheet_rows': 0},
+    {'numbering': 'diagonal'},
+    {'names': ['A', 'B']},
+    {'names': ['A', 'A', 'B', 'C']},
+    {'names': ['A', 'B', 'C', 'Ошибка']},
+])
+def test_invalid_layouts(kwargs):
+    with pytest.raises(ValueError):
+        SheetLayout(**kwargs)
@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Отдельный процесс: в нём ещё не загружены pandas и уже созданное приложение Qt
+SCRIPT = """
+import json, sys
+import main
+from PyQt5.QtWidgets import QApplication
+
+state = {'import': sorted(m for m in ('pandas', 'numpy', 'ui', 'docx') if m in sys.modules)}
+app = QApplication([])
+window = main.MainApp()
+state['window'] = sorted(m for m in ('pandas', 'ui') if m in sys.modules)
+window.ensure_tab(0)
+state['first_tab'] = [window.excel_processor is not None, window.check_and_match is None]
+window.tab_widget.setCurrentIndex(1)
+state['second_tab'] = window.check_and_match is not None
+state['docx'] = 'docx' in sys.modules
+window.close()
+print(json.dumps(state))
+"""
+
+
+def test_heavy_modules_load_with_first_tab():
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    output = subprocess.run([sys.executable, '-c', SCRIPT], cwd=ROOT, env=env, capture_output=True,
+                            text=True, timeout=120, check=True).stdout
+    state = json.loads(output.strip().splitlines()[-1])
+
+    assert state['import'] == []
+    assert state['window'] == []
+    assert state['first_tab'] == [True, True]
+    assert state['second_tab'] is True
+    assert state['docx'] is False
@@ -0,0 +1,107 @@
+import re
+import random
+
+import pytest
+
+from tools.streets import StreetResolver, bounded_levenshtein, canonicalize_street
+
+
+def levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+@pytest.mark.parametrize('a, b, expected', [
+    ('ЛЕНИНА', 'ЛЕНИНА', 0),
+    ('ЛЕНИНА', 'ЛЕНИНАА', 1),
+    ('ЛЕНИНА', 'ЛЕНЕНА', 1),
+    ('ЛЕНИНА', 'ЕНИНА', 1),
+    ('АБ', 'БА', 2),
+    ('', 'АБ', 2),
+])
+def test_bounded_levenshtein_cases(a, b, expected):
+    assert bounded_levenshtein(a, b, 3) == expected
+    assert bounded_levenshtein(b, a, 3) == expected
+
+
+def test_bounded_levenshtein_matches_full_distance():
+    rng = random.Random(0)
+    for _ in range(3000):
+        a = ''.join(rng.choice('АБВ') for _ in range(rng.randint(0, 8)))
+        b = ''.join(rng.choice('АБВ') for _ in range(rng.randint(0, 8)))
+        max_distance = rng.randint(0, 3)
+        assert bounded_levenshtein(a, b, max_distance) == min(levenshtein(a, b), max_distance + 1), (a, b)
+
+
+def test_canonicalize_street_ignores_spelling_of_type():
+    expected = ('УЛ.', 'ЛЕНИНА')
+    for name in ('УЛ. ЛЕНИНА', 'ул. Ленина ', 'УЛ.ЛЕНИНА', 'Ленина улица', 'ЛЕНИНА, УЛ'):
+        assert canonicalize_street(name) == expected
+
+
+def test_resolver_merges_variants_and_picks_frequent_spelling():
+    names = ['УЛ. ЛЕНИНА', 'ул. Ленина ', 'УЛ. ЛЕНИНА', 'УЛ.ЛЕНИНА', 'УЛ. ЛЕНИННА', 'ПР. ЛЕНИНА']
+    street_ids, representatives = StreetResolver().resolve(names)
+
+    assert len(set(street_ids[:5].tolist())) == 1
+    assert street_ids[5] != street_ids[0]
+    assert representatives[street_ids[0]] == 'УЛ. ЛЕНИНА'
+
+
+def test_resolver_keeps_numbers_and_short_names_apart():
+    street_ids, _ = StreetResolver().resolve(['1-Я ЛИНИЯ', '2-Я ЛИНИЯ', 'УЛ. МИР', 'УЛ. МИА'])
+    assert len(set(street_ids.tolist())) == 4
+
+
+def test_resolver_does_not_chain_through_variants():
+    # Второе написание в одной правке от первого и третьего, первое и третье - в двух
+    names = ['УЛ. АБВГДЕ'] * 3 + ['УЛ. АБВГДЖ'] * 2 + ['УЛ. АБВГЗЖ']
+    street_ids, _ = StreetResolver().resolve(names)
+
+    assert street_ids[3] == street_ids[0]
+    assert street_ids[5] != street_ids[0]
+
+
+def brute_force_cluster(resolver, keys, weights):
+    order = sorted(range(len(keys)), key=lambda i: -weights[i])
+    result = list(range(len(keys)))
+    found = []
+    for i in order:
+        street_type, name = keys[i]
+        if len(name) < resolver.min_length:
+            continue
+        best = None
+        for j in found:
+            other_type, other = keys[j]
+            if other_type != street_type or re.findall(r'\d+', name) != re.findall(r'\d+', other):
+                continue
+            distance = levenshtein(name, other)
+            if distance <= resolver.max_distance and (best is None or distance < best[0]):
+                best = (distance, j)
+        if best is None:
+            found.append(i)
+        else:
+            result[i] = best[1]
+    return result
+
+
+def test_blocking_finds_same_clusters_as_brute_force():
+    rng = random.Random(1)
+    roots = [''.join(rng.choice('АБВГДЕ') for _ in range(rng.randint(5, 8))) for _ in range(60)]
+    names = set()
+    for root in roots:
+        names.add(root)
+        for _ in range(3):
+            pos = rng.randrange(len(root))
+            names.add(root[:pos] + rng.choice('АБВГДЕ') + root[pos + 1:])
+    keys = [('УЛ.', name) for name in sorted(names)]
+    weights = [rng.randint(1, 5) for _ in keys]
+
+    for max_distance in (1, 2):
+        resolver = StreetResolver(max_distance=max_distance)
+        assert resolver._cluster(keys, weights) == brute_force_cluster(resolver, keys, weights)
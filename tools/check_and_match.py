@@ -0,0 +1,412 @@
+import logging
+import numpy as np
+import pandas as pd
+
+from typing import Dict, Optional, Tuple
+
+from tools.streets import canonicalize_street
+from tools.jobs import Job
+from tools.map_backend import ERROR_SEMANTIC_NAME, MapBackend, SemanticWriter
+
+MATCHED = 0
+FAILED_NO_SEM_VALUE = 1
+FAILED_BY_DISTANCE = 2
+FAILED_BY_SEM = 3
+FAILED_BY_BOTH = 4
+FAILED_TARGET_TAKEN = 5
+
+FAILURE_REASONS = {
+    FAILED_NO_SEM_VALUE: ('failed_no_sem_value', "Отсутствует значение семантики"),
+    FAILED_BY_DISTANCE: ('failed_by_distance', "Нет объектов в радиусе"),
+    FAILED_BY_SEM: ('failed_by_sem', "Несоответствие семантики"),
+    FAILED_BY_BOTH: ('failed_by_both', "Нет объектов в радиусе + несоответствие семантики"),
+    # Только при связи один к одному: подходящие объекты в радиусе отданы другим проверяемым
+    FAILED_TARGET_TAKEN: ('failed_target_taken', "Подходящий объект в радиусе уже сопоставлен с другим"),
+}
+
+
+class SemanticComparator:
+    """Сравнение значений семантик: каждое значение слоя нормализуется один раз
+    (регистр, пробелы, точки, сокращения типов улиц) и заменяется целым id,
+    так что проверка пары объектов - это сравнение двух целых чисел."""
+
+    def __init__(self):
+        self.vocabulary: Dict[str, int] = {}
+
+    def normalize(self, value) -> str:
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            return ''
+        street_type, name = canonicalize_street(str(value))
+        return f"{street_type} {name}".strip()
+
+    def intern(self, values) -> Tuple[np.ndarray, np.ndarray]:
+        """Возвращает id значений (-1 - значение отсутствует) и признак точки в исходном значении."""
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+
+        unique_ids = np.empty(len(uniques) + 1, dtype=np.int64)
+        unique_dots = np.zeros(len(uniques) + 1, dtype=bool)
+        for code, value in enumerate(uniques):
+            normalized = self.normalize(value)
+            unique_ids[code] = self.vocabulary.setdefault(normalized, len(self.vocabulary)) if normalized else -1
+            unique_dots[code] = '.' in str(value)
+        # factorize даёт -1 для пропусков - последний элемент таблиц
+        unique_ids[-1] = -1
+
+        return unique_ids[codes], unique_dots[codes]
+
+
+def find_candidate_pairs(check_xy, target_xy, max_dist: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Все пары (проверяемый, целевой) на расстоянии не больше max_dist.
+
+    Целевые объекты раскладываются по квадратам со стороной max_dist,
+    для каждого проверяемого просматриваются 3x3 соседних квадрата.
+    Объекты без конечных координат в пары не входят."""
+    check_xy = np.asarray(check_xy, dtype=float).reshape(-1, 2)
+    target_xy = np.asarray(target_xy, dtype=float).reshape(-1, 2)
+    empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=float))
+
+    # Одна точка NaN сделала бы начало сетки NaN и свела все квадраты в один
+    check_rows = np.flatnonzero(np.isfinite(check_xy).all(axis=1))
+    target_rows = np.flatnonzero(np.isfinite(target_xy).all(axis=1))
+    if len(check_rows) < len(check_xy) or len(target_rows) < len(target_xy):
+        logging.warning(f"Skipped objects without coordinates: {len(check_xy) - len(check_rows)} checked, "
+                        f"{len(target_xy) - len(target_rows)} target")
+        pair_check, pair_target, pair_dist = find_candidate_pairs(check_xy[check_rows], target_xy[target_rows],
+                                                                  max_dist)
+        return check_rows[pair_check], target_rows[pair_target], pair_dist
+    if not len(check_xy) or not len(target_xy):
+        return empty
+
+    origin = np.minimum(check_xy.min(axis=0), target_xy.min(axis=0))
+    check_cells = np.floor((check_xy - origin) / max_dist).astype(np.int64) + 1
+    target_cells = np.floor((target_xy - origin) / max_dist).astype(np.int64) + 1
+    stride = int(max(check_cells[:, 1].max(), target_cells[:, 1].max())) + 2
+
+    target_keys = target_cells[:, 0] * stride + target_cells[:, 1]
+    order = np.argsort(target_keys, kind='stable')
+    sorted_keys = target_keys[order]
+
+    pair_check, pair_target = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            keys = (check_cells[:, 0] + dx) * stride + check_cells[:, 1] + dy
+            lo = np.searchsorted(sorted_keys, keys, side='left')
+            counts = np.searchsorted(sorted_keys, keys, side='right') - lo
+            total = int(counts.sum())
+            if not total:
+                continue
+            starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+            pair_check.append(np.repeat(np.arange(len(check_xy)), counts))
+            pair_target.append(order[starts + np.arange(total)])
+
+    if not pair_check:
+        return empty
+
+    pair_check = np.concatenate(pair_check)
+    pair_target = np.concatenate(pair_target)
+    distances = np.hypot(*(check_xy[pair_check] - target_xy[pair_target]).T)
+    within = distances <= max_dist
+
+    return pair_check[within], pair_target[within], distances[within]
+
+
+def classify_objects(check_ids, check_dots, target_ids, pair_check, pair_target, pair_dist,
+                     ignore_dot: bool = False, one_to_one: bool = False,
+                     located: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Категория каждого проверяемого объекта, сопоставленный целевой объект (-1 - нет) и расстояние.
+    located - маска объектов с координатами; остальные - FAILED_BY_DISTANCE."""
+    count = len(check_ids)
+    pair_check_ids = check_ids[pair_check]
+    sem_equal = (pair_check_ids >= 0) & (pair_check_ids == target_ids[pair_target])
+
+    no_sem = check_ids < 0
+    has_near = np.bincount(pair_check, minlength=count) > 0
+    has_match = np.bincount(pair_check[sem_equal], minlength=count) > 0
+    # Точка в значении - не ошибка семантики, объект сопоставляется с ближайшим
+    dot_accepted = check_dots & ignore_dot & ~no_sem
+    exists_anywhere = np.isin(check_ids, target_ids[target_ids >= 0])
+
+    allowed = sem_equal | dot_accepted[pair_check]
+    matched_check, matched_target, matched_dist = _assign(
+        pair_check[allowed], pair_target[allowed], pair_dist[allowed], one_to_one)
+
+    assigned = np.full(count, -1, dtype=np.int64)
+    distance = np.full(count, np.nan)
+    assigned[matched_check] = matched_target
+    distance[matched_check] = matched_dist
+
+    categories = _categorize(no_sem, assigned >= 0, has_near, has_match, dot_accepted, exists_anywhere,
+                             _located(located, count))
+    return categories, assigned, distance
+
+
+def _located(located, count: int) -> np.ndarray:
+    return np.ones(count, dtype=bool) if located is None else np.asarray(located, dtype=bool)
+
+
+def _categorize(no_sem, matched, has_near, has_match, dot_accepted, exists_anywhere, located) -> np.ndarray:
+    return np.select(
+        [no_sem, ~located, matched, has_near & ~has_match & ~dot_accepted, has_near,
+         exists_anywhere | dot_accepted],
+        [FAILED_NO_SEM_VALUE, FAILED_BY_DISTANCE, MATCHED, FAILED_BY_SEM, FAILED_TARGET_TAKEN, FAILED_BY_DISTANCE],
+        default=FAILED_BY_BOTH)
+
+
+class DistanceSweep:
+    """Результаты считки сразу для нескольких порогов расстояния.
+
+    Пары-кандидаты ищутся один раз для наибольшего порога и упорядочиваются
+    по расстоянию. Пары в пределах меньшего порога - начало этого порядка,
+    поэтому и ближайший подходящий объект, и жадное сопоставление один
+    к одному для любого порога получаются отсечением одного общего решения."""
+
+    def __init__(self, check_ids, check_dots, target_ids, pair_check, pair_target, pair_dist,
+                 thresholds, ignore_dot: bool = False, one_to_one: bool = False,
+                 located: Optional[np.ndarray] = None):
+        self.thresholds = np.unique(np.asarray(thresholds, dtype=float))
+        count = len(check_ids)
+        self.located = _located(located, count)
+
+        pair_check_ids = check_ids[pair_check]
+        sem_equal = (pair_check_ids >= 0) & (pair_check_ids == target_ids[pair_target])
+
+        self.no_sem = check_ids < 0
+        self.dot_accepted = check_dots & ignore_dot & ~self.no_sem
+        self.exists_anywhere = np.isin(check_ids, target_ids[target_ids >= 0])
+        # Расстояние до ближайшего объекта вообще и до ближайшего с той же семантикой
+        self.near_dist = _nearest_distance(pair_check, pair_dist, count)
+        self.match_dist = _nearest_distance(pair_check[sem_equal], pair_dist[sem_equal], count)
+
+        allowed = sem_equal | self.dot_accepted[pair_check]
+        matched_check, matched_target, matched_dist = _assign(
+            pair_check[allowed], pair_target[allowed], pair_dist[allowed], one_to_one)
+        self.assigned = np.full(count, -1, dtype=np.int64)
+        self.distance = np.full(count, np.nan)
+        self.assigned[matched_check] = matched_target
+        self.distance[matched_check] = matched_dist
+
+    def classify(self, threshold: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """То же, что classify_objects для пар в пределах threshold."""
+        within = self.distance <= threshold
+        assigned = np.where(within, self.assigned, -1)
+        distance = np.where(within, self.distance, np.nan)
+        categories = _categorize(self.no_sem, within, self.near_dist <= threshold,
+                                 self.match_dist <= threshold, self.dot_accepted, self.exists_anywhere,
+                                 self.located)
+        return categories, assigned, distance
+
+    def table(self) -> pd.DataFrame:
+        """Сравнительная таблица порогов: число объектов в каждой категории."""
+        total = len(self.no_sem)
+        rows = []
+        for threshold in self.thresholds.tolist():
+            categories, _, distance = self.classify(threshold)
+            counts = np.bincount(categories, minlength=len(FAILURE_REASONS) + 1)
+            row = {'Порог (м)': threshold, 'Успешно': int(counts[MATCHED])}
+            for category, (_, reason) in FAILURE_REASONS.items():
+                row[reason] = int(counts[category])
+            row['Успешно, %'] = round(100.0 * counts[MATCHED] / total, 2) if total else 0.0
+            row['Среднее расстояние (м)'] = round(float(np.nanmean(distance)), 2) if counts[MATCHED] else None
+            rows.append(row)
+
+        table = pd.DataFrame(rows)
+        if len(table):
+            table['Прирост успешных'] = table['Успешно'].diff().fillna(table['Успешно']).astype(int)
+        return table
+
+
+def _nearest_distance(pair_check, pair_dist, count: int) -> np.ndarray:
+    nearest = np.full(count, np.inf)
+    np.minimum.at(nearest, pair_check, pair_dist)
+    return nearest
+
+
+def _assign(pair_check, pair_target, pair_dist, one_to_one: bool):
+    # Порядок не зависит от того, в каком порядке пары найдены
+    order = np.lexsort((pair_check, pair_target, pair_dist))
+    pair_check, pair_target, pair_dist = pair_check[order], pair_target[order], pair_dist[order]
+
+    if not one_to_one:
+        # Ближайший подходящий целевой объект для каждого проверяемого
+        _, first = np.unique(pair_check, return_index=True)
+        return pair_check[first], pair_target[first], pair_dist[first]
+
+    # Жадное сопоставление один к одному по возрастанию расстояния
+    used_check, used_target = set(), set()
+    keep = np.zeros(len(pair_check), dtype=bool)
+    for pos, (check, target) in enumerate(zip(pair_check.tolist(), pair_target.tolist())):
+        if check in used_check or target in used_target:
+            continue
+        used_check.add(check)
+        used_target.add(target)
+        keep[pos] = True
+    return pair_check[keep], pair_target[keep], pair_dist[keep]
+
+
+class CheckAndMatchLogic:
+    """Логика считки объектов: параметры и результаты для интерфейса."""
+
+    def __init__(self):
+        self.params = {
+            'check_layer': None,
+            'target_layer': None,
+            'check_sem': None,
+            'check_sem_name': None,
+            'target_sem': None,
+            'target_sem_name': None,
+            'max_dist': 500.0,
+            'add_semantics_enabled': True,
+            'nearest_neighbor_mode': False,
+            'ignore_dot_semantics': False,
+            # Пороги расстояния для сравнения в одном прогоне (пусто - обычная считка)
+            'sweep_thresholds': [],
+            'result_ready': False,
+        }
+        self.reset_results()
+
+    def reset_results(self):
+        self.params.update({
+            'result_ready': False,
+            'total': 0,
+            'success_count': 0,
+            'success_transfers': [],
+            'failed_no_sem_value': [],
+            'failed_by_distance': [],
+            'failed_by_sem': [],
+            'failed_by_both': [],
+            'failed_target_taken': [],
+            'sweep_table': None,
+            'written_count': 0,
+            'cleared_count': 0,
+        })
+
+    def match(self, check_df: pd.DataFrame, target_df: pd.DataFrame) -> np.ndarray:
+        """Считка слоёв. Таблицы слоёв содержат столбцы key, x, y, value."""
+        self.reset_results()
+        comparator = SemanticComparator()
+        check_ids, check_dots = comparator.intern(check_df['value'])
+        target_ids, _ = comparator.intern(target_df['value'])
+
+        check_xy = check_df[['x', 'y']].to_numpy(dtype=float)
+        pair_check, pair_target, pair_dist = find_candidate_pairs(
+            check_xy, target_df[['x', 'y']].to_numpy(dtype=float), self.params['max_dist'])
+        logging.info(f"{len(pair_check)} candidate pairs within {self.params['max_dist']} m")
+
+        categories, assigned, distance = classify_objects(
+            check_ids, check_dots, target_ids, pair_check, pair_target, pair_dist,
+            ignore_dot=self.params['ignore_dot_semantics'],
+            one_to_one=self.params['nearest_neighbor_mode'],
+            located=np.isfinite(check_xy).all(axis=1))
+
+        self.store_results(check_df, target_df, categories, assigned, distance)
+        return categories
+
+    def sweep(self, check_df: pd.DataFrame, target_df: pd.DataFrame, thresholds) -> pd.DataFrame:
+        """Считка для нескольких порогов расстояния за один поиск пар.
+
+        Результаты для отчёта сохраняются для max_dist, сравнительная
+        таблица порогов - в params['sweep_table']."""
+        self.reset_results()
+        comparator = SemanticComparator()
+        check_ids, check_dots = comparator.intern(check_df['value'])
+        target_ids, _ = comparator.intern(target_df['value'])
+
+        thresholds = sorted(set(float(value) for value in thresholds) | {float(self.params['max_dist'])})
+        check_xy = check_df[['x', 'y']].to_numpy(dtype=float)
+        pair_check, pair_target, pair_dist = find_candidate_pairs(
+            check_xy, target_df[['x', 'y']].to_numpy(dtype=float), thresholds[-1])
+        logging.info(f"{len(pair_check)} candidate pairs within {thresholds[-1]} m for {len(thresholds)} thresholds")
+
+        sweep = DistanceSweep(check_ids, check_dots, target_ids, pair_check, pair_target, pair_dist, thresholds,
+                              ignore_dot=self.params['ignore_dot_semantics'],
+                              one_to_one=self.params['nearest_neighbor_mode'],
+                              located=np.isfinite(check_xy).all(axis=1))
+        categories, assigned, distance = sweep.classify(self.params['max_dist'])
+
+        self.store_results(check_df, target_df, categories, assigned, distance)
+        self.params['sweep_table'] = sweep.table()
+        return self.params['sweep_table']
+
+    def store_results(self, check_df, target_df, categories, assigned, distance):
+        check_keys = check_df['key'].to_numpy()
+        target_keys = target_df['key'].to_numpy()
+
+        matched = np.flatnonzero(categories == MATCHED)
+        self.params['success_transfers'] = list(zip(
+            check_keys[matched].tolist(), target_keys[assigned[matched]].tolist(), distance[matched].tolist()))
+        for category, (param_name, reason) in FAILURE_REASONS.items():
+            self.params[param_name] = [(key, reason) for key in check_keys[categories == category].tolist()]
+
+        self.params['total'] = len(check_df)
+        self.params['success_count'] = len(matched)
+        self.params['result_ready'] = True
+
+    def write_errors(self, backend: MapBackend, batch_size: int = 500,
+                     progress=None, is_cancelled=None) -> int:
+        """Записывает причину несоответствия в семантику 'Ошибка соответствия'
+        объектов проверяемого слоя и снимает её с сопоставленных объектов,
+        чтобы в карте не оставались ошибки прошлых запусков. Пачки уже
+        записанных значений остаются в карте и при прерывании между пачками."""
+        failures = [item for param_name, _ in FAILURE_REASONS.values() for item in self.params[param_name]]
+        # None - удалить семантику у объекта
+        updates = failures + [(check_key, None) for check_key, _, _ in self.params['success_transfers']]
+        layer = self.params['check_layer']
+        code = backend.ensure_semantic(layer, ERROR_SEMANTIC_NAME)
+
+        with SemanticWriter(backend, layer, code, batch_size=batch_size) as writer:
+            for start in range(0, len(updates), batch_size):
+                if is_cancelled is not None and is_cancelled():
+                    break
+                for key, reason in updates[start:start + batch_size]:
+                    writer.add(key, reason)
+                writer.flush()
+                if progress is not None:
+                    progress(writer.written, len(updates))
+
+        # Причины идут первыми, остальное записанное - снятые ошибки
+        self.params['written_count'] = min(writer.written, len(failures))
+        self.params['cleared_count'] = writer.written - self.params['written_count']
+        logging.info(f"{self.params['written_count']} of {len(failures)} error semantics written, "
+                     f"{self.params['cleared_count']} cleared in layer {layer}")
+        return writer.written
+
+
+class MatchJob(Job):
+    """Считка объектов в пуле фоновых задач. load_layers(params) возвращает
+    таблицы проверяемого и целевого слоёв. Если в params заданы
+    sweep_thresholds, считка выполняется сразу для всех порогов.
+    Если передана карта backend и включено add_semantics_enabled,
+    ошибки соответствия записываются в неё пачками."""
+
+    def __init__(self, logic: CheckAndMatchLogic, load_layers, priority: int = 0,
+                 backend: Optional[MapBackend] = None):
+        super().__init__("Считка объектов", priority)
+        self.logic = logic
+        self.load_layers = load_layers
+        self.backend = backend
+
+    def execute(self):
+        self.post('log', "Чтение объектов слоёв...")
+        check_df, target_df = self.load_layers(self.logic.params)
+        self.check_cancelled()
+        self.report_progress(40)
+
+        self.post('log', f"Проверяемых объектов: {len(check_df)}, целевых: {len(target_df)}")
+        thresholds = self.logic.params['sweep_thresholds']
+        if thresholds:
+            self.logic.sweep(check_df, target_df, thresholds)
+            self.post('log', f"Сравнение порогов: {', '.join(f'{value:g}' for value in thresholds)} м")
+        else:
+            self.logic.match(check_df, target_df)
+        self.report_progress(60)
+
+        if self.backend is not None and self.logic.params['add_semantics_enabled']:
+            self.check_cancelled()
+            self.post('log', f"Запись семантики '{ERROR_SEMANTIC_NAME}'...")
+            self.logic.write_errors(
+                self.backend, progress=lambda done, total: self.report_progress(60 + int(done / total * 40)),
+                is_cancelled=self.is_cancelled)
+            self.post('log', f"Записано значений семантики: {self.logic.params['written_count']}, "
+                             f"снято с сопоставленных объектов: {self.logic.params['cleared_count']}")
+        self.report_progress(100)
+        return self.logic.params
@@ -0,0 +1,62 @@
+import os
+import gzip
+import pickle
+import hashlib
+import logging
+
+from typing import Optional
+
+
+def file_fingerprint(file_path: str, *extra) -> str:
+    """Отпечаток файла по пути, размеру и времени изменения плюс параметры обработки."""
+    stat = os.stat(file_path)
+    parts = [os.path.abspath(file_path), str(stat.st_size), str(stat.st_mtime_ns)]
+    parts.extend(str(value) for value in extra)
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def app_data_dir() -> str:
+    """Каталог данных приложения пользователя (папка исходных файлов может быть
+    только для чтения или сетевой)."""
+    base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'streets_index')
+
+
+DEFAULT_CHECKPOINT_DIR = os.path.join(app_data_dir(), 'checkpoints')
+
+
+def checkpoint_path(file_path: str, directory: Optional[str] = None) -> str:
+    """Путь контрольной точки файла в каталоге приложения, имя - по полному пути файла."""
+    name = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+    return os.path.join(directory or DEFAULT_CHECKPOINT_DIR, f"{name}.checkpoint")
+
+
+def save_checkpoint(path: str, fingerprint: str, state: dict) -> None:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # Пишем во временный файл и подменяем, чтобы прерванная запись не портила точку
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, 'wb', compresslevel=1) as f:
+        pickle.dump({'fingerprint': fingerprint, 'state': state}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    logging.info(f"Checkpoint saved: {path}")
+
+
+def load_checkpoint(path: str, fingerprint: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, 'rb') as f:
+            data = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError) as e:
+        logging.error(f"Checkpoint {path} is unreadable: {e}")
+        return None
+    if data.get('fingerprint') != fingerprint:
+        logging.info(f"Checkpoint {path} belongs to other input, ignored")
+        return None
+    return data['state']
+
+
+def remove_checkpoint(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
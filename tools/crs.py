@@ -0,0 +1,296 @@
+import logging
+import numpy as np
+import pandas as pd
+
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+# Координаты везде в геодезической записи: X - север (широта), Y - восток (долгота).
+# Параметры эллипсоидов и датумов встроены, сетевой доступ и внешние базы не нужны.
+
+ELLIPSOIDS = {
+    'WGS84': (6378137.0, 1 / 298.257223563),
+    'KRASS': (6378245.0, 1 / 298.3),
+}
+
+# Переход датум -> WGS84 (7 параметров, position vector):
+# dx, dy, dz (м), rx, ry, rz (угл. сек.), ds (ppm)
+DATUMS = {
+    'WGS84': ('WGS84', (0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0)),
+    'SK42': ('KRASS', (23.57, -140.95, -79.8, 0.0, 0.35, 0.79, -0.22)),
+}
+
+ARCSEC = np.pi / (180 * 3600)
+
+
+class CRS:
+    def __init__(self, code: str, name: str, datum: str):
+        self.code = code
+        self.name = name
+        self.datum = datum
+
+    @property
+    def ellipsoid(self) -> Tuple[float, float]:
+        return ELLIPSOIDS[DATUMS[self.datum][0]]
+
+    def to_geographic(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
+    def from_geographic(self, lat: np.ndarray, lon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
+
+class GeographicCRS(CRS):
+    """Широта/долгота в градусах."""
+
+    def to_geographic(self, x, y):
+        return x, y
+
+    def from_geographic(self, lat, lon):
+        return lat, lon
+
+
+class TransverseMercatorCRS(CRS):
+    """Поперечная проекция Меркатора (Гаусс-Крюгер, UTM), ряды Крюгера 4-го порядка."""
+
+    def __init__(self, code: str, name: str, datum: str, lon0: float,
+                 k0: float = 1.0, false_easting: float = 500000.0, false_northing: float = 0.0):
+        super().__init__(code, name, datum)
+        self.lon0 = np.radians(lon0)
+        self.k0 = k0
+        self.false_easting = false_easting
+        self.false_northing = false_northing
+
+        a, f = self.ellipsoid
+        n = f / (2 - f)
+        self._e = np.sqrt(f * (2 - f))
+        self._a_k0 = k0 * a / (1 + n) * (1 + n ** 2 / 4 + n ** 4 / 64)
+        self._alpha = (
+            n / 2 - 2 * n ** 2 / 3 + 5 * n ** 3 / 16 + 41 * n ** 4 / 180,
+            13 * n ** 2 / 48 - 3 * n ** 3 / 5 + 557 * n ** 4 / 1440,
+            61 * n ** 3 / 240 - 103 * n ** 4 / 140,
+            49561 * n ** 4 / 161280,
+        )
+        self._beta = (
+            n / 2 - 2 * n ** 2 / 3 + 37 * n ** 3 / 96 - n ** 4 / 360,
+            n ** 2 / 48 + n ** 3 / 15 - 437 * n ** 4 / 1440,
+            17 * n ** 3 / 480 - 37 * n ** 4 / 840,
+            4397 * n ** 4 / 161280,
+        )
+        self._delta = (
+            2 * n - 2 * n ** 2 / 3 - 2 * n ** 3 + 116 * n ** 4 / 45,
+            7 * n ** 2 / 3 - 8 * n ** 3 / 5 - 227 * n ** 4 / 45,
+            56 * n ** 3 / 15 - 136 * n ** 4 / 35,
+            4279 * n ** 4 / 630,
+        )
+
+    def from_geographic(self, lat, lon):
+        phi = np.radians(lat)
+        dlam = np.radians(lon) - self.lon0
+        e = self._e
+
+        t = np.sinh(np.arctanh(np.sin(phi)) - e * np.arctanh(e * np.sin(phi)))
+        xi_p = np.arctan2(t, np.cos(dlam))
+        eta_p = np.arctanh(np.sin(dlam) / np.sqrt(1 + t ** 2))
+
+        xi = xi_p.copy()
+        eta = eta_p.copy()
+        for j, alpha in enumerate(self._alpha, start=1):
+            xi += alpha * np.sin(2 * j * xi_p) * np.cosh(2 * j * eta_p)
+            eta += alpha * np.cos(2 * j * xi_p) * np.sinh(2 * j * eta_p)
+
+        return self.false_northing + self._a_k0 * xi, self.false_easting + self._a_k0 * eta
+
+    def to_geographic(self, x, y):
+        xi = (np.asarray(x, dtype=float) - self.false_northing) / self._a_k0
+        eta = (np.asarray(y, dtype=float) - self.false_easting) / self._a_k0
+
+        xi_p = xi.copy()
+        eta_p = eta.copy()
+        for j, beta in enumerate(self._beta, start=1):
+            xi_p -= beta * np.sin(2 * j * xi) * np.cosh(2 * j * eta)
+            eta_p -= beta * np.cos(2 * j * xi) * np.sinh(2 * j * eta)
+
+        chi = np.arcsin(np.sin(xi_p) / np.cosh(eta_p))
+        phi = chi.copy()
+        for j, delta in enumerate(self._delta, start=1):
+            phi += delta * np.sin(2 * j * chi)
+        lam = self.lon0 + np.arctan2(np.sinh(eta_p), np.cos(xi_p))
+
+        return np.degrees(phi), np.degrees(lam)
+
+
+class LocalCRS(CRS):
+    """Местная система: сдвиг, поворот и масштаб относительно базовой проекции."""
+
+    def __init__(self, code: str, name: str, base: CRS, x0: float = 0.0, y0: float = 0.0,
+                 rotation: float = 0.0, scale: float = 1.0):
+        super().__init__(code, name, base.datum)
+        self.base = base
+        self.x0 = x0
+        self.y0 = y0
+        self.rotation = np.radians(rotation)
+        self.scale = scale
+
+    def from_geographic(self, lat, lon):
+        bx, by = self.base.from_geographic(lat, lon)
+        cos_r, sin_r = np.cos(self.rotation), np.sin(self.rotation)
+        x = self.scale * (cos_r * bx + sin_r * by) + self.x0
+        y = self.scale * (-sin_r * bx + cos_r * by) + self.y0
+        return x, y
+
+    def to_geographic(self, x, y):
+        cos_r, sin_r = np.cos(self.rotation), np.sin(self.rotation)
+        lx = (np.asarray(x, dtype=float) - self.x0) / self.scale
+        ly = (np.asarray(y, dtype=float) - self.y0) / self.scale
+        bx = cos_r * lx - sin_r * ly
+        by = sin_r * lx + cos_r * ly
+        return self.base.to_geographic(bx, by)
+
+
+CRS_REGISTRY: Dict[str, CRS] = {}
+
+
+def register_crs(crs: CRS) -> CRS:
+    CRS_REGISTRY[crs.code] = crs
+    get_transformer.cache_clear()
+    return crs
+
+
+LOCAL_CRS_CODE = 'LOCAL'
+
+
+def local_crs_for_origin(base_code: str, origin_x: float, origin_y: float,
+                         base_x: float, base_y: float, rotation: float = 0.0) -> LocalCRS:
+    """Местная система индексатора: его начало координат (origin_x, origin_y)
+    лежит в точке (base_x, base_y) базовой проекции, оси повёрнуты на rotation градусов.
+
+    Код включает все параметры, так что системы для разных начал координат
+    не подменяют друг друга в реестре и в кэше преобразователей."""
+    if base_code not in CRS_REGISTRY:
+        raise ValueError(f"Неизвестная система координат: {base_code}")
+    base = CRS_REGISTRY[base_code]
+    cos_r, sin_r = np.cos(np.radians(rotation)), np.sin(np.radians(rotation))
+    x0 = origin_x - (cos_r * base_x + sin_r * base_y)
+    y0 = origin_y - (-sin_r * base_x + cos_r * base_y)
+    code = f"{LOCAL_CRS_CODE}:{base_code}:{origin_x!r}:{origin_y!r}:{base_x!r}:{base_y!r}:{rotation!r}"
+    return LocalCRS(code, f"Местная (начало X={origin_x}, Y={origin_y})", base, x0, y0, rotation)
+
+
+def _geographic_to_geocentric(lat, lon, ellipsoid):
+    a, f = ellipsoid
+    e2 = f * (2 - f)
+    phi = np.radians(lat)
+    lam = np.radians(lon)
+    n = a / np.sqrt(1 - e2 * np.sin(phi) ** 2)
+    return (n * np.cos(phi) * np.cos(lam),
+            n * np.cos(phi) * np.sin(lam),
+            n * (1 - e2) * np.sin(phi))
+
+
+def _geocentric_to_geographic(gx, gy, gz, ellipsoid):
+    a, f = ellipsoid
+    e2 = f * (2 - f)
+    p = np.hypot(gx, gy)
+    lam = np.arctan2(gy, gx)
+    phi = np.arctan2(gz, p * (1 - e2))
+    for _ in range(4):
+        n = a / np.sqrt(1 - e2 * np.sin(phi) ** 2)
+        phi = np.arctan2(gz + e2 * n * np.sin(phi), p)
+    return np.degrees(phi), np.degrees(lam)
+
+
+def _helmert(gx, gy, gz, params, inverse=False):
+    dx, dy, dz, rx, ry, rz, ds = params
+    sign = -1.0 if inverse else 1.0
+    rx, ry, rz = sign * rx * ARCSEC, sign * ry * ARCSEC, sign * rz * ARCSEC
+    m = 1 + sign * ds * 1e-6
+    return (sign * dx + m * (gx - rz * gy + ry * gz),
+            sign * dy + m * (rz * gx + gy - rx * gz),
+            sign * dz + m * (-ry * gx + rx * gy + gz))
+
+
+class CoordinateTransformer:
+    """Пакетное преобразование массивов координат из одной системы в другую."""
+
+    def __init__(self, source: CRS, target: CRS):
+        self.source = source
+        self.target = target
+
+    def transform(self, x, y) -> Tuple[np.ndarray, np.ndarray]:
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+
+        if self.source is self.target:
+            return x.copy(), y.copy()
+
+        lat, lon = self.source.to_geographic(x, y)
+
+        if self.source.datum != self.target.datum:
+            gx, gy, gz = _geographic_to_geocentric(lat, lon, self.source.ellipsoid)
+            gx, gy, gz = _helmert(gx, gy, gz, DATUMS[self.source.datum][1])
+            gx, gy, gz = _helmert(gx, gy, gz, DATUMS[self.target.datum][1], inverse=True)
+            lat, lon = _geocentric_to_geographic(gx, gy, gz, self.target.ellipsoid)
+
+        return self.target.from_geographic(lat, lon)
+
+
+@lru_cache(maxsize=None)
+def get_transformer(source_code: str, target_code: str) -> CoordinateTransformer:
+    if source_code not in CRS_REGISTRY:
+        raise ValueError(f"Неизвестная система координат: {source_code}")
+    if target_code not in CRS_REGISTRY:
+        raise ValueError(f"Неизвестная система координат: {target_code}")
+    return CoordinateTransformer(CRS_REGISTRY[source_code], CRS_REGISTRY[target_code])
+
+
+class CoordinateTransformStage:
+    """Этап конвейера перед индексацией: переводит столбцы X/Y в систему индексатора.
+
+    Система исходных координат задаётся одна на файл (source_crs) или
+    построчно кодом в столбце crs_col; строки одной системы пересчитываются
+    одним пакетом."""
+
+    def __init__(self, target_crs: str, source_crs: Optional[str] = None, crs_col: Optional[str] = None):
+        if source_crs is None and crs_col is None:
+            raise ValueError("Укажите исходную систему координат или столбец с её кодом")
+        if target_crs not in CRS_REGISTRY:
+            raise ValueError(f"Неизвестная система координат: {target_crs}")
+        self.target_crs = target_crs
+        self.source_crs = source_crs
+        self.crs_col = crs_col
+
+    def apply(self, df: pd.DataFrame, x_col: str, y_col: str) -> pd.DataFrame:
+        x = pd.to_numeric(df[x_col], errors='coerce').to_numpy(dtype=float)
+        y = pd.to_numeric(df[y_col], errors='coerce').to_numpy(dtype=float)
+        out_x = np.full(len(df), np.nan)
+        out_y = np.full(len(df), np.nan)
+
+        if self.crs_col:
+            codes = df[self.crs_col].astype(str).str.strip()
+            if self.source_crs:
+                codes = codes.where(df[self.crs_col].notna(), self.source_crs)
+        else:
+            codes = pd.Series(self.source_crs, index=df.index)
+
+        for code, positions in codes.groupby(codes.to_numpy()).indices.items():
+            if code not in CRS_REGISTRY:
+                logging.error(f"Unknown CRS '{code}' in {len(positions)} rows")
+                continue
+            transformer = get_transformer(code, self.target_crs)
+            out_x[positions], out_y[positions] = transformer.transform(x[positions], y[positions])
+
+        result = df.copy()
+        result[x_col] = out_x
+        result[y_col] = out_y
+        return result
+
+
+register_crs(GeographicCRS('EPSG:4326', 'WGS 84 (широта/долгота)', 'WGS84'))
+register_crs(GeographicCRS('EPSG:4284', 'СК-42 (широта/долгота)', 'SK42'))
+for _zone in (34, 35, 36):
+    register_crs(TransverseMercatorCRS(f'EPSG:326{_zone}', f'WGS 84 / UTM зона {_zone}N', 'WGS84',
+                                       lon0=6 * _zone - 183, k0=0.9996))
+for _zone in (4, 5, 6):
+    register_crs(TransverseMercatorCRS(f'EPSG:284{_zone:02d}', f'СК-42 / Гаусс-Крюгер зона {_zone}', 'SK42',
+                                       lon0=6 * _zone - 3, false_easting=_zone * 1000000 + 500000))
@@ -0,0 +1,334 @@
+import os
+import re
+import json
+import logging
+import tempfile
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from tools.jobs import Job
+
+SHEET_COLUMN = 'Лист карты'
+STREET_COLUMN = 'Форматированная улица'
+INDEX_COLUMN = 'Номенклатурный индекс'
+
+DIRECTORY_FORMATS = ('docx', 'xlsx')
+MANIFEST_NAME = 'manifest.json'
+# Строк в пачке при чтении и записи результата
+RESULT_BATCH_ROWS = 10000
+EXCEL_MAX_ROWS = 1048576
+
+
+def iter_result_batches(source: Union[str, pd.DataFrame],
+                        batch_rows: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """Результат пачками строк. source - таблица или Parquet-файл результата
+    (ProcessingJob с result_path), файл целиком не читается."""
+    batch_rows = batch_rows or RESULT_BATCH_ROWS
+    if isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), batch_rows):
+            yield source.iloc[start:start + batch_rows]
+        return
+
+    import pyarrow.parquet as pq
+    with pq.ParquetFile(source) as parquet:
+        for batch in parquet.iter_batches(batch_size=batch_rows):
+            yield batch.to_pandas()
+
+
+def result_head(source: Union[str, pd.DataFrame], rows: int = 10) -> pd.DataFrame:
+    """Первые строки результата (для предпросмотра) без чтения всего файла."""
+    if isinstance(source, pd.DataFrame):
+        return source.head(rows)
+
+    import pyarrow.parquet as pq
+    with pq.ParquetFile(source) as parquet:
+        batch = next(parquet.iter_batches(batch_size=max(rows, 1)), None)
+        if batch is None:
+            return parquet.schema_arrow.empty_table().to_pandas()
+        return batch.to_pandas().head(rows)
+
+
+def read_result(source: Union[str, pd.DataFrame]) -> pd.DataFrame:
+    return source if isinstance(source, pd.DataFrame) else pd.read_parquet(source)
+
+
+def write_xlsx(source: Union[str, pd.DataFrame], path: str) -> None:
+    """Excel в режиме потоковой записи openpyxl: в памяти одна пачка строк."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    header = []
+    for column in result_head(source, 0).columns:
+        cell = WriteOnlyCell(sheet, value=str(column))
+        cell.font = Font(bold=True)
+        header.append(cell)
+    sheet.append(header)
+
+    rows = 0
+    for batch in iter_result_batches(source):
+        rows += len(batch)
+        if rows >= EXCEL_MAX_ROWS:
+            raise ValueError(f"Строк больше, чем помещается на лист Excel ({EXCEL_MAX_ROWS - 1})")
+        for row in batch.itertuples(index=False, name=None):
+            sheet.append([None if pd.isna(value) else value for value in row])
+    workbook.save(path)
+
+
+def write_docx(df: pd.DataFrame, path: str, title: str = 'Обработанные данные улиц') -> None:
+    """Справочник в Word: строки «улица - индекс» или таблица всех столбцов."""
+    # python-docx нужен только для выгрузки в Word, загружаем по требованию
+    from docx import Document
+
+    doc = Document()
+    doc.add_heading(title, 0)
+
+    if STREET_COLUMN in df.columns and INDEX_COLUMN in df.columns:
+        for street, index in zip(df[STREET_COLUMN].astype(str), df[INDEX_COLUMN].astype(str)):
+            p = doc.add_paragraph()
+            p.add_run(street)
+            p.add_run('\t')
+            p.add_run(index).bold = True
+    else:
+        table = doc.add_table(rows=len(df) + 1, cols=len(df.columns))
+        table.style = 'Table Grid'
+
+        for i, column in enumerate(df.columns):
+            table.cell(0, i).text = str(column)
+
+        for i, row in enumerate(df.itertuples(index=False), 1):
+            for j, value in enumerate(row):
+                table.cell(i, j).text = str(value)
+
+    doc.save(path)
+
+
+def write_table(source: Union[str, pd.DataFrame], path: str, title: Optional[str] = None) -> None:
+    """Сохраняет результат (таблицу или Parquet-файл) в формате по расширению
+    пути (.docx или .xlsx). Excel пишется пачками, документ Word python-docx
+    собирает в памяти целиком."""
+    if path.endswith('.docx'):
+        write_docx(read_result(source), path, title or 'Обработанные данные улиц')
+    else:
+        write_xlsx(source, path)
+
+
+def street_letter(street: str) -> str:
+    """Первая буква улицы для разбиения справочника; цифры и прочее - '#'."""
+    street = str(street).strip()
+    return street[0].upper() if street and street[0].isalpha() else '#'
+
+
+def expand_sheet_rows(df: pd.DataFrame, sheet_rows: pd.DataFrame) -> pd.DataFrame:
+    """Строки результата повторяются для каждого листа, на котором встречается
+    пара (улица, индекс) из sheet_rows, чтобы справочник каждого листа
+    перечислял все его улицы, а не только впервые встреченные на нём.
+
+    Порядок строк результата сохраняется, копии строки идут подряд."""
+    keys = [STREET_COLUMN, INDEX_COLUMN]
+    pairs = pd.concat([df[keys + [SHEET_COLUMN]], sheet_rows[keys + [SHEET_COLUMN]]], ignore_index=True)
+    pairs = pairs.drop_duplicates(ignore_index=True)
+
+    rows = df.drop(columns=SHEET_COLUMN)
+    rows['_row'] = np.arange(len(df))
+    merged = rows.merge(pairs, on=keys, how='inner').sort_values('_row', kind='mergesort')
+
+    expanded = merged[list(df.columns)]
+    expanded.index = df.index[merged['_row'].to_numpy()]
+    return expanded
+
+
+def partition_result(df: pd.DataFrame, by_letter: bool = False) -> List[Tuple[str, Optional[str], pd.DataFrame]]:
+    """Части результата (лист, буква или None, строки) в порядке листов и букв.
+
+    Порядок строк внутри части сохраняется, так что отсортированный
+    по улицам результат даёт отсортированные справочники."""
+    if SHEET_COLUMN not in df.columns:
+        raise ValueError(f"В результате нет столбца '{SHEET_COLUMN}'")
+
+    keys = [df[SHEET_COLUMN]]
+    if by_letter:
+        letters = df[STREET_COLUMN].map(street_letter) if STREET_COLUMN in df.columns else '#'
+        keys.append(pd.Series(letters, index=df.index, name='letter'))
+
+    partitions = []
+    for key, part in df.groupby(keys, sort=True, observed=True):
+        key = key if isinstance(key, tuple) else (key,)
+        partitions.append((str(key[0]), key[1] if by_letter else None, part))
+    return partitions
+
+
+def partition_basename(sheet: str, letter: Optional[str] = None) -> str:
+    """Имя файла части без расширения, безопасное для файловой системы."""
+    name = sheet if letter is None else f"{sheet} {letter}"
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', name).strip('_') or 'Лист'
+
+
+def stage_partitions(source: Union[str, pd.DataFrame], staging_dir: str, by_letter: bool = False,
+                     sheet_rows: Optional[pd.DataFrame] = None) -> List[Tuple[str, Optional[str], str, int]]:
+    """Раскладывает результат, читая его пачками, по Parquet-файлам частей
+    в staging_dir. Возвращает (лист, буква или None, файл части, строк)
+    в порядке листов и букв, как partition_result."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if SHEET_COLUMN not in result_head(source, 0).columns:
+        raise ValueError(f"В результате нет столбца '{SHEET_COLUMN}'")
+
+    writers = {}
+    paths = {}
+    rows = {}
+    schema = None
+    sheet_order = None
+    try:
+        for batch in iter_result_batches(source):
+            if sheet_rows is not None:
+                batch = expand_sheet_rows(batch, sheet_rows)
+            if schema is None:
+                schema = pa.Schema.from_pandas(batch, preserve_index=False)
+                if isinstance(batch[SHEET_COLUMN].dtype, pd.CategoricalDtype):
+                    sheet_order = {str(sheet): i for i, sheet in enumerate(batch[SHEET_COLUMN].cat.categories)}
+            for sheet, letter, part in partition_result(batch, by_letter):
+                key = (sheet, letter)
+                if key not in writers:
+                    paths[key] = os.path.join(staging_dir, f"{len(writers)}.parquet")
+                    writers[key] = pq.ParquetWriter(paths[key], schema)
+                    rows[key] = 0
+                writers[key].write_table(pa.Table.from_pandas(part, schema=schema, preserve_index=False))
+                rows[key] += len(part)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    # Листы - в порядке категорий, как при groupby по всей таблице
+    order = sorted(writers, key=lambda key: (sheet_order[key[0]] if sheet_order else key[0], key[1] or ''))
+    return [(sheet, letter, paths[(sheet, letter)], rows[(sheet, letter)]) for sheet, letter in order]
+
+
+def render_partition(task) -> List[str]:
+    """Выгрузка одной части в рабочем процессе: task = (файл части, путь без расширения, форматы, заголовок)."""
+    part_path, base_path, formats, title = task
+    paths = []
+    for fmt in formats:
+        path = f"{base_path}.{fmt}"
+        write_table(part_path, path, title)
+        paths.append(path)
+    return paths
+
+
+def generate_directories(source: Union[str, pd.DataFrame], output_dir: str,
+                         formats: Sequence[str] = DIRECTORY_FORMATS, by_letter: bool = False,
+                         max_workers: Optional[int] = None, progress=None, is_cancelled=None,
+                         sheet_rows: Optional[pd.DataFrame] = None) -> Dict:
+    """Справочники улиц по листам карты (и первым буквам улиц) за один проход.
+
+    source - таблица результата или его Parquet-файл. Результат читается
+    пачками и раскладывается по временным файлам частей, так что в памяти
+    одновременно не больше пачки и выгружаемых частей.
+
+    Части выгружаются параллельно в процессах, число которых не больше
+    max_workers и числа ядер. В output_dir пишется manifest.json с перечнем
+    частей, при прерывании - с complete = false и отметкой done у готовых.
+    progress(done, total) вызывается по мере готовности частей,
+    is_cancelled() проверяется перед ожиданием каждой следующей.
+    sheet_rows - см. expand_sheet_rows."""
+    if not formats:
+        raise ValueError("Не выбран формат справочников")
+    unknown = [fmt for fmt in formats if fmt not in DIRECTORY_FORMATS]
+    if unknown:
+        raise ValueError(f"Неизвестный формат справочника: {', '.join(unknown)}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix='directories_') as staging_dir:
+        entries = _render_partitions(source, output_dir, staging_dir, tuple(formats), by_letter,
+                                     max_workers, progress, is_cancelled, sheet_rows)
+
+    complete = all(entry['done'] for entry in entries)
+    if not complete:
+        logging.warning(f"Directories incomplete: {sum(entry['done'] for entry in entries)} of {len(entries)} partitions")
+    manifest = {
+        'complete': complete,
+        'by_letter': by_letter,
+        'formats': list(formats),
+        'total_rows': int(sum(entry['rows'] for entry in entries)),
+        'partitions': entries,
+    }
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def _render_partitions(source, output_dir, staging_dir, formats, by_letter, max_workers,
+                       progress, is_cancelled, sheet_rows) -> List[Dict]:
+    entries = []
+    tasks = []
+    for sheet, letter, part_path, rows in stage_partitions(source, staging_dir, by_letter, sheet_rows):
+        base_name = partition_basename(sheet, letter)
+        title = f"Справочник улиц: {sheet}" + (f", {letter}" if letter else '')
+        entries.append({
+            'sheet': sheet,
+            'letter': letter,
+            'rows': rows,
+            'files': [f"{base_name}.{fmt}" for fmt in formats],
+            'done': False,
+        })
+        tasks.append((part_path, os.path.join(output_dir, base_name), formats, title))
+
+    cores = os.cpu_count() or 1
+    workers = max(1, min(max_workers or cores, cores, len(tasks) or 1))
+    logging.info(f"Rendering {len(tasks)} directory partitions with {workers} processes")
+
+    if tasks:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        futures = {executor.submit(render_partition, task): entry for task, entry in zip(tasks, entries)}
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                future.result()
+                futures[future]['done'] = True
+                if progress is not None:
+                    progress(done, len(tasks))
+                if is_cancelled is not None and is_cancelled():
+                    break
+        finally:
+            # Ещё не начатые части снимаются, ждём только уже выполняющиеся
+            executor.shutdown(wait=True, cancel_futures=True)
+        for future, entry in futures.items():
+            if future.done() and not future.cancelled() and future.exception() is None:
+                entry['done'] = True
+    return entries
+
+
+class DirectoryJob(Job):
+    """Выгрузка справочников по листам в пуле фоновых задач;
+    source - таблица результата или его Parquet-файл."""
+
+    def __init__(self, source: Union[str, pd.DataFrame], output_dir: str,
+                 formats: Sequence[str] = DIRECTORY_FORMATS, by_letter: bool = False,
+                 max_workers: Optional[int] = None, priority: int = 0,
+                 sheet_rows: Optional[pd.DataFrame] = None):
+        super().__init__("Справочники по листам", priority)
+        self.source = source
+        self.sheet_rows = sheet_rows
+        self.output_dir = output_dir
+        self.formats = tuple(formats)
+        self.by_letter = by_letter
+        self.max_workers = max_workers
+
+    def execute(self):
+        # Один процесс работает на ядре самой задачи, остальные - на свободных ядрах планировщика
+        wanted = self.max_workers or os.cpu_count() or 1
+        extra = self.reserve_cpus(wanted - 1)
+        try:
+            manifest = generate_directories(
+                self.source, self.output_dir, self.formats, self.by_letter, 1 + extra,
+                progress=lambda done, total: self.report_progress(int(done / total * 100)),
+                is_cancelled=self.is_cancelled, sheet_rows=self.sheet_rows)
+        finally:
+            self.release_cpus(extra)
+        self.check_cancelled()
+        return manifest
@@ -0,0 +1,179 @@
+import os
+import heapq
+import pickle
+import logging
+import tempfile
+import pandas as pd
+
+from typing import Dict, Iterator, List, Optional, Sequence
+
+
+class ExternalSorter:
+    """Удаление дубликатов и сортировка таблицы с ограничением памяти.
+
+    Строки добавляются блоками в исходном порядке. Пока накопленные блоки
+    помещаются в memory_budget байт, всё делается в памяти; иначе блоки
+    сбрасываются во временные файлы отсортированными сериями без дубликатов
+    и в конце сливаются k-путевым слиянием. Результат совпадает с
+    drop_duplicates(subset, keep='first') + устойчивой sort_values(sort_column).
+
+    memory_budget ограничивает накопленные для сортировки блоки, слияние
+    выдаёт результат пачками по batch_rows строк (iter_batches).
+    write_parquet() пишет эти пачки в файл, не собирая таблицу;
+    result() собирает их в одну таблицу, и она целиком в памяти."""
+
+    def __init__(self, sort_column: str, dedup_columns: Sequence[str],
+                 memory_budget: int = 256 * 1024 ** 2, batch_rows: int = 10000,
+                 tmp_dir: Optional[str] = None):
+        if sort_column not in dedup_columns:
+            raise ValueError("Столбец сортировки должен входить в ключ дубликатов")
+        self.sort_column = sort_column
+        self.dedup_columns = list(dedup_columns)
+        self.memory_budget = memory_budget
+        self.batch_rows = batch_rows
+        self.tmp_dir = tmp_dir
+
+        self._buffer: List[pd.DataFrame] = []
+        self._buffer_bytes = 0
+        self._runs: List[str] = []
+        self._columns: Optional[List[str]] = None
+        self._categories: Dict[str, pd.Index] = {}
+
+    def add(self, frame: pd.DataFrame) -> None:
+        if self._columns is None:
+            self._columns = list(frame.columns)
+            self._categories = {column: frame[column].cat.categories for column in frame.columns
+                                if isinstance(frame[column].dtype, pd.CategoricalDtype)}
+        self._buffer.append(frame)
+        self._buffer_bytes += int(frame.memory_usage(deep=True).sum())
+        if self._buffer_bytes > self.memory_budget:
+            self._spill()
+
+    def _sorted_buffer(self) -> pd.DataFrame:
+        frame = pd.concat(self._buffer) if len(self._buffer) > 1 else self._buffer[0]
+        self._buffer = []
+        self._buffer_bytes = 0
+        frame = frame.drop_duplicates(subset=self.dedup_columns, keep='first')
+        return frame.sort_values(by=self.sort_column, kind='mergesort')
+
+    def _spill(self) -> None:
+        frame = self._sorted_buffer()
+        for column in self._categories:
+            frame[column] = frame[column].cat.codes
+
+        fd, path = tempfile.mkstemp(suffix='.run', dir=self.tmp_dir)
+        with os.fdopen(fd, 'wb') as f:
+            for start in range(0, len(frame), self.batch_rows):
+                batch = frame.iloc[start:start + self.batch_rows]
+                rows = list(zip(batch.index.tolist(), *(batch[column].tolist() for column in self._columns)))
+                pickle.dump(rows, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self._runs.append(path)
+        logging.info(f"Spilled run {len(self._runs)} with {len(frame)} rows to {path}")
+
+    @staticmethod
+    def _read_run(path):
+        with open(path, 'rb') as f:
+            while True:
+                try:
+                    rows = pickle.load(f)
+                except EOFError:
+                    return
+                yield from rows
+
+    def iter_batches(self) -> Iterator[pd.DataFrame]:
+        """Результат пачками по batch_rows строк; временные файлы удаляются
+        после полного прохода или закрытия генератора."""
+        if self._columns is None:
+            return
+        if not self._runs:
+            frame = self._sorted_buffer()
+            for start in range(0, len(frame), self.batch_rows):
+                yield frame.iloc[start:start + self.batch_rows]
+            return
+
+        if self._buffer:
+            self._spill()
+
+        try:
+            yield from self._merge_runs()
+        finally:
+            for path in self._runs:
+                os.remove(path)
+            self._runs = []
+
+    def result(self) -> pd.DataFrame:
+        if self._columns is None:
+            return pd.DataFrame()
+        if not self._runs:
+            return self._sorted_buffer()
+        batches = list(self.iter_batches())
+        if not batches:
+            return self._make_frame([], [[] for _ in self._columns])
+        return pd.concat(batches)
+
+    def write_parquet(self, path: str) -> int:
+        """Пишет результат пачками в Parquet (с исходными позициями строк
+        в индексе) и возвращает число строк."""
+        # pyarrow нужен только для файла результата
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._columns is None:
+            pd.DataFrame().to_parquet(path)
+            return 0
+
+        rows = 0
+        writer = None
+        try:
+            for batch in self.iter_batches():
+                table = pa.Table.from_pandas(batch, schema=writer.schema if writer else None, preserve_index=True)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+                rows += len(batch)
+            if writer is None:
+                self._make_frame([], [[] for _ in self._columns]).to_parquet(path)
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
+
+    def _make_frame(self, index, values) -> pd.DataFrame:
+        frame = pd.DataFrame(dict(zip(self._columns, values)), index=index, columns=self._columns)
+        for column, categories in self._categories.items():
+            frame[column] = pd.Categorical.from_codes(frame[column].astype('int64'), categories=categories)
+        return frame
+
+    def _merge_runs(self) -> Iterator[pd.DataFrame]:
+        # В кортеже строки: 0 - исходная позиция, далее столбцы
+        sort_pos = self._columns.index(self.sort_column) + 1
+        dedup_pos = [self._columns.index(column) + 1 for column in self.dedup_columns]
+
+        merged = heapq.merge(*(self._read_run(path) for path in self._runs),
+                             key=lambda row: (row[sort_pos], row[0]))
+
+        index = []
+        values = [[] for _ in self._columns]
+        current_key = object()
+        seen = set()
+        for row in merged:
+            # Строки одного значения сортировки идут подряд по возрастанию позиции,
+            # поэтому первая встреченная строка с ключом - первая и в исходной таблице
+            if row[sort_pos] != current_key:
+                current_key = row[sort_pos]
+                seen = set()
+            key = tuple(row[pos] for pos in dedup_pos)
+            if key in seen:
+                continue
+            seen.add(key)
+            index.append(row[0])
+            for column_values, value in zip(values, row[1:]):
+                column_values.append(value)
+
+            if len(index) >= self.batch_rows:
+                yield self._make_frame(index, values)
+                index = []
+                values = [[] for _ in self._columns]
+
+        if index:
+            yield self._make_frame(index, values)
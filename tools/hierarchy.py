@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+from typing import Dict, List, Optional, Sequence
+
+
+class HierarchyLevel:
+    """Уровень деления квадрата родителя на divisions x divisions частей.
+
+    Части нумеруются по строкам (numbering='row') или по столбцам, подписи
+    берутся из labels (по умолчанию 1..divisions^2) и присоединяются к коду
+    родителя через separator."""
+
+    def __init__(self, divisions: int, labels: Optional[Sequence[str]] = None,
+                 separator: str = '-', numbering: str = 'row', name: Optional[str] = None):
+        if divisions < 2:
+            raise ValueError("Уровень должен делить квадрат хотя бы на 2 части")
+        if numbering not in ('column', 'row'):
+            raise ValueError(f"Неизвестная схема нумерации: {numbering}")
+        if labels is None:
+            labels = [str(i + 1) for i in range(divisions * divisions)]
+        if len(labels) != divisions * divisions:
+            raise ValueError(f"Ожидалось {divisions * divisions} подписей, получено {len(labels)}")
+
+        self.divisions = divisions
+        self.labels = np.asarray(list(labels), dtype=object)
+        self.separator = separator
+        self.numbering = numbering
+        self.name = name
+
+
+def parse_levels(text: str) -> List[HierarchyLevel]:
+    """Уровни из строки делений, например '2, 5': 500 м -> 250 м -> 50 м."""
+    return [HierarchyLevel(int(part)) for part in text.replace(';', ',').split(',') if part.strip()]
+
+
+class HierarchicalIndex:
+    """Коды всех уровней для массива точек, вычисленные за один проход.
+
+    Хранятся только целочисленные номера квадратов самого мелкого уровня,
+    коды и группировки любого уровня получаются из них без исходных данных."""
+
+    def __init__(self, indexer, levels: Sequence[HierarchyLevel], fine_col: np.ndarray,
+                 fine_row: np.ndarray, valid: np.ndarray, error_label: str = 'Ошибка'):
+        self.indexer = indexer
+        self.levels = list(levels)
+        self.fine_col = fine_col
+        self.fine_row = fine_row
+        self.valid = valid
+        self.error_label = error_label
+
+        # scales[k] - сколько мелких квадратов в стороне квадрата уровня k
+        self.scales = [1] * (len(self.levels) + 1)
+        for k in range(len(self.levels) - 1, -1, -1):
+            self.scales[k] = self.scales[k + 1] * self.levels[k].divisions
+
+    @property
+    def depth(self) -> int:
+        return len(self.levels)
+
+    def level_name(self, level: int) -> str:
+        if level > 0 and self.levels[level - 1].name:
+            return self.levels[level - 1].name
+        size = self.indexer.square_size / self.scales[0] * self.scales[level]
+        return f"Индекс {size:g} м"
+
+    def codes(self, level: int) -> np.ndarray:
+        """Коды квадратов уровня level: 0 - основной номенклатурный индекс."""
+        letters = np.asarray(self.indexer.letters, dtype=object)
+        base_col = np.floor_divide(self.fine_col, self.scales[0])
+        base_row = np.floor_divide(self.fine_row, self.scales[0])
+
+        codes = pd.Series(letters[base_col % len(letters)]) + '-' + pd.Series(base_row + 1).astype(str)
+        for k in range(level):
+            spec = self.levels[k]
+            sub_col = np.floor_divide(self.fine_col, self.scales[k + 1]) % spec.divisions
+            sub_row = np.floor_divide(self.fine_row, self.scales[k + 1]) % spec.divisions
+            if spec.numbering == 'row':
+                sub_ids = sub_row * spec.divisions + sub_col
+            else:
+                sub_ids = sub_col * spec.divisions + sub_row
+            codes = codes + spec.separator + pd.Series(spec.labels[sub_ids])
+
+        return np.where(self.valid, codes.to_numpy(dtype=object), self.error_label)
+
+    def aggregate(self, group_ids, level: int) -> Dict[int, List[str]]:
+        """Отсортированные коды уровня level для каждой группы (например, улицы)."""
+        group_ids = np.asarray(group_ids)
+        frame = pd.DataFrame({'group': group_ids[self.valid], 'code': self.codes(level)[self.valid]})
+        frame = frame.drop_duplicates()
+        return {group: sorted(codes) for group, codes in frame.groupby('group')['code']}
+
+
+def calculate_hierarchy(indexer, levels: Sequence[HierarchyLevel], x, y) -> HierarchicalIndex:
+    """Номера мелких квадратов для всех точек одним векторным шагом."""
+    if indexer.origin_x is None or indexer.origin_y is None:
+        raise ValueError("Начало координат не установлено!")
+
+    scale = 1
+    for level in levels:
+        scale *= level.divisions
+    fine_size = indexer.square_size / scale
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    fine_col = np.floor((indexer.origin_x - x) / fine_size)
+    fine_row = np.floor((y - indexer.origin_y) / fine_size)
+    valid = np.isfinite(fine_col) & np.isfinite(fine_row)
+
+    return HierarchicalIndex(indexer, levels,
+                             np.where(valid, fine_col, 0).astype(np.int64),
+                             np.where(valid, fine_row, 0).astype(np.int64), valid)
@@ -0,0 +1,174 @@
+import os
+import csv
+import codecs
+import logging
+import tempfile
+import pandas as pd
+
+from typing import List, Optional, Sequence
+
+from tools.checkpoint import file_fingerprint
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm', '.xls')
+CSV_EXTENSIONS = ('.csv', '.txt')
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+FEATHER_EXTENSIONS = ('.feather', '.arrow')
+
+SUPPORTED_FILTER = ("Таблицы (*.xlsx *.xls *.csv *.parquet *.feather);;"
+                    "Excel files (*.xlsx *.xls);;CSV (*.csv);;Parquet (*.parquet);;Feather (*.feather);;"
+                    "All files (*.*)")
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'streets_index_cache')
+DEFAULT_CACHE_SIZE = 2 * 1024 ** 3
+
+# Кодировка CSV, если файл не читается как UTF-8 (выгрузки Excel и ГИС под Windows)
+FALLBACK_ENCODING = 'cp1251'
+
+
+def detect_encoding(file_path: str, fallback: str = FALLBACK_ENCODING) -> str:
+    """UTF-8 (с BOM или без), если начало файла декодируется как UTF-8, иначе fallback."""
+    with open(file_path, 'rb') as f:
+        head = f.read(1024 * 1024)
+    try:
+        # Неполный последний символ на границе блока - не ошибка
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+    except UnicodeDecodeError:
+        return fallback
+    return 'utf-8-sig'
+
+
+def sniff_delimiter(file_path: str, encoding: Optional[str] = None) -> str:
+    with open(file_path, 'r', encoding=encoding or detect_encoding(file_path), newline='') as f:
+        head = f.read(65536)
+    try:
+        return csv.Sniffer().sniff(head, delimiters=';,\t|').delimiter
+    except csv.Error:
+        return ','
+
+
+def read_header(file_path: str, encoding: Optional[str] = None) -> List[str]:
+    """Названия столбцов без чтения данных."""
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in CSV_EXTENSIONS:
+        encoding = encoding or detect_encoding(file_path)
+        with open(file_path, 'r', encoding=encoding, newline='') as f:
+            return next(csv.reader(f, delimiter=sniff_delimiter(file_path, encoding)), [])
+    if extension in PARQUET_EXTENSIONS:
+        import pyarrow.parquet as pq
+        return pq.read_schema(file_path).names
+    if extension in FEATHER_EXTENSIONS:
+        import pyarrow.ipc as ipc
+        with ipc.open_file(file_path) as reader:
+            return reader.schema.names
+    return [str(column) for column in pd.read_excel(file_path, nrows=0).columns]
+
+
+class TableReader:
+    """Чтение исходных таблиц: CSV, Parquet и Feather читаются через Arrow
+    в несколько потоков, Excel - один раз, после чего нужные столбцы
+    сохраняются в кэш Parquet с отпечатком файла.
+
+    encoding - кодировка CSV; по умолчанию UTF-8 или, если файл в ней
+    не читается, FALLBACK_ENCODING."""
+
+    def __init__(self, cache_dir: Optional[str] = DEFAULT_CACHE_DIR, max_cache_size: int = DEFAULT_CACHE_SIZE,
+                 encoding: Optional[str] = None):
+        self.cache_dir = cache_dir
+        self.max_cache_size = max_cache_size
+        self.encoding = encoding
+
+    def read(self, file_path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        extension = os.path.splitext(file_path)[1].lower()
+        if columns is not None:
+            columns = [column for column in dict.fromkeys(columns) if column]
+        if extension not in CSV_EXTENSIONS + PARQUET_EXTENSIONS + FEATHER_EXTENSIONS:
+            # Книга Excel не открывается, если нужные столбцы уже есть в кэше
+            df = self.read_excel(file_path, columns)
+        else:
+            df = self._read_arrow(file_path, extension, columns)
+        # Parquet и Feather восстанавливают сохранённый индекс; обработка ждёт позиции 0..n-1
+        return df.reset_index(drop=True)
+
+    def _read_arrow(self, file_path: str, extension: str, columns: Optional[List[str]]) -> pd.DataFrame:
+
+        encoding = None
+        if extension in CSV_EXTENSIONS:
+            encoding = self.encoding or detect_encoding(file_path)
+        if columns is not None:
+            # Отсутствующие столбцы не читаем, их проверяет вызывающий код
+            wanted = set(columns)
+            columns = [column for column in read_header(file_path, encoding) if column in wanted]
+
+        if extension in CSV_EXTENSIONS:
+            return pd.read_csv(file_path, sep=sniff_delimiter(file_path, encoding), usecols=columns,
+                               encoding=encoding, engine='pyarrow')
+        if extension in PARQUET_EXTENSIONS:
+            return pd.read_parquet(file_path, columns=columns)
+        return pd.read_feather(file_path, columns=columns)
+
+    def cache_path(self, file_path: str, columns: Optional[Sequence[str]]) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        key = file_fingerprint(file_path, *(sorted(columns) if columns is not None else ['*']))
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def read_excel(self, file_path: str, columns: Optional[Sequence[str]]) -> pd.DataFrame:
+        """Столбцы columns книги (отсутствующие пропускаются); ключ кэша -
+        отпечаток файла и запрошенные имена, заголовок книги для него не нужен."""
+        cache_path = self.cache_path(file_path, columns)
+        if cache_path and os.path.exists(cache_path):
+            try:
+                df = pd.read_parquet(cache_path)
+                os.utime(cache_path)
+                logging.info(f"Loaded {file_path} from cache {cache_path}")
+                return df
+            except Exception as e:
+                logging.error(f"Cache file {cache_path} is unreadable: {e}")
+
+        usecols = None
+        if columns is not None:
+            wanted = set(columns)
+            usecols = lambda column: str(column) in wanted
+        df = pd.read_excel(file_path, usecols=usecols)
+        if cache_path:
+            self.write_cache(df, cache_path)
+        return df
+
+    def write_cache(self, df: pd.DataFrame, cache_path: str) -> None:
+        tmp_path = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Одну книгу могут одновременно читать проверка данных и обработка,
+            # поэтому у каждой записи своё временное имя
+            fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+            os.close(fd)
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, cache_path)
+            logging.info(f"Cache written: {cache_path}")
+        except Exception as e:
+            # Например, столбцы со смешанными типами значений - просто работаем без кэша
+            logging.error(f"Cache not written for {cache_path}: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self.evict()
+
+    def evict(self) -> None:
+        """Удаляет самые давно использованные файлы кэша сверх max_cache_size."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith('.parquet') and os.path.isfile(path):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_cache_size:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                logging.info(f"Cache evicted: {path}")
+            except OSError as e:
+                logging.error(f"Cache file {path} not removed: {e}")
@@ -0,0 +1,143 @@
+import os
+import re
+import logging
+import pandas as pd
+
+from typing import Dict, List, Optional
+
+from tools.streets import canonical_street_type
+from tools.ingestion import CSV_EXTENSIONS, PARQUET_EXTENSIONS, FEATHER_EXTENSIONS, detect_encoding, sniff_delimiter
+
+X_NAMES = ('X', 'Х', 'COORD_X', 'КООРД_X', 'LAT', 'ШИРОТА', 'NORTHING')
+Y_NAMES = ('Y', 'У', 'COORD_Y', 'КООРД_Y', 'LON', 'LONG', 'ДОЛГОТА', 'EASTING')
+STREET_NAMES = ('SEM9', 'УЛИЦА', 'УЛИЦЫ', 'STREET', 'АДРЕС', 'НАЗВАНИЕ', 'NAME')
+
+
+class WorkbookInfo:
+    def __init__(self, file_path: str, sheet_names: List[str], columns: List[str],
+                 sample: pd.DataFrame, row_estimate: Optional[int]):
+        self.file_path = file_path
+        self.sheet_names = sheet_names
+        self.columns = columns
+        self.sample = sample
+        self.row_estimate = row_estimate
+        self.suggestions = suggest_columns(sample)
+
+    def missing_columns(self, *columns) -> List[str]:
+        return [column for column in columns if column and column not in self.columns]
+
+
+def _name_score(column: str, names) -> int:
+    name = str(column).strip().upper()
+    if name in names:
+        return 3
+    if any(re.search(rf'(^|[^A-ZА-Я]){re.escape(n)}($|[^A-ZА-Я])', name) for n in names):
+        return 2
+    return 0
+
+
+def suggest_columns(sample: pd.DataFrame) -> Dict[str, Optional[str]]:
+    """Предлагает столбцы X, Y и улиц по названиям и типам значений в выборке."""
+    numeric_share = {}
+    street_share = {}
+    for column in sample.columns:
+        values = sample[column].dropna()
+        if values.empty:
+            numeric_share[column] = street_share[column] = 0.0
+            continue
+        numeric_share[column] = pd.to_numeric(values, errors='coerce').notna().mean()
+        texts = values.astype(str)
+        street_share[column] = texts.map(
+            lambda text: any(canonical_street_type(token) for token in re.sub(r'\.(?=\S)', '. ', text).split())
+        ).mean()
+
+    def best(names, share, min_share, content_share=None):
+        # Столбец подходит по названию или (если задано content_share) по содержимому
+        scored = []
+        for column in sample.columns:
+            name_score = _name_score(column, names)
+            if share[column] < min_share:
+                continue
+            if name_score or (content_share is not None and share[column] >= content_share):
+                scored.append((name_score + share[column], column))
+        return str(max(scored, key=lambda item: item[0])[1]) if scored else None
+
+    return {
+        'x': best(X_NAMES, numeric_share, 0.9),
+        'y': best(Y_NAMES, numeric_share, 0.9),
+        'street': best(STREET_NAMES, street_share, 0.0, content_share=0.5),
+    }
+
+
+def inspect_workbook(file_path: str, sample_rows: int = 200) -> WorkbookInfo:
+    """Быстрый просмотр файла: листы, заголовки, выборка строк и оценка числа строк
+    без загрузки всей книги. Из .xls загружается только первый лист, но он
+    разбирается целиком: формат BIFF построчно не читается."""
+    extension = os.path.splitext(file_path)[1].lower()
+
+    if extension in ('.xlsx', '.xlsm'):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            sheet = workbook.worksheets[0]
+            rows = sheet.iter_rows(max_row=sample_rows + 1, values_only=True)
+            header = next(rows, ())
+            columns = [str(value) if value is not None else f"Unnamed: {i}" for i, value in enumerate(header)]
+            sample = pd.DataFrame([row[:len(columns)] for row in rows], columns=columns)
+            # max_row в режиме только чтения берётся из размера листа в заголовке файла
+            row_estimate = sheet.max_row - 1 if sheet.max_row else None
+            sheet_names = workbook.sheetnames
+        finally:
+            workbook.close()
+    elif extension in CSV_EXTENSIONS:
+        sheet_names = []
+        encoding = detect_encoding(file_path)
+        sample = pd.read_csv(file_path, sep=sniff_delimiter(file_path, encoding), nrows=sample_rows, encoding=encoding)
+        columns = [str(column) for column in sample.columns]
+        # Оценка числа строк по размеру файла и средней длине строк выборки
+        with open(file_path, 'rb') as f:
+            head = f.read(1024 * 1024)
+        lines = head.count(b'\n')
+        row_estimate = int(os.path.getsize(file_path) / len(head) * lines) - 1 if lines else None
+    elif extension in PARQUET_EXTENSIONS:
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(file_path)
+        sheet_names = []
+        sample = parquet.read_row_group(0).slice(0, sample_rows).to_pandas() if parquet.num_row_groups else pd.DataFrame()
+        columns = parquet.schema_arrow.names
+        row_estimate = parquet.metadata.num_rows
+    elif extension in FEATHER_EXTENSIONS:
+        import pyarrow.ipc as ipc
+
+        with ipc.open_file(file_path) as reader:
+            sheet_names = []
+            columns = reader.schema.names
+            sample = reader.get_batch(0).slice(0, sample_rows).to_pandas() if reader.num_record_batches else pd.DataFrame(columns=columns)
+            row_estimate = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+    elif extension == '.xls':
+        import xlrd
+
+        # on_demand: остальные листы книги не разбираются
+        workbook = xlrd.open_workbook(file_path, on_demand=True)
+        try:
+            sheet_names = workbook.sheet_names()
+            sheet = workbook.sheet_by_index(0)
+            header = sheet.row_values(0) if sheet.nrows else []
+            columns = [str(value) if value != '' else f"Unnamed: {i}" for i, value in enumerate(header)]
+            rows = [[value if value != '' else None for value in sheet.row_values(row)[:len(columns)]]
+                    for row in range(1, min(sheet.nrows, sample_rows + 1))]
+            sample = pd.DataFrame(rows, columns=columns)
+            row_estimate = max(sheet.nrows - 1, 0)
+        finally:
+            workbook.release_resources()
+    else:
+        excel = pd.ExcelFile(file_path)
+        sheet_names = excel.sheet_names
+        sample = excel.parse(sheet_names[0], nrows=sample_rows)
+        columns = [str(column) for column in sample.columns]
+        row_estimate = None
+
+    logging.info(f"Inspected {file_path}: {len(columns)} columns, ~{row_estimate} rows")
+    return WorkbookInfo(file_path, sheet_names, columns, sample, row_estimate)
@@ -0,0 +1,206 @@
+import os
+import queue
+import logging
+import itertools
+import threading
+
+from typing import Dict, Optional
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """Фоновая задача планировщика. Наследники реализуют execute(),
+    периодически вызывая report_progress() и check_cancelled()."""
+
+    def __init__(self, name: str, priority: int = 0):
+        self.job_id = None
+        self.name = name
+        # Чем больше приоритет, тем раньше задача берётся из очереди
+        self.priority = priority
+        self.scheduler = None
+        self._cancel_event = threading.Event()
+
+    def cancel(self) -> None:
+        self._cancel_event.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self) -> None:
+        if self.is_cancelled():
+            raise JobCancelled()
+
+    def report_progress(self, value: int) -> None:
+        if self.scheduler is not None:
+            self.scheduler.post_progress(self.job_id, value)
+
+    def post(self, kind: str, data=None) -> None:
+        if self.scheduler is not None:
+            self.scheduler.post_event(self.job_id, 'message', (kind, data))
+
+    def reserve_cpus(self, count: int) -> int:
+        """Занимает до count свободных ядер планировщика сверх своего (для
+        рабочих процессов) и возвращает, сколько занято. Вне планировщика
+        ограничений нет. Занятые ядра возвращаются через release_cpus()."""
+        if self.scheduler is None:
+            return max(count, 0)
+        return self.scheduler.reserve_cpus(count)
+
+    def release_cpus(self, count: int) -> None:
+        if self.scheduler is not None:
+            self.scheduler.release_cpus(count)
+
+    def execute(self):
+        raise NotImplementedError
+
+
+class JobScheduler(QObject):
+    """Общий для приложения пул фоновых задач с очередью по приоритетам.
+
+    События задач копятся в общем канале и раз в flush_interval мс
+    передаются в GUI; из нескольких отчётов о прогрессе одной задачи
+    передаётся только последний.
+
+    Всего ядер max_workers: каждая выполняющаяся задача занимает одно,
+    свободные задача может занять под рабочие процессы (Job.reserve_cpus),
+    и тогда следующие задачи ждут их освобождения."""
+
+    job_started = pyqtSignal(int)
+    job_progress = pyqtSignal(int, int)
+    job_message = pyqtSignal(int, str, object)
+    job_finished = pyqtSignal(int, object)
+    job_failed = pyqtSignal(int, str)
+    job_cancelled = pyqtSignal(int)
+
+    def __init__(self, max_workers: Optional[int] = None, flush_interval: int = 100, parent=None):
+        super().__init__(parent)
+        cores = os.cpu_count() or 1
+        self.max_workers = max(1, min(max_workers or cores, cores))
+
+        self._queue = queue.PriorityQueue()
+        self._ids = itertools.count(1)
+        self._jobs: Dict[int, Job] = {}
+        self._lock = threading.Lock()
+        self._progress: Dict[int, int] = {}
+        self._events = []
+        self._cpus = threading.Semaphore(self.max_workers)
+
+        self._workers = [threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+                         for i in range(self.max_workers)]
+        for worker in self._workers:
+            worker.start()
+
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start(flush_interval)
+
+    def submit(self, job: Job) -> int:
+        job.job_id = next(self._ids)
+        job.scheduler = self
+        with self._lock:
+            self._jobs[job.job_id] = job
+        self._queue.put((-job.priority, job.job_id, job))
+        logging.info(f"Job {job.job_id} '{job.name}' queued")
+        return job.job_id
+
+    def cancel(self, job_id: int) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            job.cancel()
+
+    def active_jobs(self) -> int:
+        with self._lock:
+            return len(self._jobs)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Отменяет все задачи и дожидается, пока рабочие потоки их отпустят."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancel()
+        for _ in self._workers:
+            self._queue.put((float('inf'), 0, None))
+        if wait:
+            for worker in self._workers:
+                worker.join()
+        self._timer.stop()
+
+    def reserve_cpus(self, count: int) -> int:
+        reserved = 0
+        while reserved < count and self._cpus.acquire(blocking=False):
+            reserved += 1
+        return reserved
+
+    def release_cpus(self, count: int) -> None:
+        for _ in range(count):
+            self._cpus.release()
+
+    def post_progress(self, job_id: int, value: int) -> None:
+        with self._lock:
+            self._progress[job_id] = value
+
+    def post_event(self, job_id: int, kind: str, data=None) -> None:
+        with self._lock:
+            self._events.append((job_id, kind, data))
+
+    def _worker_loop(self):
+        while True:
+            _, job_id, job = self._queue.get()
+            if job is None:
+                return
+
+            if job.is_cancelled():
+                self._finish(job_id, 'cancelled')
+                continue
+
+            # Ядро берётся уже после выбора задачи: простаивающий поток ядер не держит
+            self._cpus.acquire()
+            try:
+                self._run(job_id, job)
+            finally:
+                self._cpus.release()
+
+    def _run(self, job_id, job):
+        self.post_event(job_id, 'started')
+        try:
+            result = job.execute()
+        except JobCancelled:
+            self._finish(job_id, 'cancelled')
+        except Exception as e:
+            logging.critical(f"Job {job_id} '{job.name}' failed: {e}")
+            self._finish(job_id, 'failed', str(e))
+        else:
+            if job.is_cancelled():
+                self._finish(job_id, 'cancelled')
+            else:
+                self._finish(job_id, 'finished', result)
+
+    def _finish(self, job_id, kind, data=None):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+        self.post_event(job_id, kind, data)
+
+    def flush(self):
+        with self._lock:
+            progress, self._progress = self._progress, {}
+            events, self._events = self._events, []
+
+        for job_id, value in progress.items():
+            self.job_progress.emit(job_id, value)
+
+        for job_id, kind, data in events:
+            if kind == 'started':
+                self.job_started.emit(job_id)
+            elif kind == 'message':
+                self.job_message.emit(job_id, data[0], data[1])
+            elif kind == 'finished':
+                self.job_finished.emit(job_id, data)
+            elif kind == 'failed':
+                self.job_failed.emit(job_id, data)
+            elif kind == 'cancelled':
+                self.job_cancelled.emit(job_id)
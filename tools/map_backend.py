@@ -0,0 +1,348 @@
+import os
+import json
+import time
+import logging
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+ERROR_SEMANTIC_NAME = 'Ошибка соответствия'
+
+SQLITE_EXTENSIONS = ('.sqlite', '.sqlite3', '.db')
+GEOJSON_EXTENSIONS = ('.geojson', '.json')
+MAP_FILTER = "Локальная карта (*.sqlite *.sqlite3 *.db *.geojson *.json)"
+
+OBJECT_COLUMNS = ['key', 'x', 'y', 'value']
+
+
+class MapBackendError(Exception):
+    """Ошибка обращения к карте; запись пачки семантик после неё повторяется."""
+    pass
+
+
+class MapBackend:
+    """Источник объектов карты для считки.
+
+    Объекты читаются блоками-таблицами со столбцами key, x, y, value
+    (value - значение выбранной семантики). Семантики записываются пачками,
+    каждая пачка - одна транзакция, см. SemanticWriter."""
+
+    def layers(self) -> List[str]:
+        raise NotImplementedError
+
+    def semantics(self, layer: str) -> List[Tuple[str, str]]:
+        """Семантики объектов слоя: (код, название)."""
+        raise NotImplementedError
+
+    def iter_objects(self, layer: str, semantic: Optional[str] = None,
+                     batch_size: int = 10000) -> Iterator[pd.DataFrame]:
+        raise NotImplementedError
+
+    def read_objects(self, layer: str, semantic: Optional[str] = None,
+                     batch_size: int = 10000) -> pd.DataFrame:
+        chunks = list(self.iter_objects(layer, semantic, batch_size))
+        if not chunks:
+            return pd.DataFrame(columns=OBJECT_COLUMNS)
+        return pd.concat(chunks, ignore_index=True)
+
+    def ensure_semantic(self, layer: str, name: str) -> str:
+        """Код семантики с названием name; если такой нет, она создаётся."""
+        raise NotImplementedError
+
+    def write_semantics(self, layer: str, code: str, values: Sequence[Tuple[int, Optional[str]]]) -> None:
+        """Записывает значения семантики code для пар (ключ объекта, значение)
+        одной транзакцией: при MapBackendError не записано ничего.
+        Значение None удаляет семантику у объекта."""
+        raise NotImplementedError
+
+    def save(self) -> None:
+        """Сохраняет записанные семантики, если карта их не сохраняет сразу."""
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class SemanticWriter:
+    """Пакетная запись семантик: значения копятся до batch_size и пишутся
+    одной транзакцией. При MapBackendError запись пачки повторяется
+    до retries раз с удваивающейся паузой. При выходе из with карта
+    сохраняется (MapBackend.save) с теми же повторами."""
+
+    def __init__(self, backend: MapBackend, layer: str, code: str, batch_size: int = 500,
+                 retries: int = 3, retry_delay: float = 0.5):
+        if batch_size < 1:
+            raise ValueError("Размер пачки должен быть положительным")
+        self.backend = backend
+        self.layer = layer
+        self.code = code
+        self.batch_size = batch_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.written = 0
+        self._batch: List[Tuple[int, str]] = []
+
+    def add(self, key, value) -> None:
+        self._batch.append((key, value))
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def _retry(self, action, description: str) -> None:
+        for attempt in range(self.retries + 1):
+            try:
+                action()
+                return
+            except MapBackendError as e:
+                if attempt == self.retries:
+                    raise
+                logging.warning(f"{description} failed ({e}), retry {attempt + 1}")
+                time.sleep(self.retry_delay * 2 ** attempt)
+
+    def flush(self) -> None:
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        self._retry(lambda: self.backend.write_semantics(self.layer, self.code, batch),
+                    f"Semantic batch of {len(batch)}")
+        self.written += len(batch)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        # Записанные пачки сохраняются и при ошибке в одной из следующих
+        try:
+            self._retry(self.backend.save, "Map save")
+        except MapBackendError as e:
+            if exc_type is None:
+                raise
+            logging.error(f"Map not saved: {e}")
+        return False
+
+
+class SQLiteMapBackend(MapBackend):
+    """Локальная карта в файле SQLite: объекты слоёв с координатами и их семантики."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS objects (
+            layer TEXT NOT NULL, key INTEGER NOT NULL, x REAL, y REAL,
+            PRIMARY KEY (layer, key));
+        CREATE TABLE IF NOT EXISTS semantics (
+            layer TEXT NOT NULL, key INTEGER NOT NULL, code TEXT NOT NULL, value TEXT,
+            PRIMARY KEY (layer, key, code));
+        CREATE TABLE IF NOT EXISTS semantic_names (
+            code TEXT PRIMARY KEY, name TEXT NOT NULL);
+    """
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        # Транзакции открываются явно; соединение используется
+        # из рабочих потоков планировщика под блокировкой
+        self._conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self._lock = threading.RLock()
+        with self._lock:
+            self._conn.executescript(self.SCHEMA)
+
+    def _execute(self, sql: str, params=()):
+        try:
+            with self._lock:
+                return self._conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            raise MapBackendError(str(e)) from e
+
+    def layers(self) -> List[str]:
+        return [row[0] for row in self._execute("SELECT DISTINCT layer FROM objects ORDER BY layer")]
+
+    def semantics(self, layer: str) -> List[Tuple[str, str]]:
+        return [tuple(row) for row in self._execute(
+            "SELECT DISTINCT s.code, COALESCE(n.name, s.code) FROM semantics s "
+            "LEFT JOIN semantic_names n ON n.code = s.code WHERE s.layer = ? ORDER BY s.code", (layer,))]
+
+    def iter_objects(self, layer: str, semantic: Optional[str] = None,
+                     batch_size: int = 10000) -> Iterator[pd.DataFrame]:
+        last_key = None
+        while True:
+            # Постраничное чтение по ключу: соединение не занято между блоками
+            rows = self._execute(
+                "SELECT o.key, o.x, o.y, s.value FROM objects o "
+                "LEFT JOIN semantics s ON s.layer = o.layer AND s.key = o.key AND s.code = ? "
+                "WHERE o.layer = ? AND (? IS NULL OR o.key > ?) ORDER BY o.key LIMIT ?",
+                (semantic, layer, last_key, last_key, batch_size))
+            if not rows:
+                return
+            last_key = rows[-1][0]
+            yield pd.DataFrame(rows, columns=OBJECT_COLUMNS)
+
+    def ensure_semantic(self, layer: str, name: str) -> str:
+        with self._lock:
+            rows = self._execute("SELECT code FROM semantic_names WHERE name = ?", (name,))
+            if rows:
+                return rows[0][0]
+            self._execute("INSERT INTO semantic_names (code, name) VALUES (?, ?)", (name, name))
+            return name
+
+    def write_semantics(self, layer: str, code: str, values: Sequence[Tuple[int, Optional[str]]]) -> None:
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO semantics (layer, key, code, value) VALUES (?, ?, ?, ?)",
+                    ((layer, key, code, value) for key, value in values if value is not None))
+                self._conn.executemany(
+                    "DELETE FROM semantics WHERE layer = ? AND key = ? AND code = ?",
+                    ((layer, key, code) for key, value in values if value is None))
+                self._conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                raise MapBackendError(str(e)) from e
+
+    def add_objects(self, layer: str, df: pd.DataFrame) -> None:
+        """Загрузка объектов в карту: столбцы key, x, y, остальные - семантики."""
+        codes = [column for column in df.columns if column not in ('key', 'x', 'y')]
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN")
+                self._conn.executemany("INSERT OR REPLACE INTO objects (layer, key, x, y) VALUES (?, ?, ?, ?)",
+                                       ((layer, int(key), float(x), float(y))
+                                        for key, x, y in zip(df['key'], df['x'], df['y'])))
+                for code in codes:
+                    values = df[['key', code]].dropna()
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO semantics (layer, key, code, value) VALUES (?, ?, ?, ?)",
+                        ((layer, int(key), str(code), str(value)) for key, value in zip(values['key'], values[code])))
+                self._conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                raise MapBackendError(str(e)) from e
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class GeoJSONMapBackend(MapBackend):
+    """Локальная карта в файле GeoJSON (FeatureCollection).
+
+    Слой объекта - свойство 'layer', ключ - id объекта, остальные свойства -
+    семантики. Координаты GeoJSON (восток, север) соответствуют (y, x);
+    для линий и полигонов берётся среднее их вершин. Семантики меняются
+    в памяти, файл перезаписывается целиком один раз - в save()
+    (в конце записи SemanticWriter) или при закрытии карты."""
+
+    LAYER_PROPERTY = 'layer'
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, encoding='utf-8') as f:
+            self.collection = json.load(f)
+        # Ключ объекта - id из файла как есть (число или строка), без id - позиция в файле
+        self._features: Dict[Tuple[str, Union[int, str]], dict] = {}
+        for position, feature in enumerate(self.collection.get('features', [])):
+            properties = feature.setdefault('properties', {}) or {}
+            feature['properties'] = properties
+            key = feature.get('id', position)
+            self._features[(str(properties.get(self.LAYER_PROPERTY, '')), key)] = feature
+        self._lock = threading.RLock()
+        self._dirty = False
+
+    @staticmethod
+    def _point(geometry) -> Tuple[float, float]:
+        if not geometry:
+            return np.nan, np.nan
+        coordinates = geometry.get('coordinates', [])
+        if geometry.get('type') == 'Point':
+            return float(coordinates[1]), float(coordinates[0])
+        flat = np.asarray(_flatten_positions(coordinates), dtype=float).reshape(-1, 2)
+        if not len(flat):
+            return np.nan, np.nan
+        east, north = flat.mean(axis=0)
+        return float(north), float(east)
+
+    def layers(self) -> List[str]:
+        return sorted({layer for layer, _ in self._features})
+
+    def semantics(self, layer: str) -> List[Tuple[str, str]]:
+        codes = set()
+        for (feature_layer, _), feature in self._features.items():
+            if feature_layer == layer:
+                codes.update(code for code in feature['properties'] if code != self.LAYER_PROPERTY)
+        return [(code, code) for code in sorted(codes)]
+
+    def iter_objects(self, layer: str, semantic: Optional[str] = None,
+                     batch_size: int = 10000) -> Iterator[pd.DataFrame]:
+        rows = []
+        # Порядок файла: числовые и строковые id между собой не сортируются
+        for (feature_layer, key), feature in self._features.items():
+            if feature_layer != layer:
+                continue
+            x, y = self._point(feature.get('geometry'))
+            value = feature['properties'].get(semantic) if semantic is not None else None
+            rows.append((key, x, y, value))
+            if len(rows) >= batch_size:
+                yield pd.DataFrame(rows, columns=OBJECT_COLUMNS)
+                rows = []
+        if rows:
+            yield pd.DataFrame(rows, columns=OBJECT_COLUMNS)
+
+    def ensure_semantic(self, layer: str, name: str) -> str:
+        return name
+
+    def write_semantics(self, layer: str, code: str, values: Sequence[Tuple[int, Optional[str]]]) -> None:
+        with self._lock:
+            for key, value in values:
+                feature = self._features.get((layer, key))
+                if feature is None:
+                    continue
+                properties = feature['properties']
+                if value is None:
+                    if code in properties:
+                        del properties[code]
+                        self._dirty = True
+                elif properties.get(code, _MISSING) != value:
+                    properties[code] = value
+                    self._dirty = True
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.collection, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                raise MapBackendError(str(e)) from e
+            self._dirty = False
+            logging.info(f"Map saved to {self.path}")
+
+    def close(self) -> None:
+        self.save()
+
+
+_MISSING = object()
+
+
+def _flatten_positions(coordinates) -> List[float]:
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        return list(coordinates[:2])
+    flat = []
+    for part in coordinates:
+        flat.extend(_flatten_positions(part))
+    return flat
+
+
+def open_map_backend(path: str) -> MapBackend:
+    extension = os.path.splitext(path)[1].lower()
+    if extension in SQLITE_EXTENSIONS:
+        return SQLiteMapBackend(path)
+    if extension in GEOJSON_EXTENSIONS:
+        return GeoJSONMapBackend(path)
+    raise ValueError(f"Неподдерживаемый формат карты: {extension}")
@@ -1,17 +1,61 @@
+import os
 import re
 import math
+import time
 import logging
+import numpy as np
 import pandas as pd
 
-from typing import Tuple
-from PyQt5.QtCore import QThread, pyqtSignal
+from typing import Optional, Tuple
+
+from tools.sheet_layout import SheetLayout
+from tools.streets import STREET_TYPES, StreetResolver
+from tools.checkpoint import (file_fingerprint, checkpoint_path, save_checkpoint,
+                              load_checkpoint, remove_checkpoint)
+from tools.ingestion import TableReader
+from tools.jobs import Job, JobCancelled
+from tools.external_sort import ExternalSorter
+from tools.hierarchy import calculate_hierarchy
+from tools.quality import scan_coordinates
+
+SHEET_KEY_COLUMNS = ('Форматированная улица', 'Номенклатурный индекс', 'Лист карты')
+
+
+def compress_indices(indices) -> str:
+    """Сводная запись номенклатурных индексов улицы: "А-1, 2, 3" при общей
+    букве, иначе индексы группируются по номеру: "А, Б-1; В-2"."""
+    sorted_indices = sorted(indices)
+    first = sorted_indices[0]
+
+    prefix_end = 0
+    for i, char in enumerate(first):
+        if char.isdigit():
+            prefix_end = i
+            break
+    prefix = first[:prefix_end]
+
+    if all(index.startswith(prefix) for index in sorted_indices):
+        numbers = [index[len(prefix):] for index in sorted_indices]
+        if len(numbers) == 1:
+            return f"{prefix}{numbers[0]}"
+        return f"{prefix}{numbers[0]}, {', '.join(numbers[1:])}"
+
+    number_to_prefixes = {}
+    for index in sorted_indices:
+        number_start = next((i for i, char in enumerate(index) if char.isdigit()), None)
+        number_part = index[number_start:] if number_start is not None else index
+        prefix_str = ''.join(char for char in index[:number_start] if char != '-')
+        number_to_prefixes.setdefault(number_part, []).append(prefix_str)
+
+    return "; ".join(f"{', '.join(prefixes)}-{number_part}" for number_part, prefixes in number_to_prefixes.items())
 
 
 class NomenclaturalStreetIndexer:
-    def __init__(self, square_size: int = 500):
+    def __init__(self, square_size: int = 500, sheet_layout: Optional[SheetLayout] = None):
         self.square_size = square_size
         self.origin_x = None
         self.origin_y = None
+        self.sheet_layout = sheet_layout or SheetLayout()
         
         self.letters = [chr(i) for i in range(1040, 1072)]
         self.letters = [letter for letter in self.letters if letter != 'Ё' and letter != 'Й' and letter != 'Ы' and letter != 'Ь' and letter != 'Ъ']
@@ -20,6 +64,13 @@ class NomenclaturalStreetIndexer:
         self.origin_x = x
         self.origin_y = y
 
+    def copy(self) -> 'NomenclaturalStreetIndexer':
+        """Независимая копия настроек: задача работает с ними, даже если
+        в окне тем временем сменили начало координат или раскладку."""
+        indexer = NomenclaturalStreetIndexer(self.square_size, self.sheet_layout.copy())
+        indexer.set_origin(self.origin_x, self.origin_y)
+        return indexer
+
     def _calculate_indices(self, x: float, y: float) -> Tuple[float, float, int, int]:
         if self.origin_x is None or self.origin_y is None:
             raise ValueError("Начало координат не установлено!")
@@ -41,16 +92,30 @@ class NomenclaturalStreetIndexer:
         
         return f"{letter}-{number}"
     
-    def calculate_list_number(self, x: float, y: float, border: int = 4500) -> str:
-        delta_x, delta_y, col_index, row_index = self._calculate_indices(x, y)
-        number = row_index + 1
-        
-        if number <= 9:
-            list_number = "Лист 1" if delta_x <= border else "Лист 3"
-        else:
-            list_number = "Лист 2" if delta_x <= border else "Лист 4"
+    def calculate_cells(self, x, y) -> Tuple[np.ndarray, np.ndarray]:
+        if self.origin_x is None or self.origin_y is None:
+            raise ValueError("Начало координат не установлено!")
+
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+
+        col_index = np.floor((self.origin_x - x) / self.square_size)
+        row_index = np.floor((y - self.origin_y) / self.square_size)
+
+        return col_index, row_index
 
-        return list_number
+    def calculate_sheet_ids(self, x, y) -> np.ndarray:
+        col_index, row_index = self.calculate_cells(x, y)
+        valid = np.isfinite(col_index) & np.isfinite(row_index)
+
+        sheet_ids = np.full(col_index.shape, -1, dtype=np.int64)
+        sheet_ids[valid] = self.sheet_layout.sheet_ids(col_index[valid], row_index[valid])
+
+        return sheet_ids
+
+    def calculate_list_number(self, x: float, y: float) -> str:
+        sheet_id = int(self.calculate_sheet_ids([x], [y])[0])
+        return self.sheet_layout.sheet_name(sheet_id)
     
     # def capitalize(self, street_name: str) -> str: 
     #     street_capitalizating = street_name.capitalize()
@@ -68,7 +133,7 @@ class NomenclaturalStreetIndexer:
         if len(parts) < 2:
             return street_name
         
-        street_types = ['УЛ.', 'ПРОСП.', 'ПР.', 'ПЕР.', 'Ш.', 'НАБ.', 'Б-Р', 'БУЛЬВАР', 'ПЛ.', 'ПЛОЩАДЬ']
+        street_types = STREET_TYPES
 
         if parts[0] in street_types:
             street_type = parts[0].lower()
@@ -88,183 +153,253 @@ class NomenclaturalStreetIndexer:
         else:
             return street_name.capitalize()
      
-class ProcessingThread(QThread):
-
-    progress_updated = pyqtSignal(int)          
-    finished_processing = pyqtSignal(pd.DataFrame)  
-    error_occurred = pyqtSignal(str)            
+class ProcessingJob(Job):
     
-    def __init__(self, indexer, file_path, x_col, y_col, street_col=None):
-        super().__init__()
-        self.indexer = indexer
+    def __init__(self, indexer, file_path, x_col, y_col, street_col=None, transform_stage=None,
+                 street_resolver=None, resume=False, chunk_size=5000, checkpoint_interval=30.0,
+                 reader=None, priority=0, memory_budget=256 * 1024 ** 2, hierarchy_levels=None,
+                 checkpoint_dir=None, result_path=None):
+        super().__init__(f"Обработка {os.path.basename(file_path)}", priority)
+        # Настройки фиксируются при постановке задачи в очередь
+        self.indexer = indexer.copy()
         self.file_path = file_path
         self.x_col = x_col
         self.y_col = y_col
         self.street_col = street_col  
+        self.transform_stage = transform_stage
+        self.street_resolver = street_resolver or StreetResolver()
+        self.resume = resume
+        self.chunk_size = chunk_size
+        # Секунды между контрольными точками
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_path = checkpoint_path(file_path, checkpoint_dir)
+        self.reader = reader or TableReader()
+        # Байт на результат до сброса во временные файлы при сортировке
+        self.memory_budget = memory_budget
+        # Дополнительные уровни деления квадратов (tools.hierarchy.HierarchyLevel)
+        self.hierarchy_levels = hierarchy_levels
+        # Parquet-файл для результата: тогда он пишется пачками и в памяти не собирается,
+        # execute() возвращает путь, а df_result остаётся None
+        self.result_path = result_path
+        self.quality_report = None
         self.df_result = None
+        # Все пары (улица, индекс, лист) до удаления дубликатов - для справочников по листам
+        self.sheet_rows = None
+
+    def _fingerprint(self):
+        stage = self.transform_stage
+        stage_params = (stage.source_crs, stage.target_crs, stage.crs_col) if stage else None
+        # Всё, от чего зависят сохраняемые в точке листы и id улиц
+        return file_fingerprint(self.file_path, self.x_col, self.y_col, self.street_col,
+                                self.indexer.origin_x, self.indexer.origin_y,
+                                self.indexer.square_size, stage_params,
+                                self.indexer.sheet_layout.signature(), self.street_resolver.signature())
+
+    def _save_checkpoint(self, fingerprint, rows_done, nomenclatural_indices, formatted_streets,
+                         sheet_ids, street_indices, street_occurrences):
+        try:
+            save_checkpoint(self.checkpoint_path, fingerprint, {
+                'rows_done': rows_done,
+                'nomenclatural_indices': nomenclatural_indices[:rows_done],
+                'formatted_streets': formatted_streets[:rows_done],
+                'sheet_ids': sheet_ids,
+                'street_indices': street_indices,
+                'street_occurrences': street_occurrences,
+            })
+        except OSError as e:
+            logging.error(f"Checkpoint not saved: {e}")
         
-    def run(self):
+    def _hierarchy_columns(self, x_values, y_values, sheet_ids, street_ids):
+        """Коды дополнительных уровней: по улице - все её квадраты уровня, иначе квадрат точки."""
+        if not self.hierarchy_levels:
+            return {}
+
+        hierarchy = calculate_hierarchy(self.indexer, self.hierarchy_levels, x_values, y_values)
+        errors = sheet_ids < 0
+        columns = {}
+        for level in range(1, hierarchy.depth + 1):
+            if street_ids is not None:
+                by_street = {street: ', '.join(codes) for street, codes in hierarchy.aggregate(street_ids, level).items()}
+                values = pd.Series(street_ids).map(by_street).fillna('').to_numpy(dtype=object)
+            else:
+                values = hierarchy.codes(level)
+            columns[hierarchy.level_name(level)] = np.where(errors, "Ошибка", values)
+        return columns
+
+    def execute(self):
 
         try:
-            df = pd.read_excel(self.file_path)
+            crs_col = self.transform_stage.crs_col if self.transform_stage is not None else None
+            df = self.reader.read(self.file_path, columns=[self.x_col, self.y_col, self.street_col, crs_col])
             
             if self.x_col not in df.columns or self.y_col not in df.columns:
-                self.error_occurred.emit(f"Столбцы '{self.x_col}' и/или '{self.y_col}' не найдены в файле")
                 logging.critical('Column X or Y not found')
-                return
+                raise ValueError(f"Столбцы '{self.x_col}' и/или '{self.y_col}' не найдены в файле")
             
             if self.street_col and self.street_col not in df.columns:
-                self.error_occurred.emit(f"Столбец '{self.street_col}' не найден в файле")
                 logging.critical('Column Street not found')
-                return
+                raise ValueError(f"Столбец '{self.street_col}' не найден в файле")
+
+            raw_x, raw_y = df[self.x_col], df[self.y_col]
+            projected = None
+            if self.transform_stage is not None:
+                if crs_col and crs_col not in df.columns:
+                    logging.critical('Column CRS not found')
+                    raise ValueError(f"Столбец '{crs_col}' не найден в файле")
+                df = self.transform_stage.apply(df, self.x_col, self.y_col)
+                projected = (df[self.x_col], df[self.y_col])
+
+            # Предварительная проверка всей таблицы до построчной обработки
+            self.quality_report = scan_coordinates(self.indexer, raw_x, raw_y, projected)
+            if self.quality_report.flagged_count:
+                logging.warning('Quality scan: ' + '; '.join(self.quality_report.summary()))
+                self.post('quality', self.quality_report.summary())
             
             street_indices = {}
             street_occurrences = {}
 
             nomenclatural_indices = []
             final_indices = []
-            list_numbers = []
             formatted_streets = []
             total_rows = len(df)
-            
-            for idx, row in df.iterrows():
-                try:
-                    x_val = float(row[self.x_col])
-                    y_val = float(row[self.y_col])
+
+            x_values = pd.to_numeric(df[self.x_col], errors='coerce').to_numpy(dtype=float)
+            y_values = pd.to_numeric(df[self.y_col], errors='coerce').to_numpy(dtype=float)
+            sheet_ids = self.indexer.calculate_sheet_ids(x_values, y_values)
+
+            if self.street_col:
+                street_ids, street_names = self.street_resolver.resolve(df[self.street_col])
+                logging.info(f"{len(street_names)} streets resolved")
+
+            fingerprint = self._fingerprint()
+            start_row = 0
+            if self.resume:
+                state = load_checkpoint(self.checkpoint_path, fingerprint)
+                if state is not None:
+                    start_row = state['rows_done']
+                    nomenclatural_indices = state['nomenclatural_indices']
+                    formatted_streets = state['formatted_streets']
+                    sheet_ids = state['sheet_ids']
+                    street_indices = state['street_indices']
+                    street_occurrences = state['street_occurrences']
+                    logging.info(f"Resuming from row {start_row}")
+
+            last_checkpoint = time.monotonic()
+            for chunk_start in range(start_row, total_rows, self.chunk_size):
+                if self.is_cancelled():
+                    self._save_checkpoint(fingerprint, chunk_start, nomenclatural_indices, formatted_streets,
+                                          sheet_ids, street_indices, street_occurrences)
+                    raise JobCancelled()
+
+                if time.monotonic() - last_checkpoint >= self.checkpoint_interval:
+                    self._save_checkpoint(fingerprint, chunk_start, nomenclatural_indices, formatted_streets,
+                                          sheet_ids, street_indices, street_occurrences)
+                    last_checkpoint = time.monotonic()
+
+                # idx - позиция строки, а не метка индекса таблицы
+                chunk_rows = df.iloc[chunk_start:chunk_start + self.chunk_size].iterrows()
+                for idx, (_, row) in enumerate(chunk_rows, chunk_start):
+                    try:
+                        x_val = float(row[self.x_col])
+                        y_val = float(row[self.y_col])
                     
-                    nomenclatural_index = self.indexer.calculate_nomenclatural_index(x_val, y_val)
-                    list_number = self.indexer.calculate_list_number(x_val, y_val)
-                    logging.info('self calculation passed')
+                        nomenclatural_index = self.indexer.calculate_nomenclatural_index(x_val, y_val)
+                        logging.info('self calculation passed')
 
-                    if self.street_col:
-                        street_name = str(row[self.street_col])
+                        if self.street_col:
+                            street_id = street_ids[idx]
+                            street_name = street_names[street_id]
 
-                        if street_name in street_indices:
-                            street_indices[street_name].add(nomenclatural_index)
-                            street_occurrences[street_name] += 1
-                        else:
-                            street_indices[street_name] = {nomenclatural_index}
-                            street_occurrences[street_name] = 1
+                            if street_id in street_indices:
+                                street_indices[street_id].add(nomenclatural_index)
+                                street_occurrences[street_id] += 1
+                            else:
+                                street_indices[street_id] = {nomenclatural_index}
+                                street_occurrences[street_id] = 1
                     
-                        formatted_street = self.indexer.format_street_name(street_name)
-                    else:
-                        formatted_street = ""
-                        street_name = ""
-                    logging.info('formating passed')
+                            formatted_street = self.indexer.format_street_name(street_name)
+                        else:
+                            formatted_street = ""
+                            street_name = ""
+                        logging.info('formating passed')
 
                     
-                    nomenclatural_indices.append(nomenclatural_index)
-                    list_numbers.append(list_number)
-                    formatted_streets.append(formatted_street)                           
+                        nomenclatural_indices.append(nomenclatural_index)
+                        formatted_streets.append(formatted_street)                           
 
                     
-                except (ValueError, TypeError):
-                    nomenclatural_indices.append("Ошибка")
-                    list_numbers.append("Ошибка")
-                    formatted_streets.append("Ошибка")
-                    logging.critical('function raised error')
-
-                progress = int((idx + 1) / total_rows * 100)
-                self.progress_updated.emit(progress)
+                    except (ValueError, TypeError):
+                        nomenclatural_indices.append("Ошибка")
+                        sheet_ids[idx] = -1
+                        formatted_streets.append("Ошибка")
+                        logging.critical('function raised error')
+
+                    progress = int((idx + 1) / total_rows * 100)
+                    self.report_progress(progress)
             
-            logging.info(f"Starting second pass. Total rows: {len(df)}")
-            for idx, row in df.iterrows():
-                try:
-                    if self.street_col:
-                        street_name = str(row[self.street_col])
-                        
-                        if street_name in street_occurrences:
-                            logging.info(f"street_indices[{street_name}] = {street_indices[street_name]}, type = {type(street_indices[street_name])}")
-                            sorted_indices = sorted(list(street_indices[street_name]))
-
-                            first_index_chars = list(sorted_indices[0])
-
-                            number_parts = []
-                            for idx in sorted_indices:
-                                for i, char in enumerate(idx):
-                                    if char.isdigit():
-                                        number_part = idx[i:]  
-                                        number_parts.append(number_part)
-                                        break
-                                else:
-                                    number_parts.append(idx)
-
-                            prefix_end = 0
-                            for i, char in enumerate(first_index_chars):
-                                if char.isdigit():
-                                    prefix_end = i
-                                    break
-
-                            prefix = ''.join(first_index_chars[:prefix_end])
-
-                            if all(idx.startswith(prefix) for idx in sorted_indices):
-                                numbers = [idx[len(prefix):] for idx in sorted_indices]
-                                
-                                if len(numbers) == 1:
-                                    final_index = f"{prefix}{numbers[0]}"
-                                else:
-                                    final_index = f"{prefix}{numbers[0]}, {', '.join(numbers[1:])}"
-
-                            elif len(number_parts) >= 2:
-                                number_to_prefixes = {}
-                                for idx, num_part in zip(sorted_indices, number_parts):
-                                    if num_part not in number_to_prefixes:
-                                        number_to_prefixes[num_part] = []
-                                    
-                                    prefix_chars = []
-                                    for char in idx:
-                                        if char.isdigit():
-                                            break
-                                        if char != '-':
-                                            prefix_chars.append(char)
-                                    prefix_str = ''.join(prefix_chars)
-                                    
-                                    number_to_prefixes[num_part].append(prefix_str)
-                                
-                                result_parts = []
-                                for num_part, prefixes in number_to_prefixes.items():
-                                    if len(prefixes) == 1:
-                                        result_parts.append(f"{prefixes[0]}-{num_part}")
-                                    else:
-                                        prefixes_str = ', '.join(prefixes)
-                                        result_parts.append(f"{prefixes_str}-{num_part}")
-                                
-                                final_index = "; ".join(result_parts)
-                            else:
-                                final_index = nomenclatural_indices[idx]
-                        else:
-                            final_index = nomenclatural_indices[idx]
-                    else:
-                        final_index = nomenclatural_indices[idx]
-                    
-                    final_indices.append(final_index)
-                    logging.info('indices calculation passed')
-                
-                except Exception as e:
-                    logging.error(f"Error in second pass at row {idx}: {e}")
-                    final_indices.append(nomenclatural_indices[idx])
-
-            result_df = pd.DataFrame()
-
-            status_list = []
-            for idx in range(len(df)):
-                logging.info(f'{idx} is unique')  
-                street_name = str(df.iloc[idx][self.street_col]).strip()
-                if street_name and street_name in street_occurrences and street_occurrences[street_name] > 1:
-                    status_list.append("Повторяется")
+            # Сводный индекс и статус считаются один раз на улицу, а не на каждую строку
+            street_final = {}
+            repeated = set()
+            if self.street_col:
+                logging.info(f"Compressing indices of {len(street_indices)} streets")
+                street_final = {street_id: compress_indices(indices) for street_id, indices in street_indices.items()}
+                repeated = {street_id for street_id, count in street_occurrences.items()
+                            if count > 1 and street_names[street_id].strip()}
+
+            level_columns = self._hierarchy_columns(x_values, y_values, sheet_ids,
+                                                    street_ids if self.street_col else None)
+            # Исходная таблица дальше не нужна, память под неё освобождается до сортировки
+            df = raw_x = raw_y = projected = x_values = y_values = None
+            dedup_columns = ['Форматированная улица', 'Номенклатурный индекс']
+            if not self.street_col:
+                # Без улиц коды уровней свои у каждой точки, иначе от квадрата осталась бы одна часть
+                dedup_columns += list(level_columns)
+            sorter = ExternalSorter('Форматированная улица', dedup_columns, memory_budget=self.memory_budget)
+            sheet_rows = []
+            for start in range(0, total_rows, self.chunk_size):
+                if self.is_cancelled():
+                    self._save_checkpoint(fingerprint, total_rows, nomenclatural_indices, formatted_streets,
+                                          sheet_ids, street_indices, street_occurrences)
+                    raise JobCancelled()
+
+                stop = min(start + self.chunk_size, total_rows)
+                if self.street_col:
+                    chunk_ids = street_ids[start:stop]
+                    final_indices = [street_final.get(street_id, index) for street_id, index
+                                     in zip(chunk_ids, nomenclatural_indices[start:stop])]
+                    status = ["Повторяется" if street_id in repeated else 'Уникальное' for street_id in chunk_ids]
                 else:
-                    status_list.append('Уникальное')   
-            
-            result_df['Номенклатурный индекс'] = final_indices
-            result_df['Лист карты'] = list_numbers
-            result_df['Форматированная улица'] = formatted_streets
-            result_df['Статус уникальности'] = status_list
+                    final_indices = nomenclatural_indices[start:stop]
+                    status = ['Уникальное'] * (stop - start)
+
+                chunk = {
+                    'Номенклатурный индекс': final_indices,
+                    'Лист карты': self.indexer.sheet_layout.to_categorical(sheet_ids[start:stop]),
+                    'Форматированная улица': formatted_streets[start:stop],
+                    'Статус уникальности': status,
+                }
+                for name, values in level_columns.items():
+                    chunk[name] = values[start:stop]
+                chunk = pd.DataFrame(chunk, index=pd.RangeIndex(start, stop))
+                sheet_rows.append(chunk[list(SHEET_KEY_COLUMNS)].drop_duplicates())
+                sorter.add(chunk)
+
+            nomenclatural_indices = formatted_streets = final_indices = None
+            if sheet_rows:
+                self.sheet_rows = pd.concat(sheet_rows, ignore_index=True).drop_duplicates(ignore_index=True)
 
-            self.df_result = result_df
-            result_df.drop_duplicates(subset=['Форматированная улица', 'Номенклатурный индекс'], inplace=True, keep='first')
-            result_df.sort_values(by = 'Форматированная улица', inplace=True)
-            self.finished_processing.emit(result_df)
+            if self.result_path:
+                rows = sorter.write_parquet(self.result_path)
+                logging.info(f"Result of {rows} rows written to {self.result_path}")
+                result = self.result_path
+            else:
+                result = self.df_result = sorter.result()
+            remove_checkpoint(self.checkpoint_path)
+            return result
 
-        except Exception as e:
+        except JobCancelled:
+            logging.info('Processing cancelled')
+            raise
+        except Exception:
             logging.critical('Exception raised')
-            self.error_occurred.emit(str(e))
\ No newline at end of file
+            raise
\ No newline at end of file
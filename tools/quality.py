@@ -0,0 +1,154 @@
+import logging
+import numpy as np
+import pandas as pd
+
+from typing import Dict, List, Optional
+
+from tools.ingestion import TableReader
+from tools.jobs import Job
+
+# Флаги строк: битовая маска, у строки может быть несколько замечаний
+FLAG_MISSING = 1
+FLAG_UNPARSEABLE = 2
+FLAG_WRAPPED_COLUMN = 4
+FLAG_NEGATIVE_ROW = 8
+FLAG_OUT_OF_EXTENT = 16
+FLAG_DUPLICATE = 32
+FLAG_NOT_TRANSFORMED = 64
+
+FLAG_LABELS = {
+    FLAG_MISSING: "Нет координаты",
+    FLAG_UNPARSEABLE: "Координата не является числом",
+    FLAG_WRAPPED_COLUMN: "Столбец вне диапазона букв (буква повторится по кругу)",
+    FLAG_NEGATIVE_ROW: "Отрицательный номер строки (точка южнее начала координат)",
+    FLAG_OUT_OF_EXTENT: "Точка за пределами раскладки листов",
+    FLAG_DUPLICATE: "Повтор координат",
+    FLAG_NOT_TRANSFORMED: "Не удалось пересчитать в систему координат индексации",
+}
+
+
+class QualityReport:
+    """Итоги предварительной проверки: флаги каждой строки и сводка по ним."""
+
+    def __init__(self, flags: np.ndarray, x_raw, y_raw):
+        self.flags = flags
+        # Значения из файла для списка замечаний
+        self.x_raw = x_raw
+        self.y_raw = y_raw
+
+    @property
+    def total(self) -> int:
+        return len(self.flags)
+
+    @property
+    def flagged_count(self) -> int:
+        return int(np.count_nonzero(self.flags))
+
+    def counts(self) -> Dict[int, int]:
+        return {flag: int(np.count_nonzero(self.flags & flag)) for flag in FLAG_LABELS}
+
+    def summary(self) -> List[str]:
+        lines = [f"Строк: {self.total}, с замечаниями: {self.flagged_count}"]
+        lines += [f"{FLAG_LABELS[flag]}: {count}" for flag, count in self.counts().items() if count]
+        return lines
+
+    def describe(self, flags: int) -> str:
+        return '; '.join(label for flag, label in FLAG_LABELS.items() if flags & flag)
+
+    def flagged_rows(self) -> pd.DataFrame:
+        """Строки с замечаниями; номер строки файла считается с учётом заголовка."""
+        positions = np.flatnonzero(self.flags)
+        labels = {value: self.describe(value) for value in np.unique(self.flags[positions]).tolist()}
+        return pd.DataFrame({
+            'Строка файла': positions + 2,
+            'X': np.asarray(self.x_raw, dtype=object)[positions],
+            'Y': np.asarray(self.y_raw, dtype=object)[positions],
+            'Замечания': [labels[value] for value in self.flags[positions].tolist()],
+        })
+
+
+def parse_coordinates(values):
+    """Числовые координаты и маски пропусков и нераспознанных значений."""
+    series = pd.Series(values)
+    numbers = pd.to_numeric(series, errors='coerce').to_numpy(dtype=float)
+    if series.dtype == object:
+        missing = (series.isna() | (series.astype(str).str.strip() == '')).to_numpy()
+    else:
+        missing = series.isna().to_numpy()
+    unparseable = ~np.isfinite(numbers) & ~missing
+    return numbers, missing, unparseable
+
+
+def scan_coordinates(indexer, x, y, projected=None) -> QualityReport:
+    """Векторная проверка координат перед обработкой.
+
+    Находит пропуски и нечисловые значения, столбцы за пределами набора
+    букв (calculate_nomenclatural_index берёт номер буквы по модулю),
+    отрицательные номера строк, точки вне раскладки листов и повторы координат.
+    projected - пересчитанные в СК индексации (x, y), если файл в другой СК."""
+    if indexer.origin_x is None or indexer.origin_y is None:
+        raise ValueError("Начало координат не установлено!")
+
+    x_values, x_missing, x_bad = parse_coordinates(x)
+    y_values, y_missing, y_bad = parse_coordinates(y)
+    flags = np.zeros(len(x_values), dtype=np.uint8)
+    flags[x_missing | y_missing] |= FLAG_MISSING
+    flags[x_bad | y_bad] |= FLAG_UNPARSEABLE
+
+    parsed = np.isfinite(x_values) & np.isfinite(y_values)
+    if projected is not None:
+        x_values = pd.to_numeric(pd.Series(projected[0]), errors='coerce').to_numpy(dtype=float)
+        y_values = pd.to_numeric(pd.Series(projected[1]), errors='coerce').to_numpy(dtype=float)
+    valid = np.isfinite(x_values) & np.isfinite(y_values)
+    flags[parsed & ~valid] |= FLAG_NOT_TRANSFORMED
+    col_index, row_index = indexer.calculate_cells(np.where(valid, x_values, indexer.origin_x),
+                                                   np.where(valid, y_values, indexer.origin_y))
+    layout = indexer.sheet_layout
+    wrapped = (col_index < 0) | (col_index >= len(indexer.letters))
+    negative_row = row_index < 0
+    outside = ((col_index < 0) | (col_index >= layout.sheet_cols * layout.cell_cols) |
+               negative_row | (row_index >= layout.sheet_rows * layout.cell_rows))
+    flags[valid & wrapped] |= FLAG_WRAPPED_COLUMN
+    flags[valid & negative_row] |= FLAG_NEGATIVE_ROW
+    flags[valid & outside] |= FLAG_OUT_OF_EXTENT
+
+    points = pd.DataFrame({'x': x_values[valid], 'y': y_values[valid]})
+    duplicate = np.zeros(len(flags), dtype=bool)
+    duplicate[np.flatnonzero(valid)[points.duplicated(keep='first').to_numpy()]] = True
+    flags[duplicate] |= FLAG_DUPLICATE
+
+    return QualityReport(flags, np.asarray(x, dtype=object), np.asarray(y, dtype=object))
+
+
+class QualityScanJob(Job):
+    """Предварительная проверка файла в пуле фоновых задач.
+    Читаются те же столбцы, что и при обработке, так что кэш Parquet
+    прочитанной книги Excel переиспользуется при последующем запуске."""
+
+    def __init__(self, indexer, file_path: str, x_col: str, y_col: str, street_col: Optional[str] = None,
+                 transform_stage=None, reader: Optional[TableReader] = None, priority: int = 1):
+        super().__init__("Проверка данных", priority)
+        # Настройки фиксируются при постановке задачи в очередь
+        self.indexer = indexer.copy()
+        self.file_path = file_path
+        self.x_col = x_col
+        self.y_col = y_col
+        self.street_col = street_col
+        self.transform_stage = transform_stage
+        self.reader = reader or TableReader()
+
+    def execute(self):
+        crs_col = self.transform_stage.crs_col if self.transform_stage is not None else None
+        df = self.reader.read(self.file_path, columns=[self.x_col, self.y_col, self.street_col, crs_col])
+        if self.x_col not in df.columns or self.y_col not in df.columns:
+            raise ValueError(f"Столбцы '{self.x_col}' и/или '{self.y_col}' не найдены в файле")
+        self.check_cancelled()
+
+        projected = None
+        if self.transform_stage is not None:
+            transformed = self.transform_stage.apply(df, self.x_col, self.y_col)
+            projected = (transformed[self.x_col].to_numpy(), transformed[self.y_col].to_numpy())
+
+        report = scan_coordinates(self.indexer, df[self.x_col], df[self.y_col], projected)
+        logging.info(f"Quality scan: {report.flagged_count} of {report.total} rows flagged")
+        return report
@@ -0,0 +1,215 @@
+import logging
+import numpy as np
+import pandas as pd
+
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple, Union
+
+from tools.streets import canonicalize_street
+from tools.ingestion import TableReader
+from tools.jobs import Job
+
+STREET_COLUMN = 'Форматированная улица'
+INDEX_COLUMN = 'Номенклатурный индекс'
+SHEET_COLUMN = 'Лист карты'
+STATUS_COLUMN = 'Статус уникальности'
+RESULT_COLUMNS = [INDEX_COLUMN, SHEET_COLUMN, STREET_COLUMN, STATUS_COLUMN]
+
+ERROR_LABEL = 'Ошибка'
+
+ADDED = "Добавлена"
+REMOVED = "Удалена"
+CHANGED = "Изменена"
+
+
+def expand_cells(index_text: str) -> FrozenSet[str]:
+    """Квадраты из сжатой записи индекса улицы.
+
+    Понимает обе записи второго прохода обработки: 'А-1, 2, 5' (одна буква,
+    несколько номеров) и 'Б, В-1; Л-13' (группы букв с общим номером)."""
+    cells = set()
+    for part in str(index_text).split(';'):
+        if '-' not in part:
+            continue
+        letters, numbers = part.split('-', 1)
+        for letter in letters.split(','):
+            for number in numbers.split(','):
+                if letter.strip() and number.strip():
+                    cells.add(f"{letter.strip()}-{number.strip()}")
+    return frozenset(cells)
+
+
+def street_key(street: str) -> str:
+    """Канонический ключ улицы: тип и слова имени без учёта регистра, точек и порядка."""
+    street_type, name = canonicalize_street(str(street))
+    return f"{street_type} {' '.join(sorted(name.split()))}".strip()
+
+
+class StreetRecord(NamedTuple):
+    name: str
+    cells: FrozenSet[str]
+    sheets: FrozenSet[str]
+    status: str
+
+    def merge(self, other: 'StreetRecord') -> 'StreetRecord':
+        return self._replace(cells=self.cells | other.cells, sheets=self.sheets | other.sheets)
+
+
+def _group_sets(group_codes: np.ndarray, value_codes: np.ndarray, values: List[FrozenSet[str]],
+                group_count: int) -> List[FrozenSet[str]]:
+    """Объединение множеств values[value_code] по группам; каждая пара
+    (группа, значение) учитывается один раз."""
+    width = len(values) + 1
+    pairs = np.unique(group_codes.astype(np.int64) * width + value_codes)
+    groups, value_ids = pairs // width, (pairs % width).tolist()
+    bounds = np.searchsorted(groups, np.arange(group_count + 1)).tolist()
+
+    result = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if end - start == 1:
+            result.append(values[value_ids[start]])
+        else:
+            result.append(frozenset().union(*(values[value_id] for value_id in value_ids[start:end])))
+    return result
+
+
+def summarize_result(df: pd.DataFrame) -> Dict[str, StreetRecord]:
+    """Сводка результата по названиям улиц: квадраты, листы и статус уникальности.
+
+    Квадраты разбираются один раз на уникальную запись индекса,
+    группировка по улицам идёт по целочисленным кодам."""
+    missing = [column for column in RESULT_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"В результате нет столбцов: {', '.join(missing)}")
+
+    streets = df[STREET_COLUMN].astype(str).str.strip()
+    valid = (streets != ERROR_LABEL).to_numpy()
+    street_codes, names = pd.factorize(streets[valid])
+    index_codes, indices = pd.factorize(df[INDEX_COLUMN].astype(str)[valid])
+    sheet_codes, sheets = pd.factorize(df[SHEET_COLUMN].astype(str)[valid])
+    statuses = df[STATUS_COLUMN].astype(str)[valid].to_numpy()
+
+    cell_sets = [expand_cells(index) for index in indices.tolist()]
+    sheet_sets = [frozenset() if sheet == ERROR_LABEL else frozenset([sheet]) for sheet in sheets.tolist()]
+    _, first_rows = np.unique(street_codes, return_index=True)
+
+    records = zip(names.tolist(), _group_sets(street_codes, index_codes, cell_sets, len(names)),
+                  _group_sets(street_codes, sheet_codes, sheet_sets, len(names)), statuses[first_rows].tolist())
+    return {name: StreetRecord(name, cells, sheets, status) for name, cells, sheets, status in records}
+
+
+def by_street_key(records: Dict[str, StreetRecord]) -> Dict[str, StreetRecord]:
+    """Записи по каноническому ключу; варианты написания одной улицы объединяются."""
+    keyed: Dict[str, StreetRecord] = {}
+    for name, record in records.items():
+        key = street_key(name)
+        keyed[key] = keyed[key].merge(record) if key in keyed else record
+    return keyed
+
+
+def _join_cells(cells) -> str:
+    # Квадраты по буквам, внутри буквы - по номеру
+    return ', '.join(sorted(cells, key=lambda cell: (cell.split('-', 1)[0], len(cell), cell)))
+
+
+def _join(values) -> str:
+    return ', '.join(sorted(values))
+
+
+def join_results(old_records: Dict[str, StreetRecord],
+                 new_records: Dict[str, StreetRecord]) -> Tuple[Dict[str, StreetRecord], Dict[str, StreetRecord]]:
+    """Сопоставление улиц двух результатов через словари (hash join).
+
+    Сначала по точному названию; канонический ключ вычисляется только для
+    оставшихся без пары названий (например, при смене оформления)."""
+    old_only = {name: record for name, record in old_records.items() if name not in new_records}
+    new_only = {name: record for name, record in new_records.items() if name not in old_records}
+
+    old_joined = {name: record for name, record in old_records.items() if name in new_records}
+    new_joined = {name: record for name, record in new_records.items() if name in old_records}
+    old_joined.update(by_street_key(old_only))
+    new_joined.update(by_street_key(new_only))
+    return old_joined, new_joined
+
+
+def diff_results(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """Отчёт об изменениях между двумя результатами обработки: только
+    добавленные, удалённые и изменённые улицы."""
+    old_records, new_records = join_results(summarize_result(old), summarize_result(new))
+
+    rows = []
+    for key, record in new_records.items():
+        previous = old_records.get(key)
+        if previous is None:
+            rows.append({'Изменение': ADDED, 'Улица': record.name,
+                         'Добавлены квадраты': _join_cells(record.cells),
+                         'Листы стало': _join(record.sheets), 'Статус стало': record.status})
+            continue
+
+        added_cells = record.cells - previous.cells
+        removed_cells = previous.cells - record.cells
+        sheets_changed = record.sheets != previous.sheets
+        status_changed = record.status != previous.status
+        if not (added_cells or removed_cells or sheets_changed or status_changed):
+            continue
+        row = {'Изменение': CHANGED, 'Улица': record.name,
+               'Добавлены квадраты': _join_cells(added_cells), 'Удалены квадраты': _join_cells(removed_cells)}
+        if sheets_changed:
+            row['Листы было'] = _join(previous.sheets)
+            row['Листы стало'] = _join(record.sheets)
+        if status_changed:
+            row['Статус было'] = previous.status
+            row['Статус стало'] = record.status
+        rows.append(row)
+
+    for key, record in old_records.items():
+        if key not in new_records:
+            rows.append({'Изменение': REMOVED, 'Улица': record.name,
+                         'Удалены квадраты': _join_cells(record.cells),
+                         'Листы было': _join(record.sheets), 'Статус было': record.status})
+
+    columns = ['Изменение', 'Улица', 'Добавлены квадраты', 'Удалены квадраты',
+               'Листы было', 'Листы стало', 'Статус было', 'Статус стало']
+    report = pd.DataFrame(rows, columns=columns).fillna('')
+    report['Изменение'] = pd.Categorical(report['Изменение'], categories=[ADDED, REMOVED, CHANGED], ordered=True)
+    report = report.sort_values(['Изменение', 'Улица'], kind='mergesort')
+    logging.info(f"Result diff: {len(old_records)} -> {len(new_records)} streets, {len(report)} changes")
+    return report.reset_index(drop=True)
+
+
+def diff_summary(report: pd.DataFrame) -> Dict[str, int]:
+    counts = report['Изменение'].value_counts()
+    return {kind: int(counts.get(kind, 0)) for kind in (ADDED, REMOVED, CHANGED)}
+
+
+class ResultDiffJob(Job):
+    """Сравнение двух результатов обработки в пуле фоновых задач.
+    Результаты - таблицы или пути к выгрузкам (xlsx, csv, parquet)."""
+
+    def __init__(self, old: Union[str, pd.DataFrame], new: Union[str, pd.DataFrame],
+                 output_path: str, reader: Optional[TableReader] = None, priority: int = 0):
+        super().__init__("Сравнение результатов", priority)
+        self.old = old
+        self.new = new
+        self.output_path = output_path
+        self.reader = reader or TableReader()
+
+    def _load(self, source) -> pd.DataFrame:
+        if isinstance(source, pd.DataFrame):
+            return source
+        return self.reader.read(source, columns=RESULT_COLUMNS)
+
+    def execute(self):
+        old = self._load(self.old)
+        self.check_cancelled()
+        new = self._load(self.new)
+        self.check_cancelled()
+        self.report_progress(50)
+
+        report = diff_results(old, new)
+        self.check_cancelled()
+        if self.output_path.endswith('.csv'):
+            report.to_csv(self.output_path, index=False, sep=';', encoding='utf-8-sig')
+        else:
+            report.to_excel(self.output_path, index=False)
+        self.report_progress(100)
+        return diff_summary(report)
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+from typing import List, Optional, Sequence
+
+
+class SheetLayout:
+    """Раскладка листов карты: сетка из sheet_rows x sheet_cols листов,
+    каждый лист покрывает cell_rows x cell_cols номенклатурных квадратов."""
+
+    def __init__(self, sheet_rows: int = 2, sheet_cols: int = 2,
+                 cell_rows: int = 9, cell_cols: int = 9,
+                 numbering: str = 'column', name_template: str = 'Лист {}',
+                 start_number: int = 1, names: Optional[Sequence[str]] = None,
+                 clamp: bool = True, error_label: str = 'Ошибка'):
+        if sheet_rows < 1 or sheet_cols < 1 or cell_rows < 1 or cell_cols < 1:
+            raise ValueError("Размеры раскладки листов должны быть положительными")
+        if numbering not in ('column', 'row'):
+            raise ValueError(f"Неизвестная схема нумерации листов: {numbering}")
+
+        self.sheet_rows = sheet_rows
+        self.sheet_cols = sheet_cols
+        self.cell_rows = cell_rows
+        self.cell_cols = cell_cols
+        self.numbering = numbering
+        # clamp=True относит точки за краем сетки к крайним листам (как раньше),
+        # иначе такие точки получают id = -1
+        self.clamp = clamp
+        self.error_label = error_label
+
+        if names is None:
+            names = [name_template.format(start_number + i) for i in range(self.sheet_count)]
+        names = list(names)
+        if len(names) != self.sheet_count:
+            raise ValueError(f"Ожидалось {self.sheet_count} названий листов, получено {len(names)}")
+        if len(set(names)) != len(names) or error_label in names:
+            raise ValueError("Названия листов должны быть уникальными")
+        self.names: List[str] = names
+
+    def copy(self) -> 'SheetLayout':
+        return SheetLayout(self.sheet_rows, self.sheet_cols, self.cell_rows, self.cell_cols,
+                           numbering=self.numbering, names=self.names,
+                           clamp=self.clamp, error_label=self.error_label)
+
+    def signature(self) -> tuple:
+        """Параметры, от которых зависят номера листов (для отпечатка контрольной точки)."""
+        return ('SheetLayout', self.sheet_rows, self.sheet_cols, self.cell_rows, self.cell_cols,
+                self.numbering, tuple(self.names), self.clamp, self.error_label)
+
+    @property
+    def sheet_count(self) -> int:
+        return self.sheet_rows * self.sheet_cols
+
+    def sheet_ids(self, col_index, row_index) -> np.ndarray:
+        """Номера листов (0..sheet_count-1) для массивов индексов квадратов."""
+        col_index = np.asarray(col_index, dtype=np.int64)
+        row_index = np.asarray(row_index, dtype=np.int64)
+
+        sheet_row = np.floor_divide(row_index, self.cell_rows)
+        sheet_col = np.floor_divide(col_index, self.cell_cols)
+
+        if self.clamp:
+            sheet_row = np.clip(sheet_row, 0, self.sheet_rows - 1)
+            sheet_col = np.clip(sheet_col, 0, self.sheet_cols - 1)
+            outside = None
+        else:
+            outside = ((sheet_row < 0) | (sheet_row >= self.sheet_rows) |
+                       (sheet_col < 0) | (sheet_col >= self.sheet_cols))
+
+        if self.numbering == 'column':
+            ids = sheet_col * self.sheet_rows + sheet_row
+        else:
+            ids = sheet_row * self.sheet_cols + sheet_col
+
+        if outside is not None:
+            ids = np.where(outside, -1, ids)
+        return ids
+
+    def sheet_name(self, sheet_id: int) -> str:
+        if sheet_id < 0:
+            return self.error_label
+        return self.names[sheet_id]
+
+    def to_categorical(self, sheet_ids) -> pd.Categorical:
+        """Названия листов в виде категорий: группировка по листам
+        сводится к группировке по целочисленным кодам."""
+        codes = np.asarray(sheet_ids, dtype=np.int64)
+        codes = np.where(codes < 0, self.sheet_count, codes)
+        return pd.Categorical.from_codes(codes, categories=self.names + [self.error_label])
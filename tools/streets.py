@@ -0,0 +1,198 @@
+import re
+import numpy as np
+
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+STREET_TYPES = ['УЛ.', 'ПРОСП.', 'ПР.', 'ПЕР.', 'Ш.', 'НАБ.', 'Б-Р', 'БУЛЬВАР', 'ПЛ.', 'ПЛОЩАДЬ']
+
+# Полные и сокращённые написания типов улиц -> каноническое сокращение
+STREET_TYPE_ALIASES = {
+    'УЛ': 'УЛ.', 'УЛИЦА': 'УЛ.',
+    'ПРОСП': 'ПРОСП.', 'ПРОСПЕКТ': 'ПРОСП.', 'ПР-Т': 'ПРОСП.',
+    'ПР': 'ПР.', 'ПРОЕЗД': 'ПР.',
+    'ПЕР': 'ПЕР.', 'ПЕРЕУЛОК': 'ПЕР.',
+    'Ш': 'Ш.', 'ШОССЕ': 'Ш.',
+    'НАБ': 'НАБ.', 'НАБЕРЕЖНАЯ': 'НАБ.',
+    'Б-Р': 'Б-Р', 'БУЛЬВАР': 'Б-Р',
+    'ПЛ': 'ПЛ.', 'ПЛОЩАДЬ': 'ПЛ.',
+}
+
+
+def canonical_street_type(token: str) -> str:
+    """Каноническое сокращение типа улицы или пустая строка."""
+    return STREET_TYPE_ALIASES.get(token.upper().rstrip('.'), '')
+
+
+def canonicalize_street(street_name: str) -> Tuple[str, str]:
+    """Разбор названия на (тип, имя) без учёта регистра, пробелов, точек и порядка."""
+    name = street_name.upper().replace('Ё', 'Е').replace(',', ' ')
+    name = re.sub(r'\.(?=\S)', '. ', name)
+
+    street_type = ''
+    words = []
+    for token in name.split():
+        token_type = canonical_street_type(token)
+        if token_type and not street_type:
+            street_type = token_type
+        elif not token_type or token_type != street_type:
+            words.append(token.rstrip('.'))
+
+    return street_type, ' '.join(words)
+
+
+def bounded_levenshtein(a: str, b: str, max_distance: int) -> int:
+    """Расстояние Левенштейна, если оно не больше max_distance, иначе max_distance + 1.
+
+    Общие начало и конец строк отбрасываются, по остатку считается только
+    полоса шириной 2*max_distance+1 вокруг диагонали."""
+    limit = max_distance + 1
+    if a == b:
+        return 0
+    if len(a) > len(b):
+        a, b = b, a
+    if len(b) - len(a) > max_distance:
+        return limit
+
+    start = 0
+    while start < len(a) and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+    if not a:
+        return len(b) if len(b) <= max_distance else limit
+
+    previous = [j if j <= max_distance else limit for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [limit] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        char_a = a[i - 1]
+        row_min = current[0]
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            value = previous[j - 1] + (char_a != b[j - 1])
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return limit
+        previous = current
+
+    return min(previous[len(b)], limit)
+
+
+class StreetResolver:
+    """Определение канонических улиц: нормализация названий и объединение
+    близких написаний (опечаток) по расстоянию Левенштейна.
+
+    Написания перебираются от частых к редким; написание присоединяется к
+    ближайшему уже найденному представителю на расстоянии <= max_distance
+    или само становится представителем. Цепочек через промежуточные
+    написания нет: диаметр группы не больше 2 * max_distance.
+
+    Кандидаты на сравнение отбираются по n-граммам с префиксной фильтрацией:
+    два имени на расстоянии <= d обязаны иметь общую n-грамму среди n*d+1
+    самых редких n-грамм каждого, поэтому попарное сравнение всех имён не нужно."""
+
+    def __init__(self, max_distance: int = 1, ngram_size: int = 3, min_length: int = 5):
+        self.max_distance = max_distance
+        self.ngram_size = ngram_size
+        # Короткие имена (номера, инициалы) объединяются только при точном совпадении
+        self.min_length = min_length
+
+    def signature(self) -> tuple:
+        """Параметры, от которых зависит результат (для отпечатка контрольной точки)."""
+        return ('StreetResolver', self.max_distance, self.ngram_size, self.min_length)
+
+    def _ngrams(self, text: str) -> frozenset:
+        pad = '#' * (self.ngram_size - 1)
+        padded = f"{pad}{text}{pad}"
+        return frozenset(padded[i:i + self.ngram_size] for i in range(len(padded) - self.ngram_size + 1))
+
+    def _cluster(self, keys: List[Tuple[str, str]], weights: Sequence[int]) -> List[int]:
+        """Номер ключа-представителя для каждого ключа; weights - частоты ключей."""
+        representatives = list(range(len(keys)))
+        if self.max_distance <= 0:
+            return representatives
+
+        grams = {i: self._ngrams(name) for i, (_, name) in enumerate(keys) if len(name) >= self.min_length}
+        # Номера в названиях ('1-Я ЛИНИЯ' и '2-Я ЛИНИЯ') должны совпадать точно
+        numbers = {i: re.findall(r'\d+', keys[i][1]) for i in grams}
+        frequency = Counter(g for gram_list in grams.values() for g in gram_list)
+        rank = {gram: position for position, gram in enumerate(sorted(frequency, key=lambda g: (frequency[g], g)))}
+        # Одна правка меняет не больше ngram_size n-грамм
+        lost_per_edit = self.ngram_size * self.max_distance
+        prefix_length = lost_per_edit + 1
+
+        # Частые написания первыми; при равной частоте - в порядке появления
+        order = sorted(grams, key=lambda i: -weights[i])
+        position = {i: pos for pos, i in enumerate(order)}
+        # Блоки по (тип, n-грамма, длина имени): кандидаты сразу в допустимом диапазоне длин
+        blocks = defaultdict(list)
+        for i in order:
+            street_type, name = keys[i]
+            gram_set = grams[i]
+            prefix = sorted(gram_set, key=rank.__getitem__)[:prefix_length]
+
+            candidates = set()
+            for length in range(len(name) - self.max_distance, len(name) + self.max_distance + 1):
+                for gram in prefix:
+                    candidates.update(blocks.get((street_type, gram, length), ()))
+
+            best, best_distance = None, self.max_distance
+            for j in candidates:
+                if numbers[i] != numbers[j]:
+                    continue
+                if len(gram_set & grams[j]) < max(len(gram_set), len(grams[j])) - lost_per_edit:
+                    continue
+                distance = bounded_levenshtein(name, keys[j][1], self.max_distance)
+                if distance > self.max_distance:
+                    continue
+                if best is None or distance < best_distance or (distance == best_distance
+                                                                and position[j] < position[best]):
+                    best, best_distance = j, distance
+
+            if best is None:
+                for gram in prefix:
+                    blocks[(street_type, gram, len(name))].append(i)
+            else:
+                representatives[i] = best
+
+        return representatives
+
+    def resolve(self, street_names: Iterable[str]) -> Tuple[np.ndarray, List[str]]:
+        """Возвращает id улицы для каждого названия и представительное
+        написание (самое частое) для каждого id."""
+        street_names = [str(name) for name in street_names]
+        raw_codes: Dict[str, int] = {}
+        raw_ids = np.empty(len(street_names), dtype=np.int64)
+        for pos, name in enumerate(street_names):
+            raw_ids[pos] = raw_codes.setdefault(name, len(raw_codes))
+        raw_names = list(raw_codes)
+        raw_counts = np.bincount(raw_ids, minlength=len(raw_names))
+
+        key_codes: Dict[Tuple[str, str], int] = {}
+        raw_to_key = np.array([key_codes.setdefault(canonicalize_street(name), len(key_codes))
+                               for name in raw_names], dtype=np.int64)
+        key_weights = np.bincount(raw_to_key, weights=raw_counts, minlength=len(key_codes))
+        roots = self._cluster(list(key_codes), key_weights.astype(np.int64).tolist())
+
+        roots, key_to_street = np.unique(np.asarray(roots, dtype=np.int64), return_inverse=True)
+        raw_to_street = key_to_street.reshape(-1)[raw_to_key]
+        street_ids = raw_to_street[raw_ids]
+
+        representatives = [''] * len(roots)
+        best_counts = [0] * len(roots)
+        for raw_id, street_id in enumerate(raw_to_street):
+            if raw_counts[raw_id] > best_counts[street_id]:
+                best_counts[street_id] = raw_counts[raw_id]
+                representatives[street_id] = raw_names[raw_id]
+
+        return street_ids, representatives
@@ -1,36 +1,62 @@
 import os
 import logging
-import queue
-import csv 
-import pandas as pd
-from docx import Document 
+import tempfile
 
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, 
                             QLabel, QLineEdit, QPushButton, QGroupBox, QProgressBar,
                             QFileDialog, QMessageBox, QTableWidget, QTableWidgetItem,
-                            QHeaderView, QTextEdit, QTabWidget, QCheckBox, QGridLayout)
+                            QHeaderView, QTextEdit, QTabWidget, QCheckBox, QGridLayout,
+                            QComboBox, QInputDialog)
 from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QFont
 
-from tools.nomenclatural import NomenclaturalStreetIndexer, ProcessingThread
-
-logging.basicConfig(level=logging.INFO, filename='logs.log', filemode='w')
+from tools.nomenclatural import NomenclaturalStreetIndexer, ProcessingJob
+from tools.crs import (CRS_REGISTRY, LOCAL_CRS_CODE, CoordinateTransformStage, GeographicCRS,
+                        local_crs_for_origin, register_crs)
+from tools.check_and_match import CheckAndMatchLogic, MatchJob
+from tools.jobs import JobScheduler
+from tools.inspection import inspect_workbook
+from tools.ingestion import SUPPORTED_FILTER
+from tools.hierarchy import parse_levels
+from tools.directories import DirectoryJob, result_head, write_table
+from tools.checkpoint import app_data_dir
+from tools.quality import QualityScanJob
+from tools.result_diff import ADDED, REMOVED, CHANGED, ResultDiffJob
+from tools.map_backend import MAP_FILTER, open_map_backend
 
 class ExcelProcessorApp(QWidget):
     """Виджет для обработки номенклатурных индексов (только Excel)"""
     
     progress_updated = pyqtSignal(int)
-    finished_processing = pyqtSignal(pd.DataFrame)
+    finished_processing = pyqtSignal(object)
     error_occurred = pyqtSignal(str)
     
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, scheduler=None):
         super().__init__(parent)
         self.indexer = NomenclaturalStreetIndexer(500)  # Ваш существующий класс
         self.file_path = None
-        self.current_df = None
-        self.processing_thread = None
+        # Результат последней обработки - Parquet-файл в каталоге приложения
+        self.current_result = None
+        self.result_files = []
+        self.workbook_info = None
+        self.owns_scheduler = scheduler is None
+        self.scheduler = scheduler or JobScheduler(parent=self)
+        self.jobs = {}
+        self.directory_jobs = {}
+        # Последний прогресс каждой задачи обработки и выгрузки
+        self.job_progress = {}
+        self.quality_jobs = {}
+        self.diff_jobs = {}
         
         self.init_ui()
+        self.connect_scheduler()
+
+    def connect_scheduler(self):
+        self.scheduler.job_progress.connect(self.on_job_progress)
+        self.scheduler.job_message.connect(self.on_job_message)
+        self.scheduler.job_finished.connect(self.on_job_finished)
+        self.scheduler.job_failed.connect(self.on_job_failed)
+        self.scheduler.job_cancelled.connect(self.on_job_cancelled)
         
     def init_ui(self):
         """Инициализация интерфейса только для Excel обработки"""
@@ -69,12 +95,32 @@ class ExcelProcessorApp(QWidget):
         
         settings_group = self.create_settings_group()
         layout.addWidget(settings_group)
+
+        crs_group = self.create_crs_group()
+        layout.addWidget(crs_group)
+
+        directories_group = self.create_directories_group()
+        layout.addWidget(directories_group)
         
         self.process_btn = QPushButton("Обработать файл")
         self.process_btn.setStyleSheet(self.get_process_button_style())
         self.process_btn.clicked.connect(self.process_file)
         self.process_btn.setEnabled(False)
         layout.addWidget(self.process_btn)
+
+        self.scan_btn = QPushButton("Проверить данные")
+        self.scan_btn.clicked.connect(self.scan_file)
+        self.scan_btn.setEnabled(False)
+        layout.addWidget(self.scan_btn)
+
+        self.resume_checkbox = QCheckBox("Продолжить с контрольной точки (если есть)")
+        self.resume_checkbox.setChecked(True)
+        layout.addWidget(self.resume_checkbox)
+
+        self.cancel_btn = QPushButton("Прервать обработку")
+        self.cancel_btn.clicked.connect(self.cancel_processing)
+        self.cancel_btn.setVisible(False)
+        layout.addWidget(self.cancel_btn)
         
         self.progress_bar = QProgressBar()
         self.progress_bar.setVisible(False)
@@ -107,7 +153,7 @@ class ExcelProcessorApp(QWidget):
         group = QGroupBox("Работа с файлом")
         layout = QVBoxLayout(group)
         
-        self.load_file_btn = QPushButton("Загрузить Excel файл")
+        self.load_file_btn = QPushButton("Загрузить файл (Excel, CSV, Parquet, Feather)")
         self.load_file_btn.clicked.connect(self.load_file)
         layout.addWidget(self.load_file_btn)
         
@@ -135,19 +181,138 @@ class ExcelProcessorApp(QWidget):
         self.street_entry = QLineEdit()
         self.street_entry.setText('SEM9')  
         layout.addWidget(self.street_entry)
+
+        layout.addWidget(QLabel('Деления уровней:'))
+        self.levels_entry = QLineEdit()
+        self.levels_entry.setPlaceholderText("например 2, 5")
+        layout.addWidget(self.levels_entry)
         
         return group
     
+    def create_crs_group(self):
+        group = QGroupBox("Система координат")
+        group_layout = QVBoxLayout(group)
+        layout = QHBoxLayout()
+        group_layout.addLayout(layout)
+
+        layout.addWidget(QLabel("Исходная:"))
+        self.source_crs_combo = QComboBox()
+        self.source_crs_combo.addItem("Без преобразования", None)
+        for code, crs in CRS_REGISTRY.items():
+            self.source_crs_combo.addItem(crs.name, code)
+        layout.addWidget(self.source_crs_combo)
+
+        layout.addWidget(QLabel("Индексации:"))
+        self.target_crs_combo = QComboBox()
+        for code, crs in CRS_REGISTRY.items():
+            self.target_crs_combo.addItem(crs.name, code)
+        self.target_crs_combo.addItem("Местная (от начала координат)", LOCAL_CRS_CODE)
+        layout.addWidget(self.target_crs_combo)
+
+        layout.addWidget(QLabel("Столбец СК:"))
+        self.crs_col_entry = QLineEdit()
+        self.crs_col_entry.setPlaceholderText("для файлов со смешанными СК")
+        layout.addWidget(self.crs_col_entry)
+
+        # Местная СК задаётся положением начала координат индексатора в базовой проекции
+        local_layout = QHBoxLayout()
+        group_layout.addLayout(local_layout)
+
+        local_layout.addWidget(QLabel("Местная СК, базовая:"))
+        self.local_base_combo = QComboBox()
+        for code, crs in CRS_REGISTRY.items():
+            if not isinstance(crs, GeographicCRS) and not code.startswith(LOCAL_CRS_CODE):
+                self.local_base_combo.addItem(crs.name, code)
+        local_layout.addWidget(self.local_base_combo)
+
+        local_layout.addWidget(QLabel("Начало в базовой X:"))
+        self.local_base_x_entry = QLineEdit()
+        local_layout.addWidget(self.local_base_x_entry)
+
+        local_layout.addWidget(QLabel("Y:"))
+        self.local_base_y_entry = QLineEdit()
+        local_layout.addWidget(self.local_base_y_entry)
+
+        local_layout.addWidget(QLabel("Поворот (°):"))
+        self.local_rotation_entry = QLineEdit()
+        self.local_rotation_entry.setPlaceholderText("0")
+        local_layout.addWidget(self.local_rotation_entry)
+
+        self.local_crs_widgets = [self.local_base_combo, self.local_base_x_entry,
+                                  self.local_base_y_entry, self.local_rotation_entry]
+        self.target_crs_combo.currentIndexChanged.connect(self.update_local_crs_controls)
+        self.update_local_crs_controls()
+
+        return group
+
+    def update_local_crs_controls(self):
+        is_local = self.target_crs_combo.currentData() == LOCAL_CRS_CODE
+        for widget in self.local_crs_widgets:
+            widget.setEnabled(is_local)
+
+    def create_directories_group(self):
+        group = QGroupBox("Справочники")
+        layout = QHBoxLayout(group)
+
+        self.split_sheets_checkbox = QCheckBox("Разбить по листам карты")
+        layout.addWidget(self.split_sheets_checkbox)
+
+        self.split_letters_checkbox = QCheckBox("и по первой букве улицы")
+        self.split_letters_checkbox.setEnabled(False)
+        self.split_sheets_checkbox.toggled.connect(self.split_letters_checkbox.setEnabled)
+        layout.addWidget(self.split_letters_checkbox)
+
+        layout.addWidget(QLabel("Форматы:"))
+        self.directory_formats_combo = QComboBox()
+        self.directory_formats_combo.addItem("Word и Excel", ('docx', 'xlsx'))
+        self.directory_formats_combo.addItem("Word", ('docx',))
+        self.directory_formats_combo.addItem("Excel", ('xlsx',))
+        layout.addWidget(self.directory_formats_combo)
+
+        self.diff_btn = QPushButton("Сравнить два результата")
+        self.diff_btn.clicked.connect(self.compare_results)
+        layout.addWidget(self.diff_btn)
+
+        return group
+
+    def create_transform_stage(self):
+        source_crs = self.source_crs_combo.currentData()
+        crs_col = self.crs_col_entry.text().strip() or None
+        if source_crs is None and crs_col is None:
+            return None
+
+        target_crs = self.target_crs_combo.currentData()
+        if target_crs == LOCAL_CRS_CODE:
+            target_crs = self.register_local_crs()
+        return CoordinateTransformStage(target_crs, source_crs, crs_col)
+
+    def register_local_crs(self):
+        """Местная СК от текущего начала координат индексатора"""
+        try:
+            base_x = float(self.local_base_x_entry.text())
+            base_y = float(self.local_base_y_entry.text())
+            rotation = float(self.local_rotation_entry.text() or 0)
+        except ValueError:
+            raise ValueError("Укажите положение начала координат в базовой СК и поворот числами")
+
+        crs = local_crs_for_origin(self.local_base_combo.currentData(), self.indexer.origin_x,
+                                   self.indexer.origin_y, base_x, base_y, rotation)
+        return register_crs(crs).code
+
     def create_instruction_group(self):
         group = QGroupBox("Инструкция")
         layout = QVBoxLayout(group)        
         instruction_text = QTextEdit()
         instruction_text.setPlainText("""1. Установите начало координат (X и Y)
-2. Загрузите Excel файл с координатами
+2. Загрузите файл с координатами (Excel, CSV, Parquet или Feather)
 3. Укажите названия столбцов с координатами (по умолчанию X и Y)
 4. Укажите название столбца с улицами (опционально)
-5. Нажмите 'Обработать файл'
-6. Выберите место для сохранения результата""")
+   Для дополнительных уровней укажите деления, например "2, 5" (500 м -> 250 м -> 50 м)
+5. Если координаты в другой системе, выберите исходную СК и СК индексации
+   (или столбец с кодом СК, например EPSG:4326, для смешанных файлов).
+   Для местной СК укажите базовую проекцию и положение в ней начала координат
+6. Нажмите 'Обработать файл'
+7. Выберите место для сохранения результата""")
         instruction_text.setReadOnly(True)
         layout.addWidget(instruction_text)
         
@@ -196,54 +361,243 @@ class ExcelProcessorApp(QWidget):
     def load_file(self):
         file_path, _ = QFileDialog.getOpenFileName(
             self,
-            "Выберите Excel файл",
+            "Выберите файл с координатами",
             "",
-            "Excel files (*.xlsx *.xls);;All files (*.*)"
+            SUPPORTED_FILTER
         )
         
         if file_path:
+            try:
+                info = inspect_workbook(file_path)
+            except Exception as e:
+                QMessageBox.critical(self, "Ошибка", f"Не удалось прочитать файл: {str(e)}")
+                self.update_status("Ошибка чтения файла", "red")
+                return
+
             self.file_path = file_path
-            self.file_label.setText(os.path.basename(file_path))
+            self.workbook_info = info
+            self.apply_column_suggestions(info)
+
+            rows_text = f"~{info.row_estimate} строк" if info.row_estimate is not None else "число строк неизвестно"
+            self.file_label.setText(f"{os.path.basename(file_path)} ({rows_text}, столбцы: {', '.join(info.columns)})")
             self.file_label.setStyleSheet("color: green;")
             self.process_btn.setEnabled(True)
-            self.update_status("Файл загружен, готов к обработке", "green")
+            self.scan_btn.setEnabled(True)
+
+            missing = self.get_missing_columns()
+            if missing:
+                self.update_status(f"Столбцы не найдены в файле: {', '.join(missing)}", "red")
+            else:
+                self.update_status("Файл загружен, готов к обработке", "green")
+
+    def apply_column_suggestions(self, info):
+        """Подставляет найденные столбцы, если введённые отсутствуют в файле"""
+        entries = {'x': self.x_col_entry, 'y': self.y_col_entry, 'street': self.street_entry}
+        for key, entry in entries.items():
+            suggestion = info.suggestions.get(key)
+            if suggestion and entry.text().strip() not in info.columns:
+                entry.setText(suggestion)
+
+    def get_missing_columns(self):
+        if self.workbook_info is None:
+            return []
+        columns = [self.x_col_entry.text().strip(), self.y_col_entry.text().strip(),
+                   self.street_entry.text().strip(), self.crs_col_entry.text().strip()]
+        return self.workbook_info.missing_columns(*columns)
     
-    def process_file(self):
+    def validate_processing_inputs(self):
         if not self.file_path:
             QMessageBox.critical(self, "Ошибка", "Сначала загрузите файл")
-            return
+            return False
             
         if self.indexer.origin_x is None or self.indexer.origin_y is None:
             QMessageBox.critical(self, "Ошибка", "Сначала установите начало координат")
+            return False
+        
+        missing = self.get_missing_columns()
+        if missing:
+            QMessageBox.critical(self, "Ошибка", f"Столбцы не найдены в файле: {', '.join(missing)}")
+            return False
+
+        return True
+
+    def scan_file(self):
+        if not self.validate_processing_inputs():
+            return
+
+        try:
+            transform_stage = self.create_transform_stage()
+        except ValueError as e:
+            QMessageBox.critical(self, "Ошибка", str(e))
+            return
+
+        job = QualityScanJob(self.indexer, self.file_path, self.x_col_entry.text().strip(),
+                             self.y_col_entry.text().strip(), self.street_entry.text().strip(),
+                             transform_stage)
+        self.quality_jobs[self.scheduler.submit(job)] = job
+        self.scan_btn.setEnabled(False)
+        self.update_status("Проверка данных...", "blue")
+
+    def on_quality_report(self, report):
+        self.scan_btn.setEnabled(True)
+        summary = '\n'.join(report.summary())
+        if not report.flagged_count:
+            QMessageBox.information(self, "Проверка данных", summary)
+            self.update_status("Проверка данных: замечаний нет", "green")
+            return
+
+        self.update_status(f"Проверка данных: строк с замечаниями - {report.flagged_count}", "orange")
+        answer = QMessageBox.question(self, "Проверка данных",
+                                      f"{summary}\n\nСохранить список строк с замечаниями?",
+                                      QMessageBox.Yes | QMessageBox.No)
+        if answer != QMessageBox.Yes:
+            return
+
+        output_path, _ = QFileDialog.getSaveFileName(self, "Сохранить замечания как", "",
+                                                     "Excel files (*.xlsx)")
+        if output_path:
+            if not output_path.endswith('.xlsx'):
+                output_path += '.xlsx'
+            try:
+                report.flagged_rows().to_excel(output_path, index=False)
+            except Exception as e:
+                QMessageBox.critical(self, "Ошибка", f"Ошибка при сохранении файла: {str(e)}")
+
+    def process_file(self):
+        if not self.validate_processing_inputs():
             return
         
         x_col = self.x_col_entry.text().strip()
         y_col = self.y_col_entry.text().strip()
         street_col = self.street_entry.text().strip() 
+        try:
+            transform_stage = self.create_transform_stage()
+        except ValueError as e:
+            QMessageBox.critical(self, "Ошибка", str(e))
+            return
+
+        try:
+            hierarchy_levels = parse_levels(self.levels_entry.text())
+        except ValueError:
+            QMessageBox.critical(self, "Ошибка", "Деления уровней задаются целыми числами от 2, через запятую")
+            return
         
-        # Создаем поток обработки
-        self.processing_thread = ProcessingThread(
-            self.indexer, self.file_path, x_col, y_col, street_col
+        # Ставим задачу в общую очередь, файлы можно добавлять, не дожидаясь завершения
+        job = ProcessingJob(
+            self.indexer, self.file_path, x_col, y_col, street_col, transform_stage,
+            resume=self.resume_checkbox.isChecked(), hierarchy_levels=hierarchy_levels,
+            result_path=self.new_result_path()
         )
-        self.processing_thread.progress_updated.connect(self.update_progress)
-        self.processing_thread.finished_processing.connect(self.on_processing_finished)
-        self.processing_thread.error_occurred.connect(self.on_processing_error)
+        job_id = self.scheduler.submit(job)
+        self.jobs[job_id] = job
         
-        self.progress_bar.setVisible(True)
-        self.progress_bar.setValue(0)
-        self.process_btn.setEnabled(False)
-        self.update_status("Обработка файла...", "blue")
-        
-        self.processing_thread.start()
+        self.update_job_controls()
+        self.update_status(f"Обработка файлов... (задач: {len(self.jobs)})", "blue")
+
+    def new_result_path(self):
+        """Файл для результата задачи: результат пишется на диск пачками, а не собирается в памяти."""
+        directory = os.path.join(app_data_dir(), 'results')
+        os.makedirs(directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix='.parquet', prefix='result_', dir=directory)
+        os.close(fd)
+        self.result_files.append(path)
+        return path
+
+    def remove_result_file(self, path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logging.error(f"Result file {path} not removed: {e}")
+        if path in self.result_files:
+            self.result_files.remove(path)
+
+    def update_job_controls(self):
+        active = set(self.jobs) | set(self.directory_jobs)
+        self.job_progress = {job_id: value for job_id, value in self.job_progress.items() if job_id in active}
+        has_jobs = bool(active)
+        self.progress_bar.setVisible(has_jobs)
+        self.cancel_btn.setVisible(has_jobs)
+        self.cancel_btn.setEnabled(has_jobs)
+        self.update_progress()
     
-    def update_progress(self, value):
+    def update_progress(self):
+        """Общий прогресс - среднее по всем выполняющимся задачам."""
+        active = list(self.jobs) + list(self.directory_jobs)
+        if not active:
+            return
+        value = sum(self.job_progress.get(job_id, 0) for job_id in active) // len(active)
+        self.progress_bar.setFormat(f"%p% (задач: {len(active)})" if len(active) > 1 else "%p%")
         self.progress_bar.setValue(value)
+
+    def on_job_progress(self, job_id, value):
+        if job_id in self.jobs or job_id in self.directory_jobs:
+            self.job_progress[job_id] = value
+            self.update_progress()
+
+    def on_job_message(self, job_id, msg_type, msg_data):
+        if msg_type == 'quality' and job_id in self.jobs:
+            self.update_status(f"Обработка файлов... {msg_data[0]}", "orange")
+
+    def on_job_finished(self, job_id, result):
+        if self.quality_jobs.pop(job_id, None) is not None:
+            self.on_quality_report(result)
+        elif job_id in self.diff_jobs:
+            self.on_diff_finished(self.diff_jobs.pop(job_id), result)
+        elif job_id in self.jobs:
+            job = self.jobs.pop(job_id)
+            self.update_job_controls()
+            self.on_processing_finished(result, job.sheet_rows)
+        elif self.directory_jobs.pop(job_id, None) is not None:
+            self.update_job_controls()
+            self.on_directories_finished(result)
+
+    def on_job_failed(self, job_id, error_message):
+        if self.quality_jobs.pop(job_id, None) is not None:
+            self.scan_btn.setEnabled(True)
+            QMessageBox.critical(self, "Ошибка", f"Ошибка проверки данных: {error_message}")
+            self.update_status("Ошибка проверки данных", "red")
+        elif self.diff_jobs.pop(job_id, None) is not None:
+            self.diff_btn.setEnabled(True)
+            QMessageBox.critical(self, "Ошибка", f"Ошибка сравнения результатов: {error_message}")
+            self.update_status("Ошибка сравнения результатов", "red")
+        elif job_id in self.jobs:
+            self.remove_result_file(self.jobs.pop(job_id).result_path)
+            self.update_job_controls()
+            self.on_processing_error(error_message)
+        elif self.directory_jobs.pop(job_id, None) is not None:
+            self.update_job_controls()
+            self.on_processing_error(error_message)
+
+    def on_job_cancelled(self, job_id):
+        if self.quality_jobs.pop(job_id, None) is not None:
+            self.scan_btn.setEnabled(True)
+        elif self.diff_jobs.pop(job_id, None) is not None:
+            self.diff_btn.setEnabled(True)
+        elif job_id in self.jobs:
+            self.remove_result_file(self.jobs.pop(job_id).result_path)
+            self.update_job_controls()
+            self.on_processing_cancelled()
+        elif self.directory_jobs.pop(job_id, None) is not None:
+            self.update_job_controls()
+            self.update_status("Формирование справочников прервано, готовые части отмечены в manifest.json", "orange")
+
+    def cancel_processing(self):
+        for job in list(self.jobs.values()) + list(self.directory_jobs.values()):
+            job.cancel()
+        if self.jobs or self.directory_jobs:
+            self.cancel_btn.setEnabled(False)
+            self.update_status("Прерывание обработки...", "orange")
+
+    def on_processing_cancelled(self):
+        self.update_status("Обработка прервана, прогресс сохранён в контрольной точке", "orange")
     
-    def on_processing_finished(self, df):
-        self.current_df = df
-        self.progress_bar.setVisible(False)
-        self.process_btn.setEnabled(True)
+    def on_processing_finished(self, result, sheet_rows=None):
+        self.current_result = result
         self.update_status("Обработка завершена", "green")
+
+        if self.split_sheets_checkbox.isChecked():
+            self.generate_directories(result, sheet_rows)
+            return
         
         output_path, selected_filter = QFileDialog.getSaveFileName(
             self,
@@ -263,53 +617,89 @@ class ExcelProcessorApp(QWidget):
                         base_path = output_path.rsplit('.', 1)[0] if '.' in output_path else output_path
                         output_path = base_path + '.docx'
                 
-                if output_path.endswith('.docx'):
-                    doc = Document()
-                    title = doc.add_heading('Обработанные данные улиц', 0)
-                    
-                    has_street = 'Форматированная улица' in df.columns
-                    has_index = 'Номенклатурный индекс' in df.columns
-                    
-                    if has_street and has_index:
-                        for _, row in df.iterrows():
-                            p = doc.add_paragraph()
-                            street = str(row['Форматированная улица'])
-                            index = str(row['Номенклатурный индекс'])
-                            
-                            p.add_run(street)
-                            p.add_run('\t')
-                            p.add_run(index).bold = True
-                    else:
-                        table = doc.add_table(rows=len(df)+1, cols=len(df.columns))
-                        table.style = 'Table Grid'
-                        
-                        for i, column in enumerate(df.columns):
-                            table.cell(0, i).text = str(column)
-                        
-                        for i, (idx, row) in enumerate(df.iterrows(), 1):
-                            for j, value in enumerate(row):
-                                table.cell(i, j).text = str(value)
-                    
-                    doc.save(output_path)
-                else:
-                    df.to_excel(output_path, index=False)
+                write_table(result, output_path)
 
                 QMessageBox.information(self, "Успех", f"Файл сохранен как:\n{output_path}")
                 self.update_status("Файл успешно обработан и сохранен", "green")
-                self.show_preview(df)
+                self.show_preview(result)
                 
             except Exception as e:
                 QMessageBox.critical(self, "Ошибка", f"Ошибка при сохранении файла: {str(e)}")
         else:
             self.update_status("Обработка отменена", "orange")
+
+    def generate_directories(self, result, sheet_rows=None):
+        output_dir = QFileDialog.getExistingDirectory(self, "Папка для справочников по листам")
+        if not output_dir:
+            self.update_status("Обработка завершена, справочники не сохранены", "orange")
+            return
+
+        # Части выгружаются в отдельных процессах, GUI остаётся свободным
+        job = DirectoryJob(result, output_dir, self.directory_formats_combo.currentData(),
+                           by_letter=self.split_letters_checkbox.isChecked(), sheet_rows=sheet_rows)
+        job_id = self.scheduler.submit(job)
+        self.directory_jobs[job_id] = job
+
+        self.update_job_controls()
+        self.update_status("Формирование справочников по листам...", "blue")
+        self.show_preview(result)
+
+    def on_directories_finished(self, manifest):
+        count = len(manifest['partitions'])
+        QMessageBox.information(self, "Успех", f"Сформировано справочников: {count}\n"
+                                                 f"Строк: {manifest['total_rows']}")
+        self.update_status(f"Справочники по листам сохранены ({count})", "green")
     
+    def choose_result_source(self, title):
+        """Результат для сравнения: текущий результат сеанса или файл выгрузки; None - отказ."""
+        current_item = "Текущий результат обработки"
+        file_item = "Результат из файла..."
+        if self.current_result is not None:
+            item, ok = QInputDialog.getItem(self, title, "Источник:", [current_item, file_item], 0, False)
+            if not ok:
+                return None
+            if item == current_item:
+                return self.current_result
+
+        path, _ = QFileDialog.getOpenFileName(self, title, "", SUPPORTED_FILTER)
+        return path or None
+
+    def compare_results(self):
+        # Обе стороны выбираются явно, текущий результат - лишь один из вариантов
+        old = self.choose_result_source("Результат предыдущего выпуска")
+        if old is None:
+            return
+        new = self.choose_result_source("Результат нового выпуска")
+        if new is None:
+            return
+
+        output_path, selected_filter = QFileDialog.getSaveFileName(
+            self, "Сохранить отчёт об изменениях как", "", "Excel files (*.xlsx);;CSV files (*.csv)")
+        if not output_path:
+            return
+        extension = '.csv' if selected_filter == "CSV files (*.csv)" else '.xlsx'
+        if not output_path.endswith(extension):
+            output_path += extension
+
+        job = ResultDiffJob(old, new, output_path)
+        self.diff_jobs[self.scheduler.submit(job)] = job
+        self.diff_btn.setEnabled(False)
+        self.update_status("Сравнение результатов...", "blue")
+
+    def on_diff_finished(self, job, summary):
+        self.diff_btn.setEnabled(True)
+        QMessageBox.information(self, "Сравнение результатов",
+                                f"Улиц добавлено: {summary[ADDED]}\n"
+                                f"Улиц удалено: {summary[REMOVED]}\n"
+                                f"Улиц изменено: {summary[CHANGED]}\n\n"
+                                f"Отчёт сохранён как:\n{job.output_path}")
+        self.update_status(f"Изменений улиц: {sum(summary.values())}", "green")
+
     def on_processing_error(self, error_message):
-        self.progress_bar.setVisible(False)
-        self.process_btn.setEnabled(True)
         QMessageBox.critical(self, "Ошибка", f"Произошла ошибка при обработке: {error_message}")
         self.update_status("Ошибка обработки", "red")
     
-    def show_preview(self, df):
+    def show_preview(self, result):
         for child in self.children():
             if isinstance(child, QTabWidget):
                 child.setCurrentIndex(1)
@@ -318,7 +708,9 @@ class ExcelProcessorApp(QWidget):
         self.preview_table.setVisible(True)
         self.preview_label.setVisible(False)
         
-        preview_rows = min(10, len(df))
+        # Из файла результата читаются только первые строки
+        df = result_head(result, 10)
+        preview_rows = len(df)
         self.preview_table.setRowCount(preview_rows)
         self.preview_table.setColumnCount(len(df.columns))
         self.preview_table.setHorizontalHeaderLabels(df.columns.tolist())
@@ -330,18 +722,34 @@ class ExcelProcessorApp(QWidget):
                 self.preview_table.setItem(i, j, item)
 
     def cleanup(self):
-        if self.processing_thread and self.processing_thread.isRunning():
-            self.processing_thread.terminate()
-            self.processing_thread.wait()
+        # Задачи сами сохранят контрольную точку на границе блока строк
+        for jobs in (self.jobs, self.directory_jobs, self.quality_jobs, self.diff_jobs):
+            for job in list(jobs.values()):
+                job.cancel()
+        if self.owns_scheduler:
+            self.scheduler.shutdown()
+        for path in list(self.result_files):
+            self.remove_result_file(path)
 
 class CheckAndMatch(QWidget):
-    def __init__(self, hmap, parent=None):
+    def __init__(self, hmap, parent=None, scheduler=None, backend=None):
         super().__init__(parent)
         self.hmap=hmap
         self.parent_app=parent
+        # Источник объектов (tools.map_backend.MapBackend)
+        self.backend = backend
+        self.logic = CheckAndMatchLogic()
+        self.owns_scheduler = scheduler is None
+        self.scheduler = scheduler or JobScheduler(parent=self)
+        self.job_id = None
 
         self.init_ui()
 
+        self.scheduler.job_message.connect(self.on_job_message)
+        self.scheduler.job_finished.connect(self.on_job_finished)
+        self.scheduler.job_failed.connect(self.on_job_failed)
+        self.scheduler.job_cancelled.connect(self.on_job_cancelled)
+
     def init_ui(self):
         """Инициализация интерфейса"""
         layout = QVBoxLayout(self)
@@ -354,6 +762,16 @@ class CheckAndMatch(QWidget):
         params_layout.setSpacing(8)
         
         row = 0
+        # Карта
+        params_layout.addWidget(QLabel("Карта:"), row, 0)
+        self.lbl_map = QLabel("Карта не открыта" if self.backend is None else "Карта подключена")
+        self.lbl_map.setStyleSheet("color: gray;" if self.backend is None else "color: black;")
+        params_layout.addWidget(self.lbl_map, row, 1)
+        self.btn_map = QPushButton("Открыть")
+        self.btn_map.clicked.connect(self.open_map)
+        params_layout.addWidget(self.btn_map, row, 2)
+        row += 1
+
         # Проверяемый слой
         params_layout.addWidget(QLabel("Проверяемый слой:"), row, 0)
         self.lbl_check = QLabel("Объект не выбран")
@@ -400,6 +818,13 @@ class CheckAndMatch(QWidget):
         self.entry_dist.setMaximumWidth(150)
         params_layout.addWidget(self.entry_dist, row, 1, 1, 2)
         row += 1
+
+        # Пороги для сравнения
+        params_layout.addWidget(QLabel("Сравнить пороги (м):"), row, 0)
+        self.entry_sweep = QLineEdit()
+        self.entry_sweep.setPlaceholderText("например 50, 100, 250, 500")
+        params_layout.addWidget(self.entry_sweep, row, 1, 1, 2)
+        row += 1
         
         # Чекбоксы
         self.cb_add_semantics = QCheckBox("Добавлять семантику 'Ошибка соответствия'")
@@ -485,16 +910,49 @@ class CheckAndMatch(QWidget):
         """Обновление параметра в логике"""
         self.logic.params[param_name] = value
         
+    def open_map(self):
+        """Открытие локальной карты (SQLite или GeoJSON) вместо карты ГИС"""
+        if self.job_id is not None:
+            QMessageBox.warning(self, "Ошибка", "Дождитесь завершения считки")
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "Открыть карту", "", MAP_FILTER)
+        if not path:
+            return
+        try:
+            backend = open_map_backend(path)
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось открыть карту: {str(e)}")
+            return
+
+        if self.backend is not None:
+            self.backend.close()
+        self.backend = backend
+        for param_name in ('check_layer', 'target_layer', 'check_sem', 'check_sem_name',
+                           'target_sem', 'target_sem_name'):
+            self.logic.params[param_name] = None
+        for label, text in ((self.lbl_check, "Объект не выбран"), (self.lbl_target, "Объект не выбран"),
+                            (self.lbl_sem_check, "Семантика не выбрана"),
+                            (self.lbl_sem_target, "Семантика не выбрана")):
+            label.setText(text)
+            label.setStyleSheet("color: gray;")
+
+        self.lbl_map.setText(os.path.basename(path))
+        self.lbl_map.setStyleSheet("color: black;")
+        self.info_text.append(f"Открыта карта: {path}")
+
     def pick_layer(self, param_name, label, title):
         """Выбор слоя из карты"""
+        if self.backend is None:
+            QMessageBox.warning(self, "Ошибка", "Сначала откройте карту")
+            return
         try:
-            # Вызов MapAPI для выбора слоя
-            # temp = mapapi.mapCreateObject(self.hmap)
-            # ... вызов диалога ...
-            # layer_key = полученный ключ
-            
-            # Заглушка для примера
-            layer_key = f"{title}_key_{param_name}"
+            layers = self.backend.layers()
+            if not layers:
+                QMessageBox.warning(self, "Ошибка", "В карте нет слоёв")
+                return
+            layer_key, ok = QInputDialog.getItem(self, title, "Слой:", layers, 0, False)
+            if not ok:
+                return
             
             self.logic.params[param_name] = layer_key
             label.setText(layer_key)
@@ -502,9 +960,39 @@ class CheckAndMatch(QWidget):
             self.info_text.append(f"Выбран слой: {layer_key}")
             
         except Exception as e:
-            self.logic.message_queue.put(("error", f"Ошибка выбора слоя: {str(e)}"))
+            QMessageBox.critical(self, "Ошибка", f"Ошибка выбора слоя: {str(e)}")
+
+    def pick_semantic(self, param_name, name_param, label):
+        """Выбор семантики из объектов выбранного слоя"""
+        layer_param = 'check_layer' if param_name == 'check_sem' else 'target_layer'
+        layer = self.logic.params[layer_param]
+        if self.backend is None or not layer:
+            QMessageBox.warning(self, "Ошибка", "Сначала выберите слой")
+            return
+        try:
+            semantics = self.backend.semantics(layer)
+            if not semantics:
+                QMessageBox.warning(self, "Ошибка", "У объектов слоя нет семантик")
+                return
+            items = [f"{code} - {name}" for code, name in semantics]
+            item, ok = QInputDialog.getItem(self, "Семантика", "Семантика:", items, 0, False)
+            if not ok:
+                return
+
+            code, name = semantics[items.index(item)]
+            self.logic.params[param_name] = code
+            self.logic.params[name_param] = name
+            label.setText(item)
+            label.setStyleSheet("color: black;")
+            self.info_text.append(f"Выбрана семантика: {item}")
+
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Ошибка выбора семантики: {str(e)}")
+
     def validate_inputs(self):
         """Проверка входных данных"""
+        if self.backend is None:
+            return False, "Откройте карту"
         if not self.logic.params['check_layer']:
             return False, "Выберите проверяемый слой"
         if not self.logic.params['target_layer']:
@@ -515,12 +1003,20 @@ class CheckAndMatch(QWidget):
             return False, "Выберите семантику целевого слоя"
         
         try:
-            dist = float(self.entry_dist.get())
+            dist = float(self.entry_dist.text())
             if dist <= 0:
                 return False, "Расстояние должно быть > 0"
             self.logic.params['max_dist'] = dist
         except ValueError:
             return False, "Введите корректное число для расстояния"
+
+        try:
+            thresholds = [float(part) for part in self.entry_sweep.text().replace(';', ',').split(',') if part.strip()]
+        except ValueError:
+            return False, "Пороги для сравнения задаются числами через запятую"
+        if any(value <= 0 for value in thresholds):
+            return False, "Пороги для сравнения должны быть > 0"
+        self.logic.params['sweep_thresholds'] = thresholds
             
         return True, ""
         
@@ -544,9 +1040,14 @@ class CheckAndMatch(QWidget):
             self.progress_bar.setVisible(True)
             self.progress_bar.setRange(0, 0)  # Индикатор без конца
             
-            # # Запускаем в фоновом потоке
-            # self.processing_thread = SemanticsCheckWorker(self.logic, self.hmap)
-            # self.processing_thread.start()
+            # Запускаем в общем пуле фоновых задач
+            self.job_id = self.scheduler.submit(MatchJob(self.logic, self.load_layers, backend=self.backend))
+
+    def load_layers(self, params):
+        """Чтение объектов проверяемого и целевого слоёв из карты"""
+        check_df = self.backend.read_objects(params['check_layer'], params['check_sem'])
+        target_df = self.backend.read_objects(params['target_layer'], params['target_sem'])
+        return check_df, target_df
             
     def get_confirmation_message(self):
         """Получить сообщение для подтверждения"""
@@ -561,10 +1062,17 @@ class CheckAndMatch(QWidget):
             f"Режим ближайшие соседи: {'ВКЛЮЧЕН' if self.logic.params['nearest_neighbor_mode'] else 'ОТКЛЮЧЕН'} {nearest_mode_desc}\n"
             f"Не учитывать точки в семантике: {'ВКЛЮЧЕНО' if self.logic.params['ignore_dot_semantics'] else 'ОТКЛЮЧЕНО'}\n"
             f"Максимальное расстояние: {self.logic.params['max_dist']} м\n"
+            f"{self.get_sweep_description()}"
             f"Добавление 'Ошибка соответствия': {'ВКЛЮЧЕНО' if self.logic.params['add_semantics_enabled'] else 'ОТКЛЮЧЕНО'}\n\n"
             f"Выполнить считку?"
         )
         
+    def get_sweep_description(self):
+        thresholds = self.logic.params['sweep_thresholds']
+        if not thresholds:
+            return ""
+        return f"Сравнение порогов: {', '.join(f'{value:g}' for value in thresholds)} м\n"
+
     def save_report(self):
         """Сохранение отчёта"""
         filename, _ = QFileDialog.getSaveFileName(
@@ -583,6 +1091,8 @@ class CheckAndMatch(QWidget):
                 
     def save_report_to_csv(self, filename):
         """Сохранение отчёта в CSV файл"""
+        import csv
+
         if not self.logic.params.get('result_ready', False):
             return False, "Сначала выполните считку"
             
@@ -590,7 +1100,8 @@ class CheckAndMatch(QWidget):
             failed_all = (self.logic.params['failed_no_sem_value'] + 
                          self.logic.params['failed_by_distance'] + 
                          self.logic.params['failed_by_sem'] + 
-                         self.logic.params['failed_by_both'])
+                         self.logic.params['failed_by_both'] +
+                         self.logic.params['failed_target_taken'])
             
             success_transfers = self.logic.params['success_transfers']
             max_rows = max(len(failed_all), len(success_transfers), 10)
@@ -631,6 +1142,8 @@ class CheckAndMatch(QWidget):
                 ("Нет объектов в радиусе", len(self.logic.params['failed_by_distance'])),
                 ("Несоответствие семантики", len(self.logic.params['failed_by_sem'])),
                 ("Нет объектов в радиусе + несоответствие семантики", len(self.logic.params['failed_by_both'])),
+                ("Подходящий объект в радиусе уже сопоставлен с другим",
+                 len(self.logic.params['failed_target_taken'])),
             ]
             
             for i in range(max_rows):
@@ -654,6 +1167,14 @@ class CheckAndMatch(QWidget):
                 
                 rows.append(row)
             
+            sweep_table = self.logic.params.get('sweep_table')
+            if sweep_table is not None:
+                rows.append([""] * 10)
+                rows.append(["СРАВНЕНИЕ ПОРОГОВ РАССТОЯНИЯ"] + [""] * 9)
+                rows.append([str(column) for column in sweep_table.columns])
+                for values in sweep_table.itertuples(index=False):
+                    rows.append(["" if value is None or value != value else str(value) for value in values])
+
             with open(filename, 'w', newline='', encoding='utf-8-sig') as f:
                 writer = csv.writer(f, delimiter=';')
                 writer.writerows(rows)
@@ -663,29 +1184,40 @@ class CheckAndMatch(QWidget):
         except Exception as e:
             return False, f"Не удалось сохранить CSV:\n{e}"
             
-    def check_messages(self):
-        """Проверка очереди сообщений"""
-        try:
-            while True:
-                msg_type, msg_data = self.logic.message_queue.get_nowait()
-                
-                if msg_type == "log":
-                    self.info_text.append(f"[ЛОГ] {msg_data}")
-                elif msg_type == "error":
-                    QMessageBox.critical(self, "Ошибка", msg_data)
-                    self.reset_ui_state()
-                elif msg_type == "done":
-                    self.on_processing_done()
-                    
-        except queue.Empty:
-            pass
+    def on_job_message(self, job_id, msg_type, msg_data):
+        """Сообщения задачи считки"""
+        if job_id != self.job_id:
+            return
+        if msg_type == "log":
+            self.info_text.append(f"[ЛОГ] {msg_data}")
+
+    def on_job_finished(self, job_id, result):
+        if job_id == self.job_id:
+            self.job_id = None
+            self.on_processing_done()
+
+    def on_job_failed(self, job_id, error_message):
+        if job_id == self.job_id:
+            self.job_id = None
+            QMessageBox.critical(self, "Ошибка", error_message)
+            self.status_label.setText("Ошибка считки")
+            self.status_label.setStyleSheet("color: red;")
+            self.reset_ui_state()
+
+    def on_job_cancelled(self, job_id):
+        if job_id == self.job_id:
+            self.job_id = None
+            self.status_label.setText("Считка прервана")
+            self.status_label.setStyleSheet("color: orange;")
+            self.reset_ui_state()
             
     def on_processing_done(self):
         """Обработка завершения"""
         total_failed = (len(self.logic.params['failed_by_distance']) + 
                        len(self.logic.params['failed_by_sem']) + 
                        len(self.logic.params['failed_by_both']) + 
-                       len(self.logic.params['failed_no_sem_value']))
+                       len(self.logic.params['failed_no_sem_value']) +
+                       len(self.logic.params['failed_target_taken']))
         
         result_msg = (
             f"Выполнено!\n\n"
@@ -693,7 +1225,21 @@ class CheckAndMatch(QWidget):
             f"Успешно: {self.logic.params['success_count']}\n"
             f"Неудачно: {total_failed}"
         )
-        
+        if self.logic.params['add_semantics_enabled'] and self.backend is not None:
+            result_msg += f"\nЗаписано 'Ошибка соответствия': {self.logic.params['written_count']}"
+            result_msg += f"\nСнято 'Ошибка соответствия' с сопоставленных: {self.logic.params['cleared_count']}"
+        
+        sweep_table = self.logic.params.get('sweep_table')
+        if sweep_table is not None:
+            self.info_text.append("Сравнение порогов:")
+            for values in sweep_table.to_dict('records'):
+                self.info_text.append(
+                    f" • {values['Порог (м)']:g} м: успешно {values['Успешно']} ({values['Успешно, %']}%), "
+                    f"нет в радиусе {values['Нет объектов в радиусе']}, "
+                    f"несоответствие {values['Несоответствие семантики']}, "
+                    f"объект занят {values['Подходящий объект в радиусе уже сопоставлен с другим']}")
+            result_msg += "\n\nТаблица сравнения порогов - в панели информации и в отчёте CSV"
+
         QMessageBox.information(self, "Результат считки", result_msg)
         
         self.btn_save.setEnabled(True)
@@ -708,6 +1254,10 @@ class CheckAndMatch(QWidget):
         
     def cleanup(self):
         """Очистка ресурсов при закрытии"""
-        if self.processing_thread and self.processing_thread.is_alive():
-            self.processing_thread.join(timeout=1)
-        self.timer.stop()            
\ No newline at end of file
+        if self.job_id is not None:
+            self.scheduler.cancel(self.job_id)
+        if self.owns_scheduler:
+            self.scheduler.shutdown()
+        # Карту, с которой ещё работает прерываемая задача, закроет сборщик мусора
+        if self.backend is not None and self.job_id is None:
+            self.backend.close()            
\ No newline at end of file